@@ -30,6 +30,10 @@ var osm_layer = L.tileLayer(OSM_URL, {
 
 var initialLocation = [55.7510888, 37.7642849];
 
+// Directory with tiles made by the "tiles" processor, which is set
+// like render.html?tiles=tiles. If not set, whole-city GeoJSON is loaded.
+var tilesDir = new URLSearchParams(window.location.search).get('tiles');
+
 var map = L.map('map').setView(initialLocation, 15).addLayer(osm_layer);
 
 var hint = L.marker(initialLocation, {opacity: 0})
@@ -136,24 +140,15 @@ function chooseCity(cityName)
         hint = null;
     }
 
+    if (tilesDir) {
+        loadCityTiles(cityName);
+        return;
+    }
+
     ajax(cityName + '.geojson',
         function (responseText) {
             var json = JSON.parse(responseText);
-            var cityLayer = L.geoJSON(json, {
-                style: function(feature) {
-                    if ('stroke' in feature.properties)
-                        return {color: feature.properties.stroke};
-                },
-                pointToLayer: function (feature, latlng) {
-                    return L.circleMarker(latlng, {
-                         color: feature.properties['marker-color'],
-                         //line-width: 1,
-                         //weight: 1,
-                         radius: 4
-                    });
-                }
-            });
-
+            var cityLayer = L.geoJSON(json, geoJsonOptions);
             setCityLayer(cityLayer);
          },
          function (statusText, status) {
@@ -162,13 +157,92 @@ function chooseCity(cityName)
     );
 }
 
-function setCityLayer(cityLayer) {
+var geoJsonOptions = {
+    style: function(feature) {
+        if ('stroke' in feature.properties)
+            return {color: feature.properties.stroke};
+    },
+    pointToLayer: function (feature, latlng) {
+        return L.circleMarker(latlng, {
+             color: feature.properties['marker-color'],
+             //line-width: 1,
+             //weight: 1,
+             radius: 4
+        });
+    }
+};
+
+function lonLatToTile(lon, lat, zoom) {
+    var n = Math.pow(2, zoom);
+    var latRad = Math.max(-85.0511287798, Math.min(85.0511287798, lat)) * Math.PI / 180;
+    return {
+        x: Math.floor((lon + 180) / 360 * n),
+        y: Math.floor((1 - Math.asinh(Math.tan(latRad)) / Math.PI) / 2 * n)
+    };
+}
+
+function loadCityTiles(cityName) {
+    var cityDir = tilesDir + '/' + cityName;
+    ajax(cityDir + '/index.json',
+        function (responseText) {
+            var index = JSON.parse(responseText);
+            var cityLayer = L.featureGroup();
+            var tileLayers = {};  // "x/y" => layer of a tile at layersZoom
+            var layersZoom = null;
+
+            function updateTiles() {
+                if (map.cityLayer !== cityLayer) {
+                    // Another city was chosen
+                    map.off('moveend', updateTiles);
+                    return;
+                }
+                var zoom = Math.min(Math.max(map.getZoom(), index.min_zoom), index.max_zoom);
+                if (zoom !== layersZoom) {
+                    cityLayer.clearLayers();
+                    tileLayers = {};
+                    layersZoom = zoom;
+                }
+                var bounds = map.getBounds();
+                var topLeft = lonLatToTile(bounds.getWest(), bounds.getNorth(), zoom);
+                var bottomRight = lonLatToTile(bounds.getEast(), bounds.getSouth(), zoom);
+                // Only existing tiles are listed in the index
+                index.tiles[zoom].forEach(function (xy) {
+                    var x = xy[0], y = xy[1], key = x + '/' + y;
+                    if (key in tileLayers ||
+                            x < topLeft.x || x > bottomRight.x ||
+                            y < topLeft.y || y > bottomRight.y)
+                        return;
+                    var tileLayer = L.geoJSON(null, geoJsonOptions);
+                    tileLayers[key] = tileLayer;
+                    cityLayer.addLayer(tileLayer);
+                    ajax(cityDir + '/' + zoom + '/' + key + '.geojson',
+                        function (responseText) {
+                            tileLayer.addData(JSON.parse(responseText));
+                        }
+                    );
+                });
+            }
+
+            var bbox = index.bbox;
+            setCityLayer(cityLayer, bbox && L.latLngBounds([bbox[1], bbox[0]], [bbox[3], bbox[2]]));
+            map.on('moveend', updateTiles);
+            updateTiles();
+         },
+         function (statusText, status) {
+            alert("Cannot fetch city tiles for " + cityName + ".\nError code: " + status);
+         }
+    );
+}
+
+function setCityLayer(cityLayer, bounds) {
     if (map.cityLayer) {
         map.removeLayer(map.cityLayer);
     }
+    map.cityLayer = cityLayer;
     if (cityLayer) {
         map.addLayer(cityLayer);
-        map.fitBounds(cityLayer.getBounds());
+        bounds = bounds || cityLayer.getBounds();
+        if (bounds.isValid())
+            map.fitBounds(bounds);
     }
-    map.cityLayer = cityLayer;
 }
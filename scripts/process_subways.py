@@ -1,21 +1,33 @@
 import argparse
+import functools
 import inspect
 import json
 import logging
 import os
-import re
 import sys
+from collections.abc import Callable
 
 from subways import processors
 from subways.overpass import multi_overpass
+from subways.stages import run_stages
 from subways.subway_io import (
-    dump_yaml,
+    apply_osm_change,
+    city_to_geojson,
+    city_to_yaml,
+    CityDumper,
+    dump_json,
+    load_json,
+    load_pbf,
     load_xml,
-    make_geojson,
+    index_recovery_data,
     read_recovery_data,
+    slugify,
+    ValidationLogWriter,
+    write_file_if_changed,
     write_recovery_data,
 )
 from subways.structure.city import (
+    City,
     find_transfers,
     get_unused_subway_entrances_geojson,
 )
@@ -29,8 +41,10 @@ from subways.validation import (
 )
 
 
-def slugify(name: str) -> str:
-    return re.sub(r"[^a-z0-9_-]+", "", name.lower().replace(" ", "_"))
+def get_validation_record(city: City) -> dict:
+    record = city.get_validation_result()
+    record["slug"] = slugify(city.name)
+    return record
 
 
 def main() -> None:
@@ -46,19 +60,64 @@ def main() -> None:
             "Cities from all sources are concatenated."
         ),
     )
+    parser.add_argument(
+        "--cities-info-cache",
+        help=(
+            "Directory to cache downloaded CSV files with cities info in. "
+            "It can be shared between tools and runs"
+        ),
+    )
     parser.add_argument(
         "-i",
         "--source",
         help="File to write backup of OSM data, or to read data from",
     )
+    parser.add_argument(
+        "--osm-change",
+        nargs="+",
+        default=[],
+        help=(
+            "osmChange diffs (*.osc or *.osc.gz) to apply in order "
+            "to the data read from --source, which is then updated"
+        ),
+    )
     parser.add_argument(
         "-x", "--xml", help="OSM extract with routes, to read data from"
     )
+    parser.add_argument(
+        "--filter-xml",
+        action="store_true",
+        help=(
+            "Select elements needed for validation from an XML extract "
+            "that was not filtered with osmfilter"
+        ),
+    )
+    parser.add_argument(
+        "-p",
+        "--pbf",
+        help=(
+            "OSM extract in PBF format to read data from. Unlike --xml, "
+            "the extract needs no filtering: elements are selected "
+            "while reading"
+        ),
+    )
+    parser.add_argument(
+        "--pbf-workers",
+        type=int,
+        help="Number of processes to decode PBF with, CPU count by default",
+    )
     parser.add_argument(
         "--overpass-api",
         default="http://overpass-api.de/api/interpreter",
         help="Overpass API URL",
     )
+    parser.add_argument(
+        "--overpass-cache",
+        help=(
+            "Directory to cache Overpass API responses in for a day, "
+            "so that repeated runs for the same cities skip downloading"
+        ),
+    )
     parser.add_argument(
         "-q",
         "--quiet",
@@ -83,8 +142,11 @@ def main() -> None:
     parser.add_argument(
         "-l",
         "--log",
-        type=argparse.FileType("w", encoding="utf-8"),
-        help="Validation JSON file name",
+        help=(
+            "Validation JSON file name. With .jsonl extension, a JSON line "
+            "per city is written as soon as the city is validated. "
+            "With .gz suffix, the file is gzipped"
+        ),
     )
     parser.add_argument(
         "--dump-city-list",
@@ -99,17 +161,35 @@ def main() -> None:
         processors, inspect.ismodule
     ):
         if not processor_name.startswith("_"):
-            parser.add_argument(
+            group = parser.add_argument_group(
+                f"{processor_name.upper()} output"
+            )
+            group.add_argument(
                 f"--output-{processor_name}",
                 help=(
                     "Processed metro systems output filename "
                     f"in {processor_name.upper()} format"
                 ),
             )
+            # A processor may define its own options
+            # prefixed with the processor name
+            if hasattr(processor, "add_arguments"):
+                processor.add_arguments(group)
 
-    parser.add_argument("--cache", help="Cache file name for processed data")
     parser.add_argument(
-        "-r", "--recovery-path", help="Cache file name for error recovery"
+        "--cache",
+        help=(
+            "Cache directory for processed data, a file per city. "
+            "A legacy cache file is converted to a directory"
+        ),
+    )
+    parser.add_argument(
+        "-r",
+        "--recovery-path",
+        help=(
+            "Cache directory for error recovery, a file per city. "
+            "A legacy cache file is converted to a directory"
+        ),
     )
     parser.add_argument(
         "-d", "--dump", help="Make a YAML file for a city data"
@@ -117,12 +197,55 @@ def main() -> None:
     parser.add_argument(
         "-j", "--geojson", help="Make a GeoJSON file for a city data"
     )
+    parser.add_argument(
+        "--output-workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of threads to write outputs (dumps, validation log, "
+            "processor outputs) concurrently"
+        ),
+    )
+    parser.add_argument(
+        "--dump-workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of processes to serialize per-city YAML/GeoJSON files "
+            "with when --dump/--geojson is a directory"
+        ),
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help=(
+            "Do not rewrite per-city YAML/GeoJSON files whose content "
+            "has not changed"
+        ),
+    )
     parser.add_argument(
         "--crude",
         action="store_true",
         help="Do not use OSM railway geometry for GeoJSON",
     )
+    parser.add_argument(
+        "--geojson-precision",
+        type=int,
+        help="Round GeoJSON coordinates to this number of fractional digits",
+    )
+    parser.add_argument(
+        "--compact-geojson",
+        action="store_true",
+        help=(
+            "Merge route variants with the same geometry into one GeoJSON "
+            "feature and omit whitespace"
+        ),
+    )
     options = parser.parse_args()
+    if options.osm_change and not (
+        options.source and os.path.exists(options.source)
+    ):
+        parser.error("--osm-change requires an existing --source file")
 
     if options.quiet:
         log_level = logging.WARNING
@@ -134,7 +257,14 @@ def main() -> None:
         format="%(asctime)s %(levelname)-7s  %(message)s",
     )
 
-    cities = prepare_cities(options.cities_info_urls, options.overground)
+    # Open the log in advance so as not to fail after hours of processing
+    validation_log = ValidationLogWriter(options.log) if options.log else None
+
+    cities = prepare_cities(
+        options.cities_info_urls,
+        options.overground,
+        options.cities_info_cache,
+    )
     if options.city:
         cities = [
             c
@@ -146,11 +276,14 @@ def main() -> None:
         sys.exit(2)
 
     # Augment cities with recovery data
-    recovery_data = None
     if options.recovery_path:
-        recovery_data = read_recovery_data(options.recovery_path)
+        recovery_data = read_recovery_data(
+            options.recovery_path, [city.name for city in cities]
+        )
         for city in cities:
-            city.recovery_data = recovery_data.get(city.name, None)
+            city.recovery_data = index_recovery_data(
+                recovery_data.get(city.name)
+            )
 
     logging.info("Read %s metro networks", len(cities))
 
@@ -158,17 +291,39 @@ def main() -> None:
     if options.source and os.path.exists(options.source):
         logging.info("Reading %s", options.source)
         with open(options.source, "r") as f:
-            osm = json.load(f)
-            if "elements" in osm:
-                osm = osm["elements"]
+            osm = load_json(f)
             calculate_centers(osm)
-    elif options.xml:
-        logging.info("Reading %s", options.xml)
-        osm = load_xml(options.xml)
+        if options.osm_change:
+            locations = []
+            for osc in options.osm_change:
+                logging.info("Applying %s", osc)
+                locations.extend(apply_osm_change(osm, osc))
+            with open(options.source, "w", encoding="utf-8") as f:
+                dump_json(osm, f)
+            affected_cities = sorted(
+                c.name
+                for c in cities
+                if any(
+                    c.contains({"lon": lon, "lat": lat})
+                    for lon, lat in locations
+                )
+            )
+            logging.info(
+                "%s cities affected by the changes: %s",
+                len(affected_cities),
+                ", ".join(affected_cities),
+            )
+    elif options.xml or options.pbf:
+        if options.pbf:
+            logging.info("Reading %s", options.pbf)
+            osm = load_pbf(options.pbf, options.pbf_workers)
+        else:
+            logging.info("Reading %s", options.xml)
+            osm = load_xml(options.xml, options.filter_xml)
         calculate_centers(osm)
         if options.source:
             with open(options.source, "w", encoding="utf-8") as f:
-                json.dump(osm, f)
+                dump_json(osm, f)
     else:
         if len(cities) > 10:
             logging.error(
@@ -178,18 +333,28 @@ def main() -> None:
             sys.exit(3)
         bboxes = [c.bbox for c in cities]
         logging.info("Downloading data from Overpass API")
-        osm = multi_overpass(options.overground, options.overpass_api, bboxes)
+        osm = multi_overpass(
+            options.overground,
+            options.overpass_api,
+            bboxes,
+            options.overpass_cache,
+        )
         calculate_centers(osm)
         if options.source:
             with open(options.source, "w", encoding="utf-8") as f:
-                json.dump(osm, f)
+                dump_json(osm, f)
     logging.info("Downloaded %s elements", len(osm))
 
     logging.info("Sorting elements by city")
     add_osm_elements_to_cities(osm, cities)
 
     logging.info("Building routes for each city")
-    good_cities = validate_cities(cities)
+    log_city = (
+        (lambda city: validation_log.write(get_validation_record(city)))
+        if validation_log
+        else None
+    )
+    good_cities = validate_cities(cities, log_city)
 
     logging.info("Finding transfer stations")
     transfers = find_transfers(osm, good_cities)
@@ -207,72 +372,114 @@ def main() -> None:
         ", ".join(sorted(bad_city_names)),
     )
 
-    if options.dump_city_list:
-        lines = sorted(
-            f"{city.name}, {city.country}"
-            f"{' ' + BAD_MARK if city.name in bad_city_names else ''}\n"
-            for city in cities
+    requested_processors = [
+        (processor_name, processor)
+        for processor_name, processor in inspect.getmembers(
+            processors, inspect.ismodule
         )
-        options.dump_city_list.writelines(lines)
+        if getattr(options, f"output_{processor_name}", None)
+    ]
+    if requested_processors:
+        # The transit model is built once and shared by all processors
+        transit_data = processors.transit_to_dict(cities, transfers)
+
+    # Worker processes are forked here, before stage threads are started
+    city_dumper = CityDumper(
+        cities,
+        options.dump_workers if options.dump or options.geojson else 1,
+    )
+
+    # Output stages are independent of each other
+    # and may run concurrently
+    stages = {}
+
+    if options.dump_city_list:
+
+        def dump_city_list() -> None:
+            lines = sorted(
+                f"{city.name}, {city.country}"
+                f"{' ' + BAD_MARK if city.name in bad_city_names else ''}\n"
+                for city in cities
+            )
+            options.dump_city_list.writelines(lines)
+
+        stages["city list"] = dump_city_list
 
     if options.recovery_path:
-        write_recovery_data(options.recovery_path, recovery_data, cities)
+        stages["recovery data"] = lambda: write_recovery_data(
+            options.recovery_path, cities
+        )
 
     if options.entrances:
-        json.dump(get_unused_subway_entrances_geojson(osm), options.entrances)
-
-    if options.dump:
-        if os.path.isdir(options.dump):
-            for c in cities:
-                with open(
-                    os.path.join(options.dump, slugify(c.name) + ".yaml"),
-                    "w",
-                    encoding="utf-8",
-                ) as f:
-                    dump_yaml(c, f)
-        elif len(cities) == 1:
-            with open(options.dump, "w", encoding="utf-8") as f:
-                dump_yaml(cities[0], f)
-        else:
-            logging.error("Cannot dump %s cities at once", len(cities))
+        stages["unused entrances"] = lambda: json.dump(
+            get_unused_subway_entrances_geojson(osm), options.entrances
+        )
 
-    if options.geojson:
-        if os.path.isdir(options.geojson):
-            for c in cities:
-                with open(
-                    os.path.join(
-                        options.geojson, slugify(c.name) + ".geojson"
-                    ),
-                    "w",
-                    encoding="utf-8",
-                ) as f:
-                    json.dump(make_geojson(c, not options.crude), f)
+    def dump_cities(
+        path: str, extension: str, city_to_str: Callable[[City], str]
+    ) -> None:
+        """Dump cities each to its own file if path is a directory,
+        or the only city to the path.
+        """
+        if os.path.isdir(path):
+            for city, content in zip(cities, city_dumper.dump(city_to_str)):
+                filename = os.path.join(path, slugify(city.name) + extension)
+                if options.skip_unchanged:
+                    write_file_if_changed(filename, content)
+                else:
+                    with open(filename, "w", encoding="utf-8") as f:
+                        f.write(content)
         elif len(cities) == 1:
-            with open(options.geojson, "w", encoding="utf-8") as f:
-                json.dump(make_geojson(cities[0], not options.crude), f)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(city_to_str(cities[0]))
         else:
             logging.error(
-                "Cannot make a geojson of %s cities at once", len(cities)
+                "Cannot dump %s cities into %s at once", len(cities), path
             )
 
-    if options.log:
-        res = []
-        for c in cities:
-            v = c.get_validation_result()
-            v["slug"] = slugify(c.name)
-            res.append(v)
-        json.dump(res, options.log, indent=2, ensure_ascii=False)
+    if options.dump:
+        stages["YAML dump"] = lambda: dump_cities(
+            options.dump, ".yaml", city_to_yaml
+        )
 
-    for processor_name, processor in inspect.getmembers(
-        processors, inspect.ismodule
-    ):
-        option_name = f"output_{processor_name}"
+    if options.geojson:
+        stages["GeoJSON dump"] = lambda: dump_cities(
+            options.geojson,
+            ".geojson",
+            functools.partial(
+                city_to_geojson,
+                include_tracks_geometry=not options.crude,
+                precision=options.geojson_precision,
+                compact=options.compact_geojson,
+            ),
+        )
 
-        if not getattr(options, option_name, None):
-            continue
+    if validation_log:
+        # Records have been written or collected during validation
+        stages["validation log"] = validation_log.close
+
+    for processor_name, processor in requested_processors:
+        filename = getattr(options, f"output_{processor_name}")
+        processor_prefix = f"{processor_name}_"
+        processor_options = {
+            key.removeprefix(processor_prefix): value
+            for key, value in vars(options).items()
+            if key.startswith(processor_prefix)
+        }
+        stages[f"{processor_name} output"] = functools.partial(
+            processor.process,
+            cities,
+            transit_data,
+            filename,
+            options.cache,
+            **processor_options,
+        )
 
-        filename = getattr(options, option_name)
-        processor.process(cities, transfers, filename, options.cache)
+    with city_dumper:
+        failed_stages = run_stages(stages, options.output_workers)
+    if failed_stages:
+        logging.error("Failed output stages: %s", ", ".join(failed_stages))
+        sys.exit(4)
 
 
 if __name__ == "__main__":
@@ -22,6 +22,8 @@ During this procedure, as many steps are skipped as possible. Namely:
   - Generation of metro extract is skipped if \$PLANET_METRO variable is set and the file exists.
   - Update with osmupdate is skipped if \$SKIP_PLANET_UPDATE or \$SKIP_FILTERING is set.
   - Filtering is skipped if \$SKIP_FILTERING is set and \$FILTERED_DATA is set and the file exists.
+  - If \$PBF_FILTERING or \$XML_FILTERING is set, \$PLANET_METRO is a *.pbf or *.osm file
+    which is filtered while being read by the validator, without osmfilter and \$FILTERED_DATA.
 
 Generated files \$POLY, \$PLANET_METRO, \$FILTERED_DATA are deleted if the corresponding
 variable is not defined or is null, otherwise they are kept.
@@ -29,37 +31,56 @@ The \$PLANET file from remote URL is saved to a tempfile and is removed at the e
 
 Environment variable reference:
   - PLANET: path to a local or remote o5m or pbf source file (the entire planet or an extract)
-  - PLANET_METRO: path to a local o5m file with extract of cities having metro
+  - PLANET_METRO: path to a local o5m file (pbf/osm if \$PBF_FILTERING/\$XML_FILTERING is set) with extract of cities having metro
     It's used instead of \$PLANET if exists otherwise it's created first
   - PLANET_UPDATE_SERVER: server to get replication data from. Defaults to https://planet.openstreetmap.org/replication/
   - CITIES_INFO_URL: one or more space-separated http(s) or "file://" URLs to CSV files with reference information about rapid transit systems.
     Cities from all sources are concatenated; for records sharing the same id or name, the later URL wins (useful for "base + local override").
     A default value is hammered into python code. URLs/paths must not contain spaces.
+  - CITIES_INFO_CACHE: directory to cache downloaded \$CITIES_INFO_URL files in for an hour,
+    shared by all steps and subsequent runs. Defaults to \$TMPDIR/cities_info_cache
   - CITY: name of a city/country to process
   - BBOX: bounding box of an extract; x1,y1,x2,y2. Has precedence over \$POLY
   - POLY: *.poly file with [multi]polygon comprising cities with metro
     If neither \$BBOX nor \$POLY is set, then \$POLY is generated
+  - POLY_BUFFER: widen generated \$POLY by this distance in degrees, merging nearby cities
+  - POLY_SIMPLIFY: simplify generated \$POLY with this tolerance in degrees
+  - POLY_MAX_VERTICES: limit the number of vertices of generated \$POLY
   - SKIP_PLANET_UPDATE: skip \$PLANET_METRO file update. Any non-empty string is True
   - SKIP_FILTERING: skip filtering railway data. Any non-empty string is True
   - FILTERED_DATA: path to filtered data. Defaults to \$TMPDIR/subways.osm
+  - PBF_FILTERING: read \$PLANET_METRO in pbf format by the validator instead of filtering it
+    with osmfilter. Any non-empty string is True
+  - PBF_WORKERS: number of processes to read pbf with. Defaults to the number of CPUs
+  - XML_FILTERING: same as \$PBF_FILTERING, but \$PLANET_METRO is in osm format.
+    Any non-empty string is True
   - MAPSME: file name for maps.me json output
   - GTFS: file name for GTFS output
+  - TILES: directory name for tiled GeoJSON output for the render viewer
   - DUMP: directory/file name to dump YAML city data. Do not set to omit dump
   - GEOJSON: directory/file name to dump GeoJSON data. Do not set to omit dump
+  - GEOJSON_PRECISION: number of fractional digits to round GeoJSON coordinates to
+  - COMPACT_GEOJSON: merge route variants with the same geometry and omit whitespace in GeoJSON. Any non-empty string is True
   - ELEMENTS_CACHE: file name to elements cache. Allows OSM xml processing phase
-  - CITY_CACHE: json file with good cities obtained on previous validation runs
-  - RECOVERY_PATH: file with some data collected at previous validation runs that
-    may help to recover some simple validation errors
+  - CITY_CACHE: directory with json files of good cities obtained on previous
+    validation runs, a file per city
+  - RECOVERY_PATH: directory with some data collected at previous validation runs
+    that may help to recover some simple validation errors, a file per city
   - OSMCTOOLS: path to osmconvert and osmupdate binaries
   - PYTHON: python 3 executable
   - GIT_PULL: set to 1 to update the scripts
   - TMPDIR: path to temporary files
   - HTML_DIR: target path for generated HTML files
+  - INCREMENTAL_HTML: keep \$HTML_DIR between runs, regenerate and upload only changed HTML files. Hashes of HTML inputs are kept in \$TMPDIR/v2h_manifest.json. Any non-empty string is True
+  - HTML_WORKERS: number of processes to generate HTML files. Default is 1.
   - DUMP_CITY_LIST: file name to save sorted list of cities, with [bad] mark for bad cities
   - SERVER: server name and path to upload HTML files (e.g. ilya@osmz.ru:/var/www/)
   - SERVER_KEY: rsa key to supply for uploading the files
   - REMOVE_HTML: set to 1 to remove \$HTML_DIR after uploading
   - QUIET: set to any non-empty value to use WARNING log level in process_subways.py. Default is INFO.
+  - OUTPUT_WORKERS: number of threads to write validation outputs concurrently. Default is 1.
+  - DUMP_WORKERS: number of processes to serialize per-city \$DUMP and \$GEOJSON files. Default is 1.
+  - SKIP_UNCHANGED: do not rewrite per-city \$DUMP and \$GEOJSON files with unchanged content. Any non-empty string is True
 EOF
   exit
 fi
@@ -114,7 +135,12 @@ function check_poly() {
         POLY=${POLY:-$(mktemp "$TMPDIR/all-metro.XXXXXXXX.poly")}
         activate_venv_at_path "$SUBWAYS_REPO_PATH/tools/make_poly"
         python "$SUBWAYS_REPO_PATH"/tools/make_poly/make_all_metro_poly.py \
-            ${CITIES_INFO_URL:+--cities-info-url $CITIES_INFO_URL} > "$POLY"
+            ${CITIES_INFO_URL:+--cities-info-url $CITIES_INFO_URL} \
+            --cities-info-cache "$CITIES_INFO_CACHE" \
+            ${POLY_BUFFER:+--buffer "$POLY_BUFFER"} \
+            ${POLY_SIMPLIFY:+--simplify "$POLY_SIMPLIFY"} \
+            ${POLY_MAX_VERTICES:+--max-vertices "$POLY_MAX_VERTICES"} \
+            --report > "$POLY"
         deactivate
       fi
     fi
@@ -144,14 +170,24 @@ if [ -n "${GIT_PULL-}" ]; then (
 
 TMPDIR="${TMPDIR:-"$SUBWAYS_REPO_PATH"}"
 mkdir -p "$TMPDIR"
+CITIES_INFO_CACHE="${CITIES_INFO_CACHE:-"$TMPDIR/cities_info_cache"}"
 
-if [ -z "${FILTERED_DATA-}" ]; then
-  FILTERED_DATA="$TMPDIR/subways.osm"
-  NEED_TO_REMOVE_FILTERED_DATA=1
-fi
-
-if [ -z "${SKIP_FILTERING-}" -o ! -f "$FILTERED_DATA" ]; then
+if [ -n "${PBF_FILTERING-}" -o -n "${XML_FILTERING-}" ]; then
+  # The validator filters $PLANET_METRO itself
+  FILTER_IN_VALIDATOR=1
+  METRO_EXT=${PBF_FILTERING:+pbf}
+  METRO_EXT=${METRO_EXT:-osm}
   NEED_FILTER=1
+else
+  METRO_EXT=o5m
+  if [ -z "${FILTERED_DATA-}" ]; then
+    FILTERED_DATA="$TMPDIR/subways.osm"
+    NEED_TO_REMOVE_FILTERED_DATA=1
+  fi
+
+  if [ -z "${SKIP_FILTERING-}" -o ! -f "$FILTERED_DATA" ]; then
+    NEED_FILTER=1
+  fi
 fi
 
 
@@ -161,7 +197,12 @@ if [ -n "${NEED_FILTER-}" ]; then
   
   if [ -n "${PLANET_METRO-}" ]; then
     EXT=${PLANET_METRO##*.}
-    if [ ! "$EXT" = "osm" -a ! "$EXT" == "xml" -a ! "$EXT" = "o5m" ]; then
+    if [ -n "${FILTER_IN_VALIDATOR-}" ]; then
+      if [ ! "$EXT" = "$METRO_EXT" ]; then
+        echo "PLANET_METRO must be a $METRO_EXT file for ${METRO_EXT^^}_FILTERING."
+        exit 3
+      fi
+    elif [ ! "$EXT" = "osm" -a ! "$EXT" == "xml" -a ! "$EXT" = "o5m" ]; then
       echo "Only o5m/xml/osm file formats are supported for filtering."
       exit 3
     fi
@@ -191,7 +232,7 @@ if [ -n "${NEED_FILTER-}" ]; then
     fi
 
     if [ -z "${PLANET_METRO-}" ]; then
-      PLANET_METRO=$(mktemp "$TMPDIR/planet-metro.XXXXXXXX.o5m")
+      PLANET_METRO=$(mktemp "$TMPDIR/planet-metro.XXXXXXXX.$METRO_EXT")
       NEED_TO_REMOVE_PLANET_METRO=1
     fi
 
@@ -222,22 +263,22 @@ if [ -z "${SKIP_PLANET_UPDATE-}" -a -n "${NEED_FILTER-}" ]; then
   mkdir -p $TMPDIR/osmupdate_temp/
   pushd $TMPDIR/osmupdate_temp/
   export PATH="$PATH:$OSMCTOOLS"
-  OSMUPDATE_ERRORS=$(osmupdate --drop-author --out-o5m ${BBOX:+"-b=$BBOX"} \
+  OSMUPDATE_ERRORS=$(osmupdate --drop-author --out-$METRO_EXT ${BBOX:+"-b=$BBOX"} \
                                  ${POLY:+"-B=$POLY"} "$PLANET_METRO_ABS" \
                                  --base-url=$PLANET_UPDATE_SERVER \
                                  --tempfiles=$TMPDIR/osmupdate_temp/temp \
-                                 "$PLANET_METRO_ABS.new.o5m" 2>&1 || :)
+                                 "$PLANET_METRO_ABS.new.$METRO_EXT" 2>&1 || :)
   if [ -n "$OSMUPDATE_ERRORS" ]; then
     echo "osmupdate failed: $OSMUPDATE_ERRORS"
     exit 7
   fi
   popd
-  mv "$PLANET_METRO_ABS.new.o5m" "$PLANET_METRO_ABS"
+  mv "$PLANET_METRO_ABS.new.$METRO_EXT" "$PLANET_METRO_ABS"
 fi
 
 # Filtering planet-metro
 
-if [ -n "${NEED_FILTER-}" ]; then
+if [ -n "${NEED_FILTER-}" -a -z "${FILTER_IN_VALIDATOR-}" ]; then
   check_osmctools
   mkdir -p $TMPDIR/osmfilter_temp/
   QRELATIONS="route=subway =light_rail =monorail =train route_master=subway =light_rail =monorail =train public_transport=stop_area =stop_area_group"
@@ -251,7 +292,7 @@ if [ -n "${NEED_FILTER-}" ]; then
       -o="$FILTERED_DATA"
 fi
 
-if [ -n "${NEED_TO_REMOVE_PLANET_METRO-}" ]; then
+if [ -n "${NEED_TO_REMOVE_PLANET_METRO-}" -a -z "${FILTER_IN_VALIDATOR-}" ]; then
   rm $PLANET_METRO
 fi
 if [ -n "${NEED_TO_REMOVE_POLY-}" ]; then
@@ -266,25 +307,43 @@ fi
 
 VALIDATION="$TMPDIR/validation.json"
 
+if [ -n "${PBF_FILTERING-}" ]; then
+  OSM_DATA_OPTIONS=(-p "$PLANET_METRO" ${PBF_WORKERS:+--pbf-workers "$PBF_WORKERS"})
+elif [ -n "${XML_FILTERING-}" ]; then
+  OSM_DATA_OPTIONS=(-x "$PLANET_METRO" --filter-xml)
+else
+  OSM_DATA_OPTIONS=(-x "$FILTERED_DATA")
+fi
+
 activate_venv_at_path "$SUBWAYS_REPO_PATH/scripts"
 python "$SUBWAYS_REPO_PATH/scripts/process_subways.py" ${QUIET:+-q} \
-    -x "$FILTERED_DATA" -l "$VALIDATION" \
+    "${OSM_DATA_OPTIONS[@]}" -l "$VALIDATION" \
     ${CITIES_INFO_URL:+--cities-info-url $CITIES_INFO_URL} \
+    --cities-info-cache "$CITIES_INFO_CACHE" \
     ${MAPSME:+--output-mapsme "$MAPSME"} \
     ${GTFS:+--output-gtfs "$GTFS"} \
+    ${TILES:+--output-tiles "$TILES"} \
     ${CITY:+-c "$CITY"} \
     ${DUMP:+-d "$DUMP"} \
     ${GEOJSON:+-j "$GEOJSON"} \
+    ${GEOJSON_PRECISION:+--geojson-precision "$GEOJSON_PRECISION"} \
+    ${COMPACT_GEOJSON:+--compact-geojson} \
     ${DUMP_CITY_LIST:+--dump-city-list "$DUMP_CITY_LIST"} \
     ${ELEMENTS_CACHE:+-i "$ELEMENTS_CACHE"} \
     ${CITY_CACHE:+--cache "$CITY_CACHE"} \
-    ${RECOVERY_PATH:+-r "$RECOVERY_PATH"}
+    ${RECOVERY_PATH:+-r "$RECOVERY_PATH"} \
+    ${OUTPUT_WORKERS:+--output-workers "$OUTPUT_WORKERS"} \
+    ${DUMP_WORKERS:+--dump-workers "$DUMP_WORKERS"} \
+    ${SKIP_UNCHANGED:+--skip-unchanged}
 deactivate
 
 
 if [ -n "${NEED_TO_REMOVE_FILTERED_DATA-}" ]; then
   rm "$FILTERED_DATA"
 fi
+if [ -n "${NEED_TO_REMOVE_PLANET_METRO-}" -a -n "${FILTER_IN_VALIDATOR-}" ]; then
+  rm "$PLANET_METRO"
+fi
 
 # Preparing HTML files
 
@@ -294,18 +353,32 @@ if [ -z "${HTML_DIR-}" ]; then
 fi
 
 mkdir -p $HTML_DIR
-rm -f "$HTML_DIR"/*.html
+if [ -z "${INCREMENTAL_HTML-}" ]; then
+  rm -f "$HTML_DIR"/*.html
+fi
+# Files modified after this marker are uploaded
+HTML_MARKER="$TMPDIR/html_marker"
+touch "$HTML_MARKER"
 
 activate_venv_at_path "$SUBWAYS_REPO_PATH/tools/v2h"
 python "$SUBWAYS_REPO_PATH/tools/v2h/validation_to_html.py" \
     "$VALIDATION" "$HTML_DIR" \
-    ${CITIES_INFO_URL:+--cities-info-url $CITIES_INFO_URL}
+    ${CITIES_INFO_URL:+--cities-info-url $CITIES_INFO_URL} \
+    ${INCREMENTAL_HTML:+--manifest "$TMPDIR/v2h_manifest.json"} \
+    ${HTML_WORKERS:+--workers "$HTML_WORKERS"}
 deactivate
 
 # Uploading files to the server
 
 if [ -n "${SERVER-}" ]; then
-  scp -q ${SERVER_KEY+-i "$SERVER_KEY"} "$HTML_DIR"/* "$SERVER"
+  if [ -n "${INCREMENTAL_HTML-}" ]; then
+    # "{} +" must end -exec, so the destination is passed as $0
+    SERVER_KEY="${SERVER_KEY-}" find "$HTML_DIR" -maxdepth 1 -type f \
+        -newer "$HTML_MARKER" -exec sh -c \
+        'scp -q ${SERVER_KEY:+-i "$SERVER_KEY"} "$@" "$0"' "$SERVER" {} +
+  else
+    scp -q ${SERVER_KEY+-i "$SERVER_KEY"} "$HTML_DIR"/* "$SERVER"
+  fi
   if [ -n "${REMOVE_HTML-}" ]; then
     rm -r "$HTML_DIR"
   fi
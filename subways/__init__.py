@@ -18,13 +18,28 @@ from .geom_utils import (
     is_near,
     project_on_line,
 )
-from .osm_element import el_center, el_id
+from .osm_element import (
+    el_center,
+    el_id,
+    format_id,
+    make_id,
+    OsmElement,
+    parse_id,
+)
 from .overpass import multi_overpass, overpass_request
 from .subway_io import (
+    city_to_yaml,
+    dump_json,
     dump_yaml,
+    index_recovery_data,
+    load_json,
     load_xml,
     make_geojson,
     read_recovery_data,
+    read_validation_log,
+    slugify,
+    ValidationLogWriter,
+    write_file_if_changed,
     write_recovery_data,
 )
 from .types import (
@@ -67,12 +82,24 @@ __all__ = [
     "normalize_colour",
     "el_center",
     "el_id",
+    "format_id",
+    "make_id",
+    "OsmElement",
+    "parse_id",
     "overpass_request",
     "multi_overpass",
+    "city_to_yaml",
+    "dump_json",
     "dump_yaml",
+    "index_recovery_data",
+    "load_json",
     "load_xml",
     "make_geojson",
     "read_recovery_data",
+    "read_validation_log",
+    "slugify",
+    "ValidationLogWriter",
+    "write_file_if_changed",
     "write_recovery_data",
     "CriticalValidationError",
     "IdT",
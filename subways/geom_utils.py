@@ -173,3 +173,47 @@ def angle_between(p1: LonLat, c: LonLat, p2: LonLat) -> float:
         )
     )
     return a if a <= 180 else 360 - a
+
+
+def distance_to_segment(p: LonLat, p1: LonLat, p2: LonLat) -> float:
+    """Approximate distance in meters from point p to segment p1p2.
+    Calculations are made in a local equirectangular projection,
+    which is precise enough for short segments.
+    """
+    cos_lat = math.cos(0.5 * math.radians(p1[1] + p2[1]))
+    x, y = math.radians(p[0] - p1[0]) * cos_lat, math.radians(p[1] - p1[1])
+    dx = math.radians(p2[0] - p1[0]) * cos_lat
+    dy = math.radians(p2[1] - p1[1])
+    d2 = dx * dx + dy * dy
+    if d2 > 0:
+        u = max(0.0, min(1.0, (x * dx + y * dy) / d2))
+        x -= u * dx
+        y -= u * dy
+    return 6378137 * math.sqrt(x * x + y * y)
+
+
+def simplify_line(line: RailT, tolerance: float) -> list[int]:
+    """Douglas-Peucker simplification of a line with a tolerance in meters.
+    Return sorted indexes of line vertices that should be kept.
+    The first and the last vertices are always kept.
+    """
+    if tolerance <= 0 or len(line) < 3:
+        return list(range(len(line)))
+
+    keep = [False] * len(line)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(line) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_d = tolerance
+        farthest = None
+        for i in range(first + 1, last):
+            d = distance_to_segment(line[i], line[first], line[last])
+            if d > max_d:
+                max_d = d
+                farthest = i
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [i for i, is_kept in enumerate(keep) if is_kept]
@@ -1,16 +1,298 @@
+import gzip
+import hashlib
 import http.client
+import json
+import logging
+import os
+import time
 import urllib.error
+import urllib.parse
 import urllib.request
-from typing import Any
+from email.message import Message
+from typing import Any, BinaryIO
+
+MAX_REDIRECTS = 5
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+
+# Idle keep-alive connections by (scheme, host:port). A connection is
+# taken from here for a request and returned once its response is read.
+_connections: dict[tuple[str, str], http.client.HTTPConnection] = {}
+
+
+class HttpResponse:
+    """Body of a response, decompressed on the fly if it came gzipped."""
+
+    def __init__(
+        self,
+        response: http.client.HTTPResponse,
+        url: str,
+        connection: http.client.HTTPConnection | None = None,
+    ) -> None:
+        self.url = url
+        self.status: int = response.status
+        self.headers: Message = response.headers
+        self._response = response
+        self._connection = connection
+        self._body: BinaryIO = response
+        if response.headers.get("Content-Encoding") == "gzip":
+            self._body = gzip.GzipFile(fileobj=response)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            return self._body.read()
+        return self._body.read(size)
+
+    def close(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection:
+            if self._response.isclosed():
+                # The body was read to the end, so the connection
+                # can be used for the next request
+                key = _connection_key(urllib.parse.urlsplit(self.url))
+                old_connection = _connections.pop(key, None)
+                if old_connection:
+                    old_connection.close()
+                _connections[key] = connection
+            else:
+                connection.close()
+        self._response.close()
+
+    def __enter__(self) -> "HttpResponse":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def close_connections() -> None:
+    """Close idle keep-alive connections."""
+    while _connections:
+        _connections.popitem()[1].close()
+
+
+def _connection_key(parts: urllib.parse.SplitResult) -> tuple[str, str]:
+    return parts.scheme, parts.netloc
+
+
+def _uses_proxy(parts: urllib.parse.SplitResult) -> bool:
+    return parts.scheme in urllib.request.getproxies() and not (
+        urllib.request.proxy_bypass(parts.hostname or "")
+    )
+
+
+def _request_once(
+    url: str, headers: dict[str, str], timeout: float | None
+) -> HttpResponse:
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or _uses_proxy(parts):
+        # urllib handles local files and proxies, and follows redirects
+        request = urllib.request.Request(url, headers=headers)
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        return HttpResponse(urllib.request.urlopen(request, **kwargs), url)
+
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    key = _connection_key(parts)
+    connection = _connections.pop(key, None)
+    for attempt in range(2):
+        is_reused = connection is not None
+        if not is_reused:
+            connection_class = (
+                http.client.HTTPSConnection
+                if parts.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            connection = connection_class(parts.netloc, timeout=timeout)
+        connection.timeout = timeout
+        if connection.sock:
+            connection.sock.settimeout(timeout)
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            break
+        except (http.client.HTTPException, ConnectionError):
+            connection.close()
+            connection = None
+            # The server may have closed an idle connection, so
+            # a reused connection is given one more chance
+            if not is_reused:
+                raise
+        except BaseException:
+            connection.close()
+            raise
+    result = HttpResponse(response, url, connection)
+    if response.status >= 300:
+        with result:
+            # The body is read for the connection to be reused
+            result.read()
+        raise urllib.error.HTTPError(
+            url, response.status, response.reason, response.headers, None
+        )
+    return result
+
+
+def http_request(
+    url: str,
+    headers: dict[str, str] | None = None,
+    timeout: float | None = None,
+) -> HttpResponse:
+    """Send a GET request accepting a gzipped response and keeping
+    the connection alive for the next requests to the same host.
+    Redirects are followed, other non-2xx responses raise HTTPError.
+    """
+    headers = {"Accept-Encoding": "gzip", **(headers or {})}
+    for _ in range(MAX_REDIRECTS):
+        try:
+            return _request_once(url, headers, timeout)
+        except urllib.error.HTTPError as e:
+            location = e.headers.get("Location") if e.headers else None
+            if e.code not in REDIRECT_CODES or not location:
+                raise
+            url = urllib.parse.urljoin(url, location)
+    raise Exception(f"Too many redirects for {url}")
 
 
 def urlopen_or_raise(
-    url: str | urllib.request.Request,
+    url: str,
     *,
     error_prefix: str = "HTTP request failed",
     **kwargs: Any,
-) -> http.client.HTTPResponse:
+) -> HttpResponse:
     try:
-        return urllib.request.urlopen(url, **kwargs)
+        return http_request(url, **kwargs)
     except urllib.error.HTTPError as e:
         raise Exception(f"{error_prefix}: HTTP {e.code}") from e
+
+
+def _read_cache_file(path: str) -> tuple[dict, bytes] | None:
+    """Read a cached response: a json line with metadata, then the body."""
+    try:
+        with open(path, "rb") as f:
+            meta = json.loads(f.readline())
+            return meta, f.read()
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring broken cache file '%s': %s", path, e)
+        return None
+
+
+def _write_cache_file(path: str, meta: dict, body: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(meta).encode("utf-8") + b"\n")
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning("Cannot write cache file '%s': %s", path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _evict_cache_files(cache_dir: str, max_size: int, keep: str) -> None:
+    """Remove least recently used files until the cache fits max_size."""
+    files = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total_size <= max_size:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Removed by another process
+        total_size -= size
+
+
+def _cache_path(cache_dir: str, url: str) -> str:
+    return os.path.join(
+        cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest()
+    )
+
+
+def remove_cached_url(url: str, cache_dir: str | None) -> None:
+    """Remove a cached response, e.g. one with an error inside."""
+    if cache_dir:
+        try:
+            os.remove(_cache_path(cache_dir, url))
+        except FileNotFoundError:
+            pass
+
+
+def read_url(url: str, **kwargs: Any) -> bytes:
+    """Return the body of a URL response, see fetch_url()."""
+    return fetch_url(url, **kwargs)[0]
+
+
+def fetch_url(
+    url: str,
+    *,
+    cache_dir: str | None = None,
+    ttl: float = 0,
+    max_size: int | None = None,
+    error_prefix: str = "HTTP request failed",
+    **kwargs: Any,
+) -> tuple[bytes, bool]:
+    """Return the body of a URL response, and if a request was sent
+    to the server for it. With cache_dir, http(s) responses
+    are kept on disk and shared between runs and tools: a response
+    younger than ttl seconds is used as is, an older one is revalidated
+    with its ETag/Last-Modified, and it is also used if the server fails.
+    Files are named after the URL hash. With max_size in bytes, least
+    recently used files are removed when the cache grows bigger.
+    """
+    if not cache_dir or not url.startswith(("http://", "https://")):
+        with urlopen_or_raise(url, error_prefix=error_prefix, **kwargs) as r:
+            return r.read(), True
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, url)
+    cached = _read_cache_file(path)
+    if cached and cached[0].get("url") != url:
+        cached = None
+    if cached and time.time() - cached[0]["fetched"] < ttl:
+        os.utime(path)  # The modification time orders files for eviction
+        return cached[1], False
+
+    headers = {}
+    if cached:
+        meta = cached[0]
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        with http_request(url, headers, **kwargs) as response:
+            body = response.read()
+            headers = response.headers
+    except urllib.error.HTTPError as e:
+        if not cached:
+            raise Exception(f"{error_prefix}: HTTP {e.code}") from e
+        if e.code != 304:
+            logging.warning(
+                "%s: HTTP %s. Using the cached copy", error_prefix, e.code
+            )
+            return cached[1], True
+        meta, body = cached
+    except OSError as e:
+        if not cached:
+            raise
+        logging.warning("%s: %s. Using the cached copy", error_prefix, e)
+        return cached[1], True
+    else:
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+    _write_cache_file(path, {**meta, "fetched": time.time()}, body)
+    if max_size is not None:
+        _evict_cache_files(cache_dir, max_size, keep=path)
+    return body, True
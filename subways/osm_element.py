@@ -1,15 +1,133 @@
+from collections.abc import Iterator, Mapping, MutableMapping
+from typing import Any
+
 from subways.types import IdT, LonLat, OsmElementT
 
 
+class OsmElement(MutableMapping):
+    """A node, way or relation. Fields are stored in slots instead of
+    a dict per element, which takes several times less memory. For
+    compatibility with code written for Overpass JSON dicts, fields can
+    be read and written as items, and an unset field is a missing key.
+    Members of relations and centers stay plain dicts.
+    """
+
+    __slots__ = (
+        "type",
+        "id",
+        "lat",
+        "lon",
+        "tags",
+        "nodes",
+        "members",
+        "center",
+    )
+    _KEYS = frozenset(__slots__)
+
+    def __init__(self, el_type: str, el_id: int) -> None:
+        self.type = el_type
+        self.id = el_id
+
+    @classmethod
+    def from_dict(cls, el: Mapping) -> "OsmElement":
+        """Make an element from an Overpass JSON dict.
+        Keys other than the ones stored in slots are ignored.
+        """
+        element = cls(el["type"], el["id"])
+        for key in cls.__slots__[2:]:
+            if key in el:
+                setattr(element, key, el[key])
+        return element
+
+    def to_dict(self) -> dict:
+        """Convert to an Overpass JSON dict, e.g. for json.dump()."""
+        return {key: getattr(self, key) for key in self}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._KEYS:
+            return getattr(self, key, default)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._KEYS and hasattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._KEYS or not hasattr(self, key):
+            raise KeyError(key)
+        delattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self.__slots__ if hasattr(self, key))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        # The same as for dicts, since elements are printed in messages
+        return repr(self.to_dict())
+
+
+# Element ids are packed into ints: OSM id shifted by two bits
+# with the element type code in the lower bits. Strings like "n123"
+# are only made for messages and outputs.
+OSM_TYPE_CODES = {"node": 1, "way": 2, "relation": 3}
+_ID_LETTERS = ("", "n", "w", "r")
+_LETTER_CODES = {"n": 1, "w": 2, "r": 3}
+
+
+def make_id(el_type: str, osm_id: int) -> IdT:
+    return osm_id << 2 | OSM_TYPE_CODES[el_type]
+
+
+def format_id(elid: IdT | None) -> str | None:
+    """Make a string id like "n123" from a packed id."""
+    if elid is None:
+        return None
+    return _ID_LETTERS[elid & 3] + str(elid >> 2)
+
+
+def parse_id(elid: str) -> IdT:
+    """Make a packed id from a string id like "n123"."""
+    return int(elid[1:]) << 2 | _LETTER_CODES[elid[0]]
+
+
 def el_id(el: OsmElementT) -> IdT | None:
+    """Packed id of an element, or of a relation member."""
+    if el.__class__ is OsmElement:
+        return el.id << 2 | OSM_TYPE_CODES[el.type]
     if not el:
         return None
-    if "type" not in el:
+    if "type" not in el or ("id" not in el and "ref" not in el):
         raise Exception("What is this element? {}".format(el))
-    return el["type"][0] + str(el.get("id", el.get("ref", "")))
+    return make_id(el["type"], el.get("id", el.get("ref")))
 
 
 def el_center(el: OsmElementT) -> LonLat | None:
+    if el.__class__ is OsmElement:
+        try:
+            return el.lon, el.lat
+        except AttributeError:
+            pass
+        try:
+            return el.center["lon"], el.center["lat"]
+        except AttributeError:
+            return None
     if not el:
         return None
     if "lat" in el:
@@ -4,8 +4,11 @@ import time
 import urllib.parse
 
 from subways.consts import MODES_OVERGROUND, MODES_RAPID
-from subways.http_utils import urlopen_or_raise
-from subways.types import OsmElementT
+from subways.http_utils import fetch_url, remove_cached_url
+from subways.osm_element import OsmElement
+
+OVERPASS_CACHE_TTL = 24 * 3600  # seconds
+OVERPASS_CACHE_MAX_SIZE = 2 * 2**30  # bytes
 
 
 def compose_overpass_request(
@@ -36,25 +39,60 @@ def compose_overpass_request(
 
 
 def overpass_request(
-    overground: bool, overpass_api: str, bboxes: list[list[float]]
-) -> list[OsmElementT]:
+    overground: bool,
+    overpass_api: str,
+    bboxes: list[list[float]],
+    cache_dir: str | None = None,
+) -> list[OsmElement]:
+    """Query Overpass API. With cache_dir, responses to the same query
+    to the same endpoint are taken from the disk cache for a day.
+    """
+    return _overpass_request(overground, overpass_api, bboxes, cache_dir)[0]
+
+
+def _overpass_request(
+    overground: bool,
+    overpass_api: str,
+    bboxes: list[list[float]],
+    cache_dir: str | None,
+) -> tuple[list[OsmElement], bool]:
+    """Return elements, and if a request was sent to the server."""
     query = compose_overpass_request(overground, bboxes)
     url = f"{overpass_api}?data={urllib.parse.quote(query)}"
-    with urlopen_or_raise(
-        url, timeout=1000, error_prefix="Failed to query Overpass API"
-    ) as response:
-        return json.load(response)["elements"]
+    response, is_requested = fetch_url(
+        url,
+        cache_dir=cache_dir,
+        ttl=OVERPASS_CACHE_TTL,
+        max_size=OVERPASS_CACHE_MAX_SIZE,
+        timeout=1000,
+        error_prefix="Failed to query Overpass API",
+    )
+    data = json.loads(response)
+    if "remark" in data:
+        # Overpass API reports runtime errors like timeouts in a remark,
+        # and elements are incomplete then
+        remove_cached_url(url, cache_dir)
+        raise Exception(f"Overpass API error: {data['remark']}")
+    elements = [OsmElement.from_dict(el) for el in data["elements"]]
+    return elements, is_requested
 
 
 def multi_overpass(
-    overground: bool, overpass_api: str, bboxes: list[list[float]]
-) -> list[OsmElementT]:
+    overground: bool,
+    overpass_api: str,
+    bboxes: list[list[float]],
+    cache_dir: str | None = None,
+) -> list[OsmElement]:
     SLICE_SIZE = 10
     INTERREQUEST_WAIT = 5  # in seconds
     result = []
+    is_requested = False
     for i in range(0, len(bboxes), SLICE_SIZE):
-        if i > 0:
+        if is_requested:
             time.sleep(INTERREQUEST_WAIT)
         bboxes_i = bboxes[i : i + SLICE_SIZE]  # noqa E203
-        result.extend(overpass_request(overground, overpass_api, bboxes_i))
+        elements, is_requested = _overpass_request(
+            overground, overpass_api, bboxes_i, cache_dir
+        )
+        result.extend(elements)
     return result
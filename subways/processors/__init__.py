@@ -1,8 +1,8 @@
 # Import only those processors (modules) you want to use.
 # Ignore F401 "module imported but unused" violation since these modules
 # are addressed via introspection.
-from . import gtfs, mapsme  # noqa F401
+from . import gtfs, mapsme, tiles  # noqa F401
 from ._common import transit_to_dict
 
 
-__all__ = ["gtfs", "mapsme", "transit_to_dict"]
+__all__ = ["gtfs", "mapsme", "tiles", "transit_to_dict"]
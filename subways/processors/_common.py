@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import typing
 
-from subways.osm_element import el_center
-from subways.types import TransfersT
+from subways.geom_utils import distance
+from subways.osm_element import el_center, format_id, make_id
+from subways.types import IdT, LonLat, OsmElementT, TransfersT
 
 if typing.TYPE_CHECKING:
     from subways.structure.city import City
+    from subways.structure.stop_area import StopArea
 
 DEFAULT_INTERVAL = 2.5 * 60  # seconds
 KMPH_TO_MPS = 1 / 3.6  # km/h to m/s conversion multiplier
@@ -20,12 +22,120 @@ def format_colour(colour: str | None) -> str | None:
     return colour[1:] if colour else None
 
 
+def transfer_time(center1: LonLat, center2: LonLat) -> int:
+    """Time in seconds to walk between two stop areas."""
+    return TRANSFER_PENALTY + round(
+        distance(center1, center2) / SPEED_ON_TRANSFER
+    )
+
+
+def _find_exits_for_platform(
+    center: LonLat, nodes: list[OsmElementT]
+) -> list[OsmElementT]:
+    exits = []
+    min_distance = None
+    for n in nodes:
+        d = distance(center, (n["lon"], n["lat"]))
+        if not min_distance:
+            min_distance = d * 2 / 3
+        elif d < min_distance:
+            continue
+        too_close = False
+        for e in exits:
+            d = distance((e["lon"], e["lat"]), (n["lon"], n["lat"]))
+            if d < min_distance:
+                too_close = True
+                break
+        if not too_close:
+            exits.append(n)
+    return exits
+
+
+def _get_platform_nodes(city: City, platform_id: IdT) -> list[OsmElementT]:
+    platform = city.elements[platform_id]
+    if platform["type"] == "node":
+        return [platform]
+    if platform["type"] == "way":
+        way_ids = [platform_id]
+    else:
+        way_ids = [
+            way_id
+            for way_id in (
+                make_id("way", m["ref"])
+                for m in platform["members"]
+                if m["type"] == "way"
+            )
+            if way_id in city.elements
+        ]
+    return [
+        node
+        for way_id in way_ids
+        for node in (
+            city.elements.get(make_id("node", n))
+            for n in city.elements[way_id]["nodes"]
+        )
+        if node
+    ]
+
+
+def _get_platform_exits(city: City, stoparea: StopArea) -> list[dict]:
+    """Make exits from platform nodes for a stop area without
+    proper entrances and exits.
+    """
+    if stoparea.entrances or stoparea.exits:
+        return []
+    return [
+        {
+            "id": f"n{node['id']}",
+            "center": (node["lon"], node["lat"]),
+        }
+        for platform_id in sorted(stoparea.platforms)
+        for node in _find_exits_for_platform(
+            stoparea.centers[platform_id],
+            _get_platform_nodes(city, platform_id),
+        )
+    ]
+
+
+def _stoparea_to_dict(city: City, stoparea: StopArea) -> dict:
+    return {
+        "id": format_id(stoparea.id),
+        "center": stoparea.center,
+        "name": stoparea.station.name,
+        "int_name": stoparea.int_name,
+        "station_id": format_id(stoparea.station.id),
+        # Center of the stop_area relation or of the station itself
+        "element_center": stoparea.centers[stoparea.id],
+        "entrances": [
+            {
+                "id": format_id(egress_id),
+                "name": egress["tags"].get("name"),
+                "ref": egress["tags"].get("ref"),
+                "center": el_center(egress),
+                "can_enter": egress_id in stoparea.entrances,
+                "can_exit": egress_id in stoparea.exits,
+            }
+            for (egress_id, egress) in (
+                (egress_id, city.elements[egress_id])
+                for egress_id in sorted(stoparea.entrances | stoparea.exits)
+            )
+        ],
+        "has_platforms": bool(stoparea.platforms),
+        "platform_exits": _get_platform_exits(city, stoparea),
+    }
+
+
 def transit_to_dict(cities: list[City], transfers: TransfersT) -> dict:
-    """Get data for good cities as a dictionary."""
+    """Get data for good cities as a dictionary.
+    This is the intermediate model shared by all processors: geometry,
+    stop data and transfer times are computed here once. Processors
+    must not modify it, so that they may consume it concurrently.
+    Element ids are formatted as strings like "n123" here.
+    """
     data = {
         "stopareas": {},  # stoparea id => stoparea data
         "networks": {},  # city name => city data
-        "transfers": {},  # set(tuple(stoparea_id1, stoparea_id2)), id1<id2
+        "transfers": {},  # (stoparea1_id, stoparea2_id) => time; id1<id2
     }
 
     for city in (c for c in cities if c.is_good):
@@ -37,7 +147,7 @@ def transit_to_dict(cities: list[City], transfers: TransfersT) -> dict:
 
         for route_master in city:
             route_data = {
-                "id": route_master.id,
+                "id": format_id(route_master.id),
                 "mode": route_master.mode,
                 "ref": route_master.ref,
                 "name": route_master.name,
@@ -48,7 +158,7 @@ def transit_to_dict(cities: list[City], transfers: TransfersT) -> dict:
 
             for route in route_master:
                 variant_data = {
-                    "id": route.id,
+                    "id": format_id(route.id),
                     "tracks": route.get_tracks_geometry(),
                     "start_time": route.start_time,
                     "end_time": route.end_time,
@@ -56,7 +166,7 @@ def transit_to_dict(cities: list[City], transfers: TransfersT) -> dict:
                     "duration": route.duration,
                     "stops": [
                         {
-                            "stoparea_id": route_stop.stoparea.id,
+                            "stoparea_id": format_id(route_stop.stoparea.id),
                             "distance": route_stop.distance,
                         }
                         for route_stop in route.stops
@@ -67,27 +177,11 @@ def transit_to_dict(cities: list[City], transfers: TransfersT) -> dict:
                 # and that have not been stored yet
                 for route_stop in route.stops:
                     stoparea = route_stop.stoparea
-                    if stoparea.id in data["stopareas"]:
-                        continue
-                    stoparea_data = {
-                        "id": stoparea.id,
-                        "center": stoparea.center,
-                        "name": stoparea.station.name,
-                        "entrances": [
-                            {
-                                "id": egress_id,
-                                "name": egress["tags"].get("name"),
-                                "ref": egress["tags"].get("ref"),
-                                "center": el_center(egress),
-                            }
-                            for (egress_id, egress) in (
-                                (egress_id, city.elements[egress_id])
-                                for egress_id in stoparea.entrances
-                                | stoparea.exits
-                            )
-                        ],
-                    }
-                    data["stopareas"][stoparea.id] = stoparea_data
+                    stoparea_id = format_id(stoparea.id)
+                    if stoparea_id not in data["stopareas"]:
+                        data["stopareas"][stoparea_id] = _stoparea_to_dict(
+                            city, stoparea
+                        )
 
                 route_data["itineraries"].append(variant_data)
 
@@ -96,18 +190,21 @@ def transit_to_dict(cities: list[City], transfers: TransfersT) -> dict:
         data["networks"][city.name] = network
 
     # transfers
-    pairwise_transfers = set()
+    stopareas = data["stopareas"]
+    pairwise_transfers = {}
     for stoparea_id_set in transfers:
-        stoparea_ids = sorted(stoparea_id_set)
+        stoparea_ids = sorted(format_id(i) for i in stoparea_id_set)
         for first_i in range(len(stoparea_ids) - 1):
             for second_i in range(first_i + 1, len(stoparea_ids)):
                 stoparea1_id = stoparea_ids[first_i]
                 stoparea2_id = stoparea_ids[second_i]
-                if all(
-                    st_id in data["stopareas"]
-                    for st_id in (stoparea1_id, stoparea2_id)
-                ):
-                    pairwise_transfers.add((stoparea1_id, stoparea2_id))
+                if stoparea1_id in stopareas and stoparea2_id in stopareas:
+                    pairwise_transfers[
+                        (stoparea1_id, stoparea2_id)
+                    ] = transfer_time(
+                        stopareas[stoparea1_id]["center"],
+                        stopareas[stoparea2_id]["center"],
+                    )
 
     data["transfers"] = pairwise_transfers
     return data
@@ -1,24 +1,29 @@
 from __future__ import annotations
 
+import argparse
 import csv
+import hashlib
+import io
+import shutil
 import typing
-from functools import partial
-from io import BytesIO, StringIO
-from itertools import permutations
+import zipfile
+import zlib
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from io import BufferedWriter, TextIOWrapper
+from itertools import accumulate, permutations
 from tarfile import TarFile, TarInfo
-from zipfile import ZipFile
+from tempfile import TemporaryFile
+from typing import IO, TextIO
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
 
 from ._common import (
     DEFAULT_AVE_VEHICLE_SPEED,
     DEFAULT_INTERVAL,
     format_colour,
     KMPH_TO_MPS,
-    SPEED_ON_TRANSFER,
-    TRANSFER_PENALTY,
-    transit_to_dict,
 )
-from subways.types import TransfersT
-from subways.geom_utils import distance
+from subways.geom_utils import distance, simplify_line
 
 if typing.TYPE_CHECKING:
     from subways.structure.city import City
@@ -28,6 +33,21 @@ DEFAULT_TRIP_START_TIME = (5, 0)  # 05:00
 DEFAULT_TRIP_END_TIME = (1, 0)  # 01:00
 COORDINATE_PRECISION = 7  # fractional digits. It's OSM precision, ~ 5 cm
 
+# Compression methods of zip members, by command line names
+ZIP_COMPRESSION_METHODS = {
+    "stored": ZIP_STORED,
+    "deflate": ZIP_DEFLATED,
+}
+# Zstandard in zip is only available since python 3.14,
+# and is not yet supported by many GTFS consumers
+if hasattr(zipfile, "ZIP_ZSTANDARD"):
+    ZIP_COMPRESSION_METHODS["zstd"] = zipfile.ZIP_ZSTANDARD
+DEFAULT_ZIP_COMPRESSION = "deflate"
+# ZipFile.open() dates members added by name with 1980-01-01. Members
+# compressed in parallel get the same date, so an archive does not
+# depend on the number of workers nor on the time it was made.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
 GTFS_COLUMNS = {
     "agency": [
         "agency_id",
@@ -144,32 +164,60 @@ def round_coords(coords_tuple: tuple) -> tuple:
     )
 
 
-def transit_data_to_gtfs(data: dict) -> dict:
-    # Keys correspond GTFS file names
-    gtfs_data = {key: [] for key in GTFS_COLUMNS.keys()}
+def _iter_itineraries(data: dict) -> Iterator[tuple[dict, dict, dict]]:
+    """Yield (network, route_master, itinerary) triples of transit data."""
+    for network in data["networks"].values():
+        for route_master in network["routes"]:
+            for itinerary in route_master["itineraries"]:
+                yield network, route_master, itinerary
+
+
+def _shape_id(itinerary: dict) -> str:
+    return itinerary["id"][1:]  # truncate leading 'r'
 
-    # GTFS calendar
-    gtfs_data["calendar"].append(
-        {
-            "service_id": "always",
-            "monday": 1,
-            "tuesday": 1,
-            "wednesday": 1,
-            "thursday": 1,
-            "friday": 1,
-            "saturday": 1,
-            "sunday": 1,
-            "start_date": "19700101",
-            "end_date": "30000101",
-        }
-    )
 
-    # GTFS stops
+def get_shape_ids(data: dict) -> dict[str, str]:
+    """Itineraries with identical geometry share one GTFS shape.
+    Return itinerary id => shape id, the latter being derived from
+    the first itinerary with that geometry.
+    """
+    shape_ids = {}
+    shape_id_by_hash = {}
+    for _, _, itinerary in _iter_itineraries(data):
+        # Geometries that coincide at the output precision are identical
+        geometry_hash = hashlib.blake2b(
+            repr(
+                [round_coords(point) for point in itinerary["tracks"]]
+            ).encode(),
+            digest_size=16,
+        ).digest()
+        shape_ids[itinerary["id"]] = shape_id_by_hash.setdefault(
+            geometry_hash, _shape_id(itinerary)
+        )
+    return shape_ids
+
+
+def gtfs_calendar(data: dict) -> Iterator[dict]:
+    yield {
+        "service_id": "always",
+        "monday": 1,
+        "tuesday": 1,
+        "wednesday": 1,
+        "thursday": 1,
+        "friday": 1,
+        "saturday": 1,
+        "sunday": 1,
+        "start_date": "19700101",
+        "end_date": "30000101",
+    }
+
+
+def gtfs_stops(data: dict) -> Iterator[dict]:
     for stoparea_id, stoparea_data in data["stopareas"].items():
         station_id = f"{stoparea_id}_st"
         station_name = stoparea_data["name"]
         station_center = round_coords(stoparea_data["center"])
-        station_gtfs = {
+        yield {
             "stop_id": station_id,
             "stop_code": station_id,
             "stop_name": station_name,
@@ -177,10 +225,9 @@ def transit_data_to_gtfs(data: dict) -> dict:
             "stop_lon": station_center[0],
             "location_type": 1,  # station in GTFS terms
         }
-        gtfs_data["stops"].append(station_gtfs)
 
         platform_id = f"{stoparea_id}_plt"
-        platform_gtfs = {
+        yield {
             "stop_id": platform_id,
             "stop_code": platform_id,
             "stop_name": station_name,
@@ -189,11 +236,10 @@ def transit_data_to_gtfs(data: dict) -> dict:
             "location_type": 0,  # stop/platform in GTFS terms
             "parent_station": station_id,
         }
-        gtfs_data["stops"].append(platform_gtfs)
 
         if not stoparea_data["entrances"]:
             entrance_id = f"{stoparea_id}_egress"
-            entrance_gtfs = {
+            yield {
                 "stop_id": entrance_id,
                 "stop_code": entrance_id,
                 "stop_name": station_name,
@@ -202,7 +248,6 @@ def transit_data_to_gtfs(data: dict) -> dict:
                 "location_type": 2,
                 "parent_station": station_id,
             }
-            gtfs_data["stops"].append(entrance_gtfs)
         else:
             for entrance in stoparea_data["entrances"]:
                 entrance_id = f"{entrance['id']}_{stoparea_id}"
@@ -213,7 +258,7 @@ def transit_data_to_gtfs(data: dict) -> dict:
                     if ref:
                         entrance_name += f" {ref}"
                 center = round_coords(entrance["center"])
-                entrance_gtfs = {
+                yield {
                     "stop_id": entrance_id,
                     "stop_code": entrance_id,
                     "stop_name": entrance_name,
@@ -222,18 +267,20 @@ def transit_data_to_gtfs(data: dict) -> dict:
                     "location_type": 2,
                     "parent_station": station_id,
                 }
-                gtfs_data["stops"].append(entrance_gtfs)
 
-    # agency, routes, trips, stop_times, frequencies, shapes
+
+def gtfs_agency(data: dict) -> Iterator[dict]:
     for network in data["networks"].values():
-        agency = {
+        yield {
             "agency_id": network["id"],
             "agency_name": network["name"],
         }
-        gtfs_data["agency"].append(agency)
 
+
+def gtfs_routes(data: dict) -> Iterator[dict]:
+    for network in data["networks"].values():
         for route_master in network["routes"]:
-            route = {
+            yield {
                 "route_id": route_master["id"],
                 "agency_id": network["id"],
                 "route_type": 12 if route_master["mode"] == "monorail" else 1,
@@ -241,113 +288,205 @@ def transit_data_to_gtfs(data: dict) -> dict:
                 "route_long_name": route_master["name"],
                 "route_color": format_colour(route_master["colour"]),
             }
-            gtfs_data["routes"].append(route)
 
-            for itinerary in route_master["itineraries"]:
-                shape_id = itinerary["id"][1:]  # truncate leading 'r'
-                average_speed = round(
-                    (
-                        DEFAULT_AVE_VEHICLE_SPEED
-                        if not itinerary["duration"]
-                        else itinerary["stops"][-1]["distance"]
-                        / itinerary["duration"]
-                    )
-                    / KMPH_TO_MPS,
-                    1,
-                )  # km/h
-                trip = {
-                    "trip_id": itinerary["id"],
-                    "route_id": route_master["id"],
-                    "service_id": "always",
-                    "shape_id": shape_id,
-                    "average_speed": average_speed,
-                }
-                gtfs_data["trips"].append(trip)
-
-                for i, (lon, lat) in enumerate(itinerary["tracks"]):
-                    lon, lat = round_coords((lon, lat))
-                    gtfs_data["shapes"].append(
-                        {
-                            "shape_id": shape_id,
-                            "trip_id": itinerary["id"],
-                            "shape_pt_lat": lat,
-                            "shape_pt_lon": lon,
-                            "shape_pt_sequence": i,
-                        }
-                    )
 
-                start_time = itinerary["start_time"] or DEFAULT_TRIP_START_TIME
-                end_time = itinerary["end_time"] or DEFAULT_TRIP_END_TIME
-                if end_time <= start_time:
-                    end_time = (end_time[0] + 24, end_time[1])
-                start_time = f"{start_time[0]:02d}:{start_time[1]:02d}:00"
-                end_time = f"{end_time[0]:02d}:{end_time[1]:02d}:00"
-
-                gtfs_data["frequencies"].append(
-                    {
-                        "trip_id": itinerary["id"],
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "headway_secs": itinerary["interval"]
-                        or DEFAULT_INTERVAL,
-                    }
+def gtfs_trips(data: dict, shape_ids: dict[str, str]) -> Iterator[dict]:
+    for _, route_master, itinerary in _iter_itineraries(data):
+        average_speed = round(
+            (
+                DEFAULT_AVE_VEHICLE_SPEED
+                if not itinerary["duration"]
+                else itinerary["stops"][-1]["distance"] / itinerary["duration"]
+            )
+            / KMPH_TO_MPS,
+            1,
+        )  # km/h
+        yield {
+            "trip_id": itinerary["id"],
+            "route_id": route_master["id"],
+            "service_id": "always",
+            "shape_id": shape_ids[itinerary["id"]],
+            "average_speed": average_speed,
+        }
+
+
+def gtfs_shapes(
+    data: dict, shape_ids: dict[str, str], tolerance: float = 0.0
+) -> Iterator[dict]:
+    """:param tolerance: Douglas-Peucker simplification tolerance in meters,
+    0 means no simplification.
+    """
+    for _, _, itinerary in _iter_itineraries(data):
+        shape_id = shape_ids[itinerary["id"]]
+        if shape_id != _shape_id(itinerary):
+            continue  # The shape has been written for another itinerary
+        tracks = itinerary["tracks"]
+        # Distances are calculated along the original geometry
+        # to be consistent with shape_dist_traveled in stop_times
+        cumulative_distances = list(
+            accumulate(
+                (
+                    distance(tracks[i - 1], tracks[i]) if i else 0.0
+                    for i in range(len(tracks))
                 )
+            )
+        )
+        for sequence, i in enumerate(simplify_line(tracks, tolerance)):
+            lon, lat = round_coords(tracks[i])
+            yield {
+                "shape_id": shape_id,
+                "shape_pt_lat": lat,
+                "shape_pt_lon": lon,
+                "shape_pt_sequence": sequence,
+                "shape_dist_traveled": round(cumulative_distances[i], 1),
+            }
 
-                for i, route_stop in enumerate(itinerary["stops"]):
-                    platform_id = f"{route_stop['stoparea_id']}_plt"
 
-                    gtfs_data["stop_times"].append(
-                        {
-                            "trip_id": itinerary["id"],
-                            "stop_sequence": i,
-                            "shape_dist_traveled": route_stop["distance"],
-                            "stop_id": platform_id,
-                        }
-                    )
+def gtfs_frequencies(data: dict) -> Iterator[dict]:
+    for _, _, itinerary in _iter_itineraries(data):
+        start_time = itinerary["start_time"] or DEFAULT_TRIP_START_TIME
+        end_time = itinerary["end_time"] or DEFAULT_TRIP_END_TIME
+        if end_time <= start_time:
+            end_time = (end_time[0] + 24, end_time[1])
+        start_time = f"{start_time[0]:02d}:{start_time[1]:02d}:00"
+        end_time = f"{end_time[0]:02d}:{end_time[1]:02d}:00"
+
+        yield {
+            "trip_id": itinerary["id"],
+            "start_time": start_time,
+            "end_time": end_time,
+            "headway_secs": itinerary["interval"] or DEFAULT_INTERVAL,
+        }
 
-    # transfers
-    for stoparea1_id, stoparea2_id in data["transfers"]:
-        stoparea1 = data["stopareas"][stoparea1_id]
-        stoparea2 = data["stopareas"][stoparea2_id]
-        transfer_time = TRANSFER_PENALTY + round(
-            distance(stoparea1["center"], stoparea2["center"])
-            / SPEED_ON_TRANSFER
-        )
-        gtfs_sa_id1 = f"{stoparea1['id']}_st"
-        gtfs_sa_id2 = f"{stoparea2['id']}_st"
+
+def gtfs_stop_times(data: dict) -> Iterator[dict]:
+    for _, _, itinerary in _iter_itineraries(data):
+        for i, route_stop in enumerate(itinerary["stops"]):
+            platform_id = f"{route_stop['stoparea_id']}_plt"
+
+            yield {
+                "trip_id": itinerary["id"],
+                "stop_sequence": i,
+                "shape_dist_traveled": route_stop["distance"],
+                "stop_id": platform_id,
+            }
+
+
+def gtfs_transfers(data: dict) -> Iterator[dict]:
+    for (stoparea1_id, stoparea2_id), transfer_time in data[
+        "transfers"
+    ].items():
+        gtfs_sa_id1 = f"{stoparea1_id}_st"
+        gtfs_sa_id2 = f"{stoparea2_id}_st"
         for id1, id2 in permutations((gtfs_sa_id1, gtfs_sa_id2)):
-            gtfs_data["transfers"].append(
-                {
-                    "from_stop_id": id1,
-                    "to_stop_id": id2,
-                    "transfer_type": 0,
-                    "min_transfer_time": transfer_time,
-                }
-            )
+            yield {
+                "from_stop_id": id1,
+                "to_stop_id": id2,
+                "transfer_type": 0,
+                "min_transfer_time": transfer_time,
+            }
 
-    return gtfs_data
+
+def iter_gtfs_data(
+    data: dict, shape_tolerance: float = 0.0
+) -> dict[str, Iterator[dict]]:
+    """Return lazy iterators over records of each GTFS table.
+    Records are generated on demand, so a table can be written
+    to a file without keeping it in memory.
+    :param shape_tolerance: shapes simplification tolerance in meters
+    """
+    shape_ids = get_shape_ids(data)
+    # Keys correspond GTFS file names
+    return {
+        "agency": gtfs_agency(data),
+        "routes": gtfs_routes(data),
+        "trips": gtfs_trips(data, shape_ids),
+        "stops": gtfs_stops(data),
+        "calendar": gtfs_calendar(data),
+        "stop_times": gtfs_stop_times(data),
+        "frequencies": gtfs_frequencies(data),
+        "shapes": gtfs_shapes(data, shape_ids, shape_tolerance),
+        "transfers": gtfs_transfers(data),
+    }
+
+
+def transit_data_to_gtfs(data: dict, shape_tolerance: float = 0.0) -> dict:
+    return {
+        gtfs_feature: list(records)
+        for gtfs_feature, records in iter_gtfs_data(
+            data, shape_tolerance
+        ).items()
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add GTFS-specific options to the command line parser.
+    Option values are passed to process() as keyword arguments
+    with "gtfs_" prefix stripped.
+    """
+    parser.add_argument(
+        "--gtfs-compression",
+        choices=sorted(ZIP_COMPRESSION_METHODS),
+        default=DEFAULT_ZIP_COMPRESSION,
+        help="Compression method of GTFS zip archive members",
+    )
+    parser.add_argument(
+        "--gtfs-compression-level",
+        type=int,
+        help=(
+            "Compression level, e.g. 0-9 for deflate. "
+            "Default depends on the compression method"
+        ),
+    )
+    parser.add_argument(
+        "--gtfs-shape-tolerance",
+        type=float,
+        default=0.0,
+        help=(
+            "Simplify GTFS shapes with this tolerance in meters. "
+            "Shapes are not simplified by default"
+        ),
+    )
+    parser.add_argument(
+        "--gtfs-workers",
+        type=int,
+        default=1,
+        help="Number of threads to compress GTFS tables in parallel",
+    )
 
 
 def process(
     cities: list[City],
-    transfers: TransfersT,
+    transit_data: dict,
     filename: str,
     cache_path: str | None,
+    compression: str = DEFAULT_ZIP_COMPRESSION,
+    compression_level: int | None = None,
+    workers: int = 1,
+    shape_tolerance: float = 0.0,
 ) -> None:
     """Generate all output and save to file.
     :param cities: list of City instances
-    :param transfers: all collected transfers in the world
+    :param transit_data: transit model made with transit_to_dict()
     :param filename: Path to file to save the result
     :param cache_path: Path to json-file with good cities cache or None.
+    :param compression: Compression method name for zip output,
+        one of ZIP_COMPRESSION_METHODS keys
+    :param compression_level: Compression level or None for the default
+    :param workers: Number of threads to compress tables in
+    :param shape_tolerance: Shapes simplification tolerance in meters
     """
 
-    transit_data = transit_to_dict(cities, transfers)
-    gtfs_data = transit_data_to_gtfs(transit_data)
-
     # TODO: make universal cache for all processors,
     #       and apply the cache to GTFS
 
-    make_gtfs(filename, gtfs_data)
+    make_gtfs(
+        filename,
+        iter_gtfs_data(transit_data, shape_tolerance),
+        compression=compression,
+        compression_level=compression_level,
+        workers=workers,
+    )
 
 
 def dict_to_row(dict_data: dict, record_type: str) -> list:
@@ -360,50 +499,211 @@ def dict_to_row(dict_data: dict, record_type: str) -> list:
     ]
 
 
-def make_gtfs(filename: str, gtfs_data: dict, fmt: str | None = None) -> None:
+def write_gtfs_table(
+    f: TextIO, gtfs_feature: str, records: Iterable[dict]
+) -> None:
+    """Write GTFS records as CSV row by row."""
+    writer = csv.writer(f, delimiter=",")
+    writer.writerow(GTFS_COLUMNS[gtfs_feature])
+    for record in records:
+        writer.writerow(dict_to_row(record, gtfs_feature))
+
+
+def make_gtfs(
+    filename: str,
+    gtfs_data: Mapping[str, Iterable[dict]],
+    fmt: str | None = None,
+    **zip_options,
+) -> None:
+    """:param gtfs_data: GTFS table name => iterable of records.
+    Iterables may be lazy, e.g. those obtained with iter_gtfs_data().
+    :param zip_options: keyword arguments for make_gtfs_zip()
+    """
     if not fmt:
         fmt = "tar" if filename.endswith(".tar") else "zip"
 
     if fmt == "zip":
-        make_gtfs_zip(filename, gtfs_data)
+        make_gtfs_zip(filename, gtfs_data, **zip_options)
     else:
         make_gtfs_tar(filename, gtfs_data)
 
 
-def make_gtfs_zip(filename: str, gtfs_data: dict) -> None:
+def make_gtfs_zip(
+    filename: str,
+    gtfs_data: Mapping[str, Iterable[dict]],
+    compression: str = DEFAULT_ZIP_COMPRESSION,
+    compression_level: int | None = None,
+    workers: int = 1,
+) -> None:
+    """Write GTFS tables into a zip archive.
+    With deflate compression and more than one worker, tables are
+    rendered and compressed concurrently in a thread pool.
+    """
     if not filename.lower().endswith(".zip"):
         filename = f"{filename}.zip"
 
-    with ZipFile(filename, "w") as zf:
-        for gtfs_feature, columns in GTFS_COLUMNS.items():
-            with StringIO(newline="") as string_io:
-                writer = csv.writer(string_io, delimiter=",")
-                writer.writerow(columns)
-                writer.writerows(
-                    map(
-                        partial(dict_to_row, record_type=gtfs_feature),
-                        gtfs_data[gtfs_feature],
+    if compression not in ZIP_COMPRESSION_METHODS:
+        raise ValueError(
+            f"Unsupported zip compression method '{compression}', "
+            f"use one of: {', '.join(sorted(ZIP_COMPRESSION_METHODS))}"
+        )
+    compress_type = ZIP_COMPRESSION_METHODS[compression]
+
+    with ZipFile(
+        filename,
+        "w",
+        compression=compress_type,
+        compresslevel=compression_level,
+    ) as zf:
+        if compress_type == ZIP_DEFLATED and workers > 1:
+            _write_deflated_tables_in_parallel(
+                zf, gtfs_data, compression_level, workers
+            )
+            return
+
+        for gtfs_feature in GTFS_COLUMNS:
+            with zf.open(f"{gtfs_feature}.txt", "w") as binary_file:
+                with TextIOWrapper(
+                    binary_file, encoding="utf-8", newline=""
+                ) as text_file:
+                    write_gtfs_table(
+                        text_file, gtfs_feature, gtfs_data[gtfs_feature]
                     )
-                )
-                zf.writestr(f"{gtfs_feature}.txt", string_io.getvalue())
 
 
-def make_gtfs_tar(filename: str, gtfs_data: dict) -> None:
+class _RawDeflateWriter(io.RawIOBase):
+    """Binary stream that deflates written data into a file
+    and tracks CRC-32 and size of the uncompressed data,
+    as needed for a zip member header.
+    """
+
+    def __init__(self, out_file: IO[bytes], level: int | None) -> None:
+        self.out_file = out_file
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        # Negative wbits produce a raw deflate stream with no zlib header,
+        # which is exactly what a deflated zip member contains
+        self._compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+            zlib.DEFLATED,
+            -zlib.MAX_WBITS,
+        )
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += len(data)
+        self._write_compressed(self._compressor.compress(data))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._write_compressed(self._compressor.flush())
+        super().close()
+
+    def _write_compressed(self, compressed_data: bytes) -> None:
+        self.out_file.write(compressed_data)
+        self.compress_size += len(compressed_data)
+
+
+def _deflate_gtfs_table(
+    gtfs_feature: str, records: Iterable[dict], level: int | None
+) -> tuple[ZipInfo, IO[bytes]]:
+    """Render a GTFS table into a temporary file as a deflated zip
+    member's data. Return the member's ZipInfo and the file.
+    """
+    zinfo = ZipInfo(f"{gtfs_feature}.txt", date_time=ZIP_DATE_TIME)
+    zinfo.compress_type = ZIP_DEFLATED
+    zinfo.external_attr = 0o600 << 16  # ?rw-------, as ZipFile.open() does
+
+    compressed_file = TemporaryFile()
+    raw_writer = _RawDeflateWriter(compressed_file, level)
+    with TextIOWrapper(
+        BufferedWriter(raw_writer), encoding="utf-8", newline=""
+    ) as text_file:
+        write_gtfs_table(text_file, gtfs_feature, records)
+
+    zinfo.CRC = raw_writer.crc
+    zinfo.file_size = raw_writer.file_size
+    zinfo.compress_size = raw_writer.compress_size
+    compressed_file.seek(0)
+    return zinfo, compressed_file
+
+
+def _append_precompressed_member(
+    zf: ZipFile, zinfo: ZipInfo, compressed_file: IO[bytes]
+) -> None:
+    """zipfile module has no public API to add already compressed data,
+    so the local file header is written the same way ZipFile.open() does.
+    The central directory is written by ZipFile.close() from zf.filelist.
+
+    This relies on CPython zipfile internals, which are not a public API
+    and may change in a new Python version: ZipFile.fp, ZipFile.start_dir,
+    ZipFile.filelist, ZipFile.NameToInfo, ZipInfo.header_offset and
+    ZipInfo.FileHeader(). test__make_gtfs__parallel_deflate_members checks
+    the resulting archive.
+    """
+    zip64 = (
+        zinfo.file_size > zipfile.ZIP64_LIMIT
+        or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    )
+    zf.fp.seek(zf.start_dir)
+    zinfo.header_offset = zf.fp.tell()
+    zf.fp.write(zinfo.FileHeader(zip64))
+    shutil.copyfileobj(compressed_file, zf.fp)
+    zf.start_dir = zf.fp.tell()
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+
+
+def _write_deflated_tables_in_parallel(
+    zf: ZipFile,
+    gtfs_data: Mapping[str, Iterable[dict]],
+    level: int | None,
+    workers: int,
+) -> None:
+    # zlib releases the GIL while compressing,
+    # so threads give real parallelism here
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _deflate_gtfs_table,
+                gtfs_feature,
+                gtfs_data[gtfs_feature],
+                level,
+            )
+            for gtfs_feature in GTFS_COLUMNS
+        ]
+        # Members are added in the usual order of GTFS tables
+        for future in futures:
+            zinfo, compressed_file = future.result()
+            with compressed_file:
+                _append_precompressed_member(zf, zinfo, compressed_file)
+
+
+def make_gtfs_tar(
+    filename: str, gtfs_data: Mapping[str, Iterable[dict]]
+) -> None:
     if not filename.lower().endswith(".tar"):
         filename = f"{filename}.tar"
 
     with TarFile(filename, "w") as tf:
-        for gtfs_feature, columns in GTFS_COLUMNS.items():
-            with StringIO(newline="") as string_io:
-                writer = csv.writer(string_io, delimiter=",")
-                writer.writerow(columns)
-                writer.writerows(
-                    map(
-                        partial(dict_to_row, record_type=gtfs_feature),
-                        gtfs_data[gtfs_feature],
-                    )
+        for gtfs_feature in GTFS_COLUMNS:
+            # A tar member header must contain the member size, so the table
+            # is spooled to a temporary file rather than to memory.
+            with TemporaryFile() as tmp_file:
+                text_file = TextIOWrapper(
+                    tmp_file, encoding="utf-8", newline=""
+                )
+                write_gtfs_table(
+                    text_file, gtfs_feature, gtfs_data[gtfs_feature]
                 )
+                text_file.flush()
+                text_file.detach()
                 tarinfo = TarInfo(f"{gtfs_feature}.txt")
-                data = string_io.getvalue().encode()
-                tarinfo.size = len(data)
-                tf.addfile(tarinfo, BytesIO(data))
+                tarinfo.size = tmp_file.tell()
+                tmp_file.seek(0)
+                tf.addfile(tarinfo, tmp_file)
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import json
 import logging
-import os
 import typing
 from collections import defaultdict
 from collections.abc import Callable
@@ -10,21 +9,19 @@ from typing import Any, TypeAlias
 
 from subways.consts import DISPLACEMENT_TOLERANCE
 from subways.geom_utils import distance
-from subways.osm_element import el_center
+from subways.osm_element import el_center, make_id
 from subways.structure.station import Station
-from subways.types import IdT, LonLat, OsmElementT, TransfersT
+from subways.subway_io import CityShards
+from subways.types import LonLat
 from ._common import (
     DEFAULT_AVE_VEHICLE_SPEED,
     DEFAULT_INTERVAL,
     format_colour,
     KMPH_TO_MPS,
-    SPEED_ON_TRANSFER,
-    TRANSFER_PENALTY,
 )
 
 if typing.TYPE_CHECKING:
     from subways.structure.city import City
-    from subways.structure.stop_area import StopArea
 
 
 OSM_TYPES = {"n": (0, "node"), "w": (2, "way"), "r": (3, "relation")}
@@ -35,7 +32,7 @@ SPEED_TO_ENTRANCE = 5 * KMPH_TO_MPS  # m/s
 TransferTimesT: TypeAlias = dict[tuple[int, int], int]
 
 
-def uid(elid: IdT, typ: str | None = None) -> int:
+def uid(elid: str, typ: str | None = None) -> int:
     t = elid[0]
     osm_id = int(elid[1:])
     if not typ:
@@ -82,17 +79,14 @@ class MapsmeCache:
             return
         self.cache_path = cache_path
         self.is_used = True
+        self.shards = CityShards(cache_path)
+        # Only cities being processed are read
         self.cache = {}
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, "r", encoding="utf-8") as f:
-                    self.cache = json.load(f)
-            except json.decoder.JSONDecodeError:
-                logging.warning(
-                    "City cache '%s' is not a valid json file. "
-                    "Building cache from scratch.",
-                    cache_path,
-                )
+        for city in cities:
+            city_cache_data = self.shards.read(city.name)
+            if city_cache_data is not None:
+                self.cache[city.name] = city_cache_data
+        self.updated_city_names = set()
         self.recovered_city_names = set()
         # One stoparea may participate in routes of different cities
         self.stop_cities = defaultdict(set)  # stoparea id -> city names
@@ -105,8 +99,8 @@ class MapsmeCache:
         """
         city_cache_data = self.cache[city.name]
         for stoparea_id, cached_stoparea in city_cache_data["stops"].items():
-            station_id = cached_stoparea["osm_type"][0] + str(
-                cached_stoparea["osm_id"]
+            station_id = make_id(
+                cached_stoparea["osm_type"], cached_stoparea["osm_id"]
             )
             city_station = city.elements.get(station_id)
             if not city_station or not Station.is_station(
@@ -153,6 +147,7 @@ class MapsmeCache:
     def initialize_good_city(self, city_name: str, network: dict) -> None:
         """Create/replace one cache element with new data container.
         This should be done for each good city."""
+        self.updated_city_names.add(city_name)
         self.cache[city_name] = {
             "network": network,
             "stops": {},  # stoparea el_id -> jsonified stop data
@@ -161,13 +156,13 @@ class MapsmeCache:
         }
 
     @if_object_is_used
-    def link_stop_with_city(self, stoparea_id: IdT, city_name: str) -> None:
+    def link_stop_with_city(self, stoparea_id: str, city_name: str) -> None:
         """Remember that some stop_area is used in a city."""
         stoparea_uid = uid(stoparea_id)
         self.stop_cities[stoparea_uid].add(city_name)
 
     @if_object_is_used
-    def add_stop(self, stoparea_id: IdT, st: dict) -> None:
+    def add_stop(self, stoparea_id: str, st: dict) -> None:
         """Add stoparea to the cache of each city the stoparea is in."""
         stoparea_uid = uid(stoparea_id)
         for city_name in self.stop_cities[stoparea_uid]:
@@ -189,215 +184,145 @@ class MapsmeCache:
 
     @if_object_is_used
     def save(self) -> None:
+        """Write cache files of good cities. Files of other cities,
+        including the ones not processed in this run, are kept."""
         try:
-            with open(self.cache_path, "w", encoding="utf-8") as f:
-                json.dump(self.cache, f, ensure_ascii=False)
+            for city_name in sorted(self.updated_city_names):
+                self.shards.write(city_name, self.cache[city_name])
         except Exception as e:
             logging.warning("Failed to save cache: %s", str(e))
 
 
+def _egress_to_mapsme(
+    egress_id: str, center: LonLat, stop_center: LonLat
+) -> dict:
+    return {
+        "osm_type": OSM_TYPES[egress_id[0]][1],
+        "osm_id": int(egress_id[1:]),
+        "lon": center[0],
+        "lat": center[1],
+        "distance": ENTRANCE_PENALTY
+        + round(distance(center, stop_center) / SPEED_TO_ENTRANCE),
+    }
+
+
+def _stoparea_to_mapsme(stoparea: dict) -> dict:
+    st = {
+        "name": stoparea["name"],
+        "int_name": stoparea["int_name"],
+        "lat": stoparea["center"][1],
+        "lon": stoparea["center"][0],
+        "osm_type": OSM_TYPES[stoparea["station_id"][0]][1],
+        "osm_id": int(stoparea["station_id"][1:]),
+        "id": uid(stoparea["id"]),
+        "entrances": [],
+        "exits": [],
+    }
+    for egress in stoparea["entrances"]:
+        if egress["id"][0] != "n":
+            continue
+        for k, is_used in (
+            ("entrances", egress["can_enter"]),
+            ("exits", egress["can_exit"]),
+        ):
+            if is_used:
+                st[k].append(
+                    _egress_to_mapsme(
+                        egress["id"], egress["center"], stoparea["center"]
+                    )
+                )
+    if not stoparea["entrances"]:
+        if stoparea["has_platforms"]:
+            for egress in stoparea["platform_exits"]:
+                for k in ("entrances", "exits"):
+                    st[k].append(
+                        _egress_to_mapsme(
+                            egress["id"], egress["center"], stoparea["center"]
+                        )
+                    )
+        else:
+            center = stoparea["element_center"]
+            for k in ("entrances", "exits"):
+                st[k].append(
+                    {
+                        "osm_type": st["osm_type"],
+                        "osm_id": st["osm_id"],
+                        "lon": center[0],
+                        "lat": center[1],
+                        "distance": 60,
+                    }
+                )
+    return st
+
+
 def transit_data_to_mapsme(
-    cities: list[City], transfers: TransfersT, cache_path: str | None
+    cities: list[City], transit_data: dict, cache_path: str | None
 ) -> dict:
     """Generate all output and save to file.
     :param cities: List of City instances
-    :param transfers: List of sets of StopArea.id
-    :param cache_path: Path to json-file with good cities cache or None.
+    :param transit_data: transit model made with transit_to_dict()
+    :param cache_path: Path to good cities cache directory or None.
     """
-
-    def find_exits_for_platform(
-        center: LonLat, nodes: list[OsmElementT]
-    ) -> list[OsmElementT]:
-        exits = []
-        min_distance = None
-        for n in nodes:
-            d = distance(center, (n["lon"], n["lat"]))
-            if not min_distance:
-                min_distance = d * 2 / 3
-            elif d < min_distance:
-                continue
-            too_close = False
-            for e in exits:
-                d = distance((e["lon"], e["lat"]), (n["lon"], n["lat"]))
-                if d < min_distance:
-                    too_close = True
-                    break
-            if not too_close:
-                exits.append(n)
-        return exits
-
     cache = MapsmeCache(cache_path, cities)
 
-    stop_areas: dict[IdT, StopArea] = {}
-    stops: dict[IdT, dict] = {}  # stoparea el_id -> stop jsonified data
+    stops: dict[str, dict] = {}  # stoparea el_id -> stop jsonified data
     networks = []
-    good_cities = [c for c in cities if c.is_good]
-    platform_nodes = {}
     cache.provide_stops_and_networks(stops, networks)
 
-    for city in good_cities:
-        network = {"network": city.name, "routes": [], "agency_id": city.id}
-        cache.initialize_good_city(city.name, network)
-        for route in city:
+    for city_name, city_data in transit_data["networks"].items():
+        network = {
+            "network": city_name,
+            "routes": [],
+            "agency_id": city_data["id"],
+        }
+        cache.initialize_good_city(city_name, network)
+        for route in city_data["routes"]:
             routes = {
-                "type": route.mode,
-                "ref": route.ref,
-                "name": route.name,
-                "colour": format_colour(route.colour),
-                "route_id": uid(route.id, "r"),
+                "type": route["mode"],
+                "ref": route["ref"],
+                "name": route["name"],
+                "colour": format_colour(route["colour"]),
+                "route_id": uid(route["id"], "r"),
                 "itineraries": [],
             }
-            if route.infill:
+            if route["infill"]:
                 routes["casing"] = routes["colour"]
-                routes["colour"] = format_colour(route.infill)
-            for i, variant in enumerate(route):
+                routes["colour"] = format_colour(route["infill"])
+            for variant in route["itineraries"]:
                 itin = []
-                for stop in variant:
-                    stop_areas[stop.stoparea.id] = stop.stoparea
-                    cache.link_stop_with_city(stop.stoparea.id, city.name)
+                for stop in variant["stops"]:
+                    cache.link_stop_with_city(stop["stoparea_id"], city_name)
                     itin.append(
                         [
-                            uid(stop.stoparea.id),
-                            round(stop.distance / DEFAULT_AVE_VEHICLE_SPEED),
+                            uid(stop["stoparea_id"]),
+                            round(
+                                stop["distance"] / DEFAULT_AVE_VEHICLE_SPEED
+                            ),
                         ]
                     )
-                    # Make exits from platform nodes,
-                    # if we don't have proper exits
-                    if (
-                        len(stop.stoparea.entrances) + len(stop.stoparea.exits)
-                        == 0
-                    ):
-                        for pl in stop.stoparea.platforms:
-                            pl_el = city.elements[pl]
-                            if pl_el["type"] == "node":
-                                pl_nodes = [pl_el]
-                            elif pl_el["type"] == "way":
-                                pl_nodes = [
-                                    city.elements.get("n{}".format(n))
-                                    for n in pl_el["nodes"]
-                                ]
-                            else:
-                                pl_nodes = []
-                                for m in pl_el["members"]:
-                                    if m["type"] == "way":
-                                        if (
-                                            "{}{}".format(
-                                                m["type"][0], m["ref"]
-                                            )
-                                            in city.elements
-                                        ):
-                                            pl_nodes.extend(
-                                                [
-                                                    city.elements.get(
-                                                        "n{}".format(n)
-                                                    )
-                                                    for n in city.elements[
-                                                        "{}{}".format(
-                                                            m["type"][0],
-                                                            m["ref"],
-                                                        )
-                                                    ]["nodes"]
-                                                ]
-                                            )
-                            pl_nodes = [n for n in pl_nodes if n]
-                            platform_nodes[pl] = find_exits_for_platform(
-                                stop.stoparea.centers[pl], pl_nodes
-                            )
-
                 routes["itineraries"].append(
                     {
                         "stops": itin,
                         "interval": round(
-                            variant.interval or DEFAULT_INTERVAL
+                            variant["interval"] or DEFAULT_INTERVAL
                         ),
                     }
                 )
             network["routes"].append(routes)
         networks.append(network)
 
-    for stop_id, stop in stop_areas.items():
-        st = {
-            "name": stop.name,
-            "int_name": stop.int_name,
-            "lat": stop.center[1],
-            "lon": stop.center[0],
-            "osm_type": OSM_TYPES[stop.station.id[0]][1],
-            "osm_id": int(stop.station.id[1:]),
-            "id": uid(stop.id),
-            "entrances": [],
-            "exits": [],
-        }
-        for e_l, k in ((stop.entrances, "entrances"), (stop.exits, "exits")):
-            for e in e_l:
-                if e[0] == "n":
-                    st[k].append(
-                        {
-                            "osm_type": "node",
-                            "osm_id": int(e[1:]),
-                            "lon": stop.centers[e][0],
-                            "lat": stop.centers[e][1],
-                            "distance": ENTRANCE_PENALTY
-                            + round(
-                                distance(stop.centers[e], stop.center)
-                                / SPEED_TO_ENTRANCE
-                            ),
-                        }
-                    )
-        if len(stop.entrances) + len(stop.exits) == 0:
-            if stop.platforms:
-                for pl in stop.platforms:
-                    for n in platform_nodes[pl]:
-                        for k in ("entrances", "exits"):
-                            st[k].append(
-                                {
-                                    "osm_type": n["type"],
-                                    "osm_id": n["id"],
-                                    "lon": n["lon"],
-                                    "lat": n["lat"],
-                                    "distance": ENTRANCE_PENALTY
-                                    + round(
-                                        distance(
-                                            (n["lon"], n["lat"]), stop.center
-                                        )
-                                        / SPEED_TO_ENTRANCE
-                                    ),
-                                }
-                            )
-            else:
-                for k in ("entrances", "exits"):
-                    st[k].append(
-                        {
-                            "osm_type": OSM_TYPES[stop.station.id[0]][1],
-                            "osm_id": int(stop.station.id[1:]),
-                            "lon": stop.centers[stop.id][0],
-                            "lat": stop.centers[stop.id][1],
-                            "distance": 60,
-                        }
-                    )
-
+    for stop_id, stoparea in transit_data["stopareas"].items():
+        st = _stoparea_to_mapsme(stoparea)
         stops[stop_id] = st
         cache.add_stop(stop_id, st)
 
     pairwise_transfers: TransferTimesT = {}
-    for stoparea_id_set in transfers:
-        stoparea_ids = list(stoparea_id_set)
-        for i_first in range(len(stoparea_ids) - 1):
-            for i_second in range(i_first + 1, len(stoparea_ids)):
-                stoparea1_id = stoparea_ids[i_first]
-                stoparea2_id = stoparea_ids[i_second]
-                if stoparea1_id in stops and stoparea2_id in stops:
-                    uid1 = uid(stoparea1_id)
-                    uid2 = uid(stoparea2_id)
-                    uid1, uid2 = sorted([uid1, uid2])
-                    transfer_time = TRANSFER_PENALTY + round(
-                        distance(
-                            stop_areas[stoparea1_id].center,
-                            stop_areas[stoparea2_id].center,
-                        )
-                        / SPEED_ON_TRANSFER
-                    )
-                    pairwise_transfers[(uid1, uid2)] = transfer_time
-                    cache.add_transfer(uid1, uid2, transfer_time)
+    for (stoparea1_id, stoparea2_id), transfer_time in transit_data[
+        "transfers"
+    ].items():
+        uid1, uid2 = sorted([uid(stoparea1_id), uid(stoparea2_id)])
+        pairwise_transfers[(uid1, uid2)] = transfer_time
+        cache.add_transfer(uid1, uid2, transfer_time)
 
     cache.provide_transfers(pairwise_transfers)
     cache.save()
@@ -417,20 +342,20 @@ def transit_data_to_mapsme(
 
 def process(
     cities: list[City],
-    transfers: TransfersT,
+    transit_data: dict,
     filename: str,
     cache_path: str | None,
 ) -> None:
     """Generate all output and save to file.
     :param cities: list of City instances
-    :param transfers: all collected transfers in the world
+    :param transit_data: transit model made with transit_to_dict()
     :param filename: Path to file to save the result
-    :param cache_path: Path to json-file with good cities cache or None.
+    :param cache_path: Path to good cities cache directory or None.
     """
     if not filename.lower().endswith("json"):
         filename = f"{filename}.json"
 
-    mapsme_transit = transit_data_to_mapsme(cities, transfers, cache_path)
+    mapsme_transit = transit_data_to_mapsme(cities, transit_data, cache_path)
 
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import typing
+from collections import defaultdict
+from collections.abc import Iterator
+
+from subways.geom_utils import simplify_line
+from subways.subway_io import slugify
+from subways.types import LonLat, RailT
+
+if typing.TYPE_CHECKING:
+    from subways.structure.city import City
+
+
+DEFAULT_MIN_ZOOM = 9
+DEFAULT_MAX_ZOOM = 14
+# Shapes are simplified at each zoom with this tolerance in screen pixels
+SIMPLIFICATION_TOLERANCE = 0.5  # pixels
+EARTH_CIRCUMFERENCE = 40075016.686  # meters, at the equator
+TILE_SIZE = 256  # pixels
+MAX_LATITUDE = 85.0511287798  # degrees, the limit of Web Mercator
+COORDINATE_PRECISION = 6  # fractional digits, ~ 10 cm
+
+TRANSFER_COLOUR = "#ff2600"
+STATION_COLOUR = "#797979"
+
+TileT: typing.TypeAlias = tuple[int, int]  # (x, y) at some zoom
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add tiles-specific options to the command line parser.
+    Option values are passed to process() as keyword arguments
+    with "tiles_" prefix stripped.
+    """
+    parser.add_argument(
+        "--tiles-min-zoom",
+        type=int,
+        default=DEFAULT_MIN_ZOOM,
+        help="The lowest zoom level of the tile pyramid",
+    )
+    parser.add_argument(
+        "--tiles-max-zoom",
+        type=int,
+        default=DEFAULT_MAX_ZOOM,
+        help=(
+            "The highest zoom level of the tile pyramid. The viewer uses "
+            "tiles of this level when zoomed in further"
+        ),
+    )
+
+
+def lonlat_to_tile_xy(point: LonLat, zoom: int) -> tuple[float, float]:
+    """Fractional Web Mercator tile coordinates of a point."""
+    lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, point[1])))
+    n = 1 << zoom
+    x = (point[0] + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def _clamp_tile(x: float, y: float, zoom: int) -> TileT:
+    n = 1 << zoom
+    return min(max(int(x), 0), n - 1), min(max(int(y), 0), n - 1)
+
+
+def _segment_tiles(p1: LonLat, p2: LonLat, zoom: int) -> Iterator[TileT]:
+    """Tiles covering the bounding box of a segment."""
+    x1, y1 = lonlat_to_tile_xy(p1, zoom)
+    x2, y2 = lonlat_to_tile_xy(p2, zoom)
+    min_x, min_y = _clamp_tile(min(x1, x2), min(y1, y2), zoom)
+    max_x, max_y = _clamp_tile(max(x1, x2), max(y1, y2), zoom)
+    for x in range(min_x, max_x + 1):
+        for y in range(min_y, max_y + 1):
+            yield x, y
+
+
+def split_line_by_tiles(line: RailT, zoom: int) -> dict[TileT, list[RailT]]:
+    """Split a line into parts, each part consisting of consecutive
+    segments that touch a tile. Segments are not clipped
+    at tile borders: the viewer draws parts of neighbouring tiles
+    one over another, so there are no gaps at the borders.
+    """
+    parts = defaultdict(list)
+    # tile => index of the last segment added to the tile
+    last_segment_index = {}
+    for i in range(len(line) - 1):
+        for tile in _segment_tiles(line[i], line[i + 1], zoom):
+            if last_segment_index.get(tile) == i - 1:
+                parts[tile][-1].append(line[i + 1])
+            else:
+                parts[tile].append([line[i], line[i + 1]])
+            last_segment_index[tile] = i
+    return parts
+
+
+def _round_point(point: LonLat) -> LonLat:
+    return (
+        round(point[0], COORDINATE_PRECISION),
+        round(point[1], COORDINATE_PRECISION),
+    )
+
+
+def _network_lines(network: dict) -> list[tuple[dict, RailT]]:
+    """Return (properties, geometry) of route variants, one for variants
+    with the same ref, colour and the same or reversed geometry.
+    """
+    lines = {}
+    for route_master in network["routes"]:
+        for itinerary in route_master["itineraries"]:
+            geometry = tuple(map(_round_point, itinerary["tracks"]))
+            if len(geometry) < 2:
+                continue
+            ref, colour = route_master["ref"], route_master["colour"]
+            if (ref, colour, geometry[::-1]) in lines:
+                continue
+            lines[(ref, colour, geometry)] = {
+                "ref": ref,
+                "name": route_master["name"],
+                "stroke": colour,
+            }
+    return [
+        (properties, list(geometry))
+        for (_, _, geometry), properties in lines.items()
+    ]
+
+
+def _network_stations(
+    network: dict, transit_data: dict, transfer_stoparea_ids: set[str]
+) -> list[tuple[dict, LonLat]]:
+    """Return (properties, location) of stop areas of a network."""
+    stoparea_ids = {
+        stop["stoparea_id"]
+        for route_master in network["routes"]
+        for itinerary in route_master["itineraries"]
+        for stop in itinerary["stops"]
+    }
+    return [
+        (
+            {
+                "name": transit_data["stopareas"][stoparea_id]["name"],
+                "marker-color": (
+                    TRANSFER_COLOUR
+                    if stoparea_id in transfer_stoparea_ids
+                    else STATION_COLOUR
+                ),
+            },
+            _round_point(transit_data["stopareas"][stoparea_id]["center"]),
+        )
+        for stoparea_id in sorted(stoparea_ids)
+    ]
+
+
+def make_network_tiles(
+    network: dict,
+    transit_data: dict,
+    min_zoom: int = DEFAULT_MIN_ZOOM,
+    max_zoom: int = DEFAULT_MAX_ZOOM,
+) -> tuple[dict, dict[tuple[int, int, int], dict]]:
+    """Cut a network into a tile pyramid.
+    :return: index of the tile set and (zoom, x, y) => GeoJSON of a tile
+    """
+    transfer_stoparea_ids = {
+        stoparea_id
+        for stoparea_pair in transit_data["transfers"]
+        for stoparea_id in stoparea_pair
+    }
+    lines = _network_lines(network)
+    stations = _network_stations(network, transit_data, transfer_stoparea_ids)
+
+    tiles = defaultdict(list)  # (zoom, x, y) => features
+    for zoom in range(min_zoom, max_zoom + 1):
+        # Meters per pixel at the equator
+        pixel_size = EARTH_CIRCUMFERENCE / (TILE_SIZE << zoom)
+        for properties, line in lines:
+            tolerance = (
+                pixel_size
+                * math.cos(math.radians(line[0][1]))
+                * SIMPLIFICATION_TOLERANCE
+            )
+            simplified_line = [line[i] for i in simplify_line(line, tolerance)]
+            for (x, y), parts in split_line_by_tiles(
+                simplified_line, zoom
+            ).items():
+                tiles[(zoom, x, y)].append(
+                    {
+                        "type": "Feature",
+                        "geometry": (
+                            {"type": "LineString", "coordinates": parts[0]}
+                            if len(parts) == 1
+                            else {
+                                "type": "MultiLineString",
+                                "coordinates": parts,
+                            }
+                        ),
+                        "properties": properties,
+                    }
+                )
+        for properties, center in stations:
+            x, y = _clamp_tile(*lonlat_to_tile_xy(center, zoom), zoom)
+            tiles[(zoom, x, y)].append(
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": center},
+                    "properties": properties,
+                }
+            )
+
+    points = [point for _, line in lines for point in line] + [
+        center for _, center in stations
+    ]
+    index = {
+        "name": network["name"],
+        "bbox": [
+            min(p[0] for p in points),
+            min(p[1] for p in points),
+            max(p[0] for p in points),
+            max(p[1] for p in points),
+        ]
+        if points
+        else None,
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        # The viewer requests only existing tiles
+        "tiles": {
+            zoom: sorted([x, y] for (z, x, y) in tiles if z == zoom)
+            for zoom in range(min_zoom, max_zoom + 1)
+        },
+    }
+    geojson_tiles = {
+        tile: {"type": "FeatureCollection", "features": features}
+        for tile, features in tiles.items()
+    }
+    return index, geojson_tiles
+
+
+def process(
+    cities: list[City],
+    transit_data: dict,
+    filename: str,
+    cache_path: str | None,
+    min_zoom: int = DEFAULT_MIN_ZOOM,
+    max_zoom: int = DEFAULT_MAX_ZOOM,
+) -> None:
+    """Cut good cities into static GeoJSON tiles for the render viewer.
+    Tiles of a city are saved as {filename}/{city_slug}/{z}/{x}/{y}.geojson
+    with {filename}/{city_slug}/index.json describing the tile set.
+    :param cities: list of City instances
+    :param transit_data: transit model made with transit_to_dict()
+    :param filename: Path to the directory to save tiles to
+    :param cache_path: Path to json-file with good cities cache or None.
+        Bad cities are not recovered from cache for this output
+    :param min_zoom: The lowest zoom level of the tile pyramid
+    :param max_zoom: The highest zoom level of the tile pyramid
+    """
+    if min_zoom > max_zoom:
+        raise ValueError(f"Wrong zoom range: {min_zoom}-{max_zoom}")
+
+    for network in transit_data["networks"].values():
+        index, tiles = make_network_tiles(
+            network, transit_data, min_zoom, max_zoom
+        )
+        city_dir = os.path.join(filename, slugify(network["name"]))
+        os.makedirs(city_dir, exist_ok=True)
+        for (zoom, x, y), geojson in tiles.items():
+            tile_dir = os.path.join(city_dir, str(zoom), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(
+                os.path.join(tile_dir, f"{y}.geojson"), "w", encoding="utf-8"
+            ) as f:
+                json.dump(geojson, f, separators=(",", ":"))
+        with open(
+            os.path.join(city_dir, "index.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(index, f, ensure_ascii=False)
@@ -0,0 +1,40 @@
+import logging
+import time
+from collections.abc import Callable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _run_stage(name: str, stage: Callable[[], None]) -> bool:
+    """Run a stage logging its duration. Return if the stage succeeded."""
+    start_time = time.perf_counter()
+    try:
+        stage()
+    except Exception:
+        logging.exception(
+            "Stage '%s' failed after %.2f s",
+            name,
+            time.perf_counter() - start_time,
+        )
+        return False
+    logging.info(
+        "Stage '%s' done in %.2f s", name, time.perf_counter() - start_time
+    )
+    return True
+
+
+def run_stages(
+    stages: Mapping[str, Callable[[], None]], workers: int = 1
+) -> list[str]:
+    """Run independent stages, one after another or in a thread pool.
+    An exception in a stage is logged and does not prevent other stages
+    from completion.
+    :param stages: stage name => function without arguments
+    :param workers: number of stages to run concurrently
+    :return: names of failed stages
+    """
+    if workers > 1 and len(stages) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_stage, stages, stages.values()))
+    else:
+        results = [_run_stage(name, stage) for name, stage in stages.items()]
+    return [name for name, success in zip(stages, results) if not success]
@@ -8,7 +8,7 @@ from subways.consts import (
     DEFAULT_MODES_OVERGROUND,
     DEFAULT_MODES_RAPID,
 )
-from subways.osm_element import el_center, el_id, get_network
+from subways.osm_element import el_center, el_id, format_id, get_network
 from subways.structure.route import Route
 from subways.structure.route_master import RouteMaster
 from subways.structure.station import Station
@@ -27,7 +27,7 @@ used_entrances = set()
 
 
 def format_elid_list(ids: Collection[IdT]) -> str:
-    msg = ", ".join(sorted(ids)[:20])
+    msg = ", ".join(sorted(format_id(i) for i in ids)[:20])
     if len(ids) > 20:
         msg += ", ..."
     return msg
@@ -93,6 +93,7 @@ class City:
         self.transfers: list[set[StopArea]] = []
         self.station_ids: set[IdT] = set()
         self.stops_and_platforms: set[IdT] = set()
+        # See subways.subway_io.index_recovery_data()
         self.recovery_data = None
 
     def try_fill_int_attribute(
@@ -206,7 +207,9 @@ class City:
                 continue
             if "tags" not in el:
                 self.warn(
-                    "An untagged object {} in a stop_area_group".format(k),
+                    "An untagged object {} in a stop_area_group".format(
+                        format_id(k)
+                    ),
                     stoparea_group,
                 )
                 continue
@@ -231,7 +234,7 @@ class City:
                     #             Звенигородская
                     self.warn(
                         "Stop area {} belongs to multiple interchanges".format(
-                            k
+                            format_id(k)
                         )
                     )
                 stoparea.transfer = el_id(stoparea_group)
@@ -275,7 +278,8 @@ class City:
                         for sp in chain(station.stops, station.platforms):
                             if sp in self.stops_and_platforms:
                                 self.notice(
-                                    f"A stop or a platform {sp} belongs to "
+                                    "A stop or a platform "
+                                    f"{format_id(sp)} belongs to "
                                     "multiple stop areas, might be correct"
                                 )
                             else:
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import re
 import typing
-from collections.abc import Callable, Collection, Iterator
+from collections.abc import Callable, Collection, Iterable, Iterator
 from itertools import islice
 
 from subways.consts import (
@@ -18,7 +18,13 @@ from subways.geom_utils import (
     find_segment,
     project_on_line,
 )
-from subways.osm_element import el_id, el_center, get_network
+from subways.osm_element import (
+    el_center,
+    el_id,
+    format_id,
+    get_network,
+    make_id,
+)
 from subways.structure.route_stop import RouteStop
 from subways.structure.station import Station
 from subways.structure.stop_area import StopArea
@@ -126,9 +132,36 @@ def get_route_duration(tags: dict) -> int | None:
     return get_interval_in_seconds_from_tags(tags, "duration")
 
 
+def recovery_stop_names(stop_names: Iterable[str]) -> tuple[str, ...]:
+    """Key to match route stops with recovery itinerary stations
+    regardless of their order."""
+    return tuple(sorted(stop_names))
+
+
 class Route:
     """The longest route for a city with a unique ref."""
 
+    __slots__ = (
+        "city",
+        "element",
+        "id",
+        "ref",
+        "name",
+        "mode",
+        "colour",
+        "infill",
+        "network",
+        "interval",
+        "duration",
+        "start_time",
+        "end_time",
+        "is_circular",
+        "stops",
+        "tracks",
+        "first_stop_on_rails_index",
+        "last_stop_on_rails_index",
+    )
+
     @staticmethod
     def is_route(el: OsmElementT, modes: set[str]) -> bool:
         if (
@@ -203,7 +236,7 @@ class Route:
             if "nodes" not in el or len(el["nodes"]) < 2:
                 self.city.error("Cannot find nodes in a railway", el)
                 continue
-            nodes: list[IdT] = ["n{}".format(n) for n in el["nodes"]]
+            nodes: list[IdT] = [make_id("node", n) for n in el["nodes"]]
             if m["role"] == "backward":
                 nodes.reverse()
             line_nodes.update(nodes)
@@ -231,7 +264,7 @@ class Route:
                     if not warned_about_holes:
                         self.city.warn(
                             "Hole in route rails near node {}".format(
-                                track[-1]
+                                format_id(track[-1])
                             ),
                             self.element,
                         )
@@ -427,7 +460,7 @@ class Route:
                     if m["role"] and actual_role not in m["role"]:
                         self.city.warn(
                             "Wrong role '{}' for {} {}".format(
-                                m["role"], actual_role, k
+                                m["role"], actual_role, format_id(k)
                             ),
                             self.element,
                         )
@@ -466,7 +499,9 @@ class Route:
                         ):
                             self.city.error(
                                 'Found an out-of-place {}: "{}" ({})'.format(
-                                    actual_role, el["tags"].get("name", ""), k
+                                    actual_role,
+                                    el["tags"].get("name", ""),
+                                    format_id(k),
                                 ),
                                 self.element,
                             )
@@ -480,7 +515,7 @@ class Route:
                         if repeat_pos >= len(self.stops):
                             self.city.error(
                                 "Incorrect order of {}s at {}".format(
-                                    actual_role, k
+                                    actual_role, format_id(k)
                                 ),
                                 self.element,
                             )
@@ -507,7 +542,7 @@ class Route:
             el = self.city.elements[k]
             if "tags" not in el:
                 self.city.error(
-                    f"Untagged object {k} in a route", self.element
+                    f"Untagged object {format_id(k)} in a route", self.element
                 )
                 continue
 
@@ -515,7 +550,8 @@ class Route:
             for ck in CONSTRUCTION_KEYS:
                 if ck in el["tags"]:
                     self.city.warn(
-                        f"Under construction {m['role'] or 'feature'} {k} "
+                        f"Under construction {m['role'] or 'feature'} "
+                        f"{format_id(k)} "
                         "in route. Consider setting 'inactive' role or "
                         "removing construction attributes",
                         self.element,
@@ -564,7 +600,7 @@ class Route:
             if stop_id not in line_nodes:
                 self.city.warn(
                     'Stop position "{}" ({}) is not on tracks'.format(
-                        stop_el["tags"].get("name", ""), stop_id
+                        stop_el["tags"].get("name", ""), format_id(stop_id)
                     ),
                     self.element,
                 )
@@ -578,7 +614,8 @@ class Route:
             self.tracks = []
             for n in filter(lambda x: x not in self.city.elements, tracks):
                 self.city.warn(
-                    f"The dataset is missing the railway tracks node {n}",
+                    "The dataset is missing the railway tracks node "
+                    f"{format_id(n)}",
                     self.element,
                 )
                 break
@@ -827,20 +864,11 @@ class Route:
             self_stops[stop_name] = stop
 
         route_id = (self.colour, self.ref)
-        if route_id not in self.city.recovery_data:
-            return False
-
-        stop_names = list(self_stops.keys())
+        itineraries = self.city.recovery_data.get(route_id, {}).get(
+            recovery_stop_names(self_stops), []
+        )
         suitable_itineraries = []
-        for itinerary in self.city.recovery_data[route_id]:
-            itinerary_stop_names = [
-                stop["name"] for stop in itinerary["stations"]
-            ]
-            if not (
-                len(stop_names) == len(itinerary_stop_names)
-                and sorted(stop_names) == sorted(itinerary_stop_names)
-            ):
-                continue
+        for itinerary in itineraries:
             big_station_displacement = False
             for it_stop in itinerary["stations"]:
                 name = it_stop["name"]
@@ -924,7 +952,7 @@ class Route:
             "Route(id={}, mode={}, ref={}, name={}, network={}, interval={}, "
             "circular={}, num_stops={}, line_length={} m, from={}, to={}"
         ).format(
-            self.id,
+            format_id(self.id),
             self.mode,
             self.ref,
             self.name,
@@ -7,7 +7,7 @@ from typing import TypeVar
 from subways.consts import MAX_DISTANCE_STOP_TO_LINE
 from subways.css_colours import normalize_colour
 from subways.geom_utils import distance, project_on_line
-from subways.osm_element import el_id, get_network
+from subways.osm_element import el_id, format_id, get_network
 from subways.structure.route import get_route_duration, get_route_interval
 from subways.structure.stop_area import StopArea
 from subways.types import IdT, OsmElementT
@@ -134,8 +134,11 @@ class RouteMaster:
             else:
                 self.interval = min(self.interval, route.interval)
 
-        # Choose minimal id for determinancy
-        if not self.has_master and (not self.id or self.id > route.id):
+        # Choose minimal id for determinancy. Ids are compared as strings
+        # to choose the same one as before ids were packed into ints.
+        if not self.has_master and (
+            not self.id or format_id(self.id) > format_id(route.id)
+        ):
             self.id = route.id
 
         self.routes.append(route)
@@ -209,7 +212,7 @@ class RouteMaster:
 
         if len(meaningful_routes) == 0:
             self.city.error(
-                f"An empty route master {self.id}. "
+                f"An empty route master {format_id(self.id)}. "
                 "Please set construction:route if it is under construction"
             )
         elif len(meaningful_routes) == 1:
@@ -243,7 +246,7 @@ class RouteMaster:
 
         twin_routes = self.find_twin_routes()
         for route1, route2 in twin_routes.items():
-            if route1.id > route2.id:
+            if format_id(route1.id) > format_id(route2.id):
                 continue  # to process a pair of routes only once
                 # and to ensure the order of routes in the pair
             self.alert_twin_routes_differ(route1, route2)
@@ -353,7 +356,8 @@ class RouteMaster:
             ):
                 self.city.notice(
                     f"Stop {st.stoparea.station.name} {st.stop} is included "
-                    f"in the {route2.id} but not included in {route1.id}",
+                    f"in the {format_id(route2.id)} "
+                    f"but not included in {format_id(route1.id)}",
                     route1.element,
                 )
 
@@ -371,7 +375,8 @@ class RouteMaster:
             ):
                 self.city.notice(
                     f"Stop {st.stoparea.station.name} {st.stop} is included "
-                    f"in the {route1.id} but not included in {route2.id}",
+                    f"in the {format_id(route1.id)} "
+                    f"but not included in {format_id(route2.id)}",
                     route2.element,
                 )
 
@@ -467,7 +472,8 @@ class RouteMaster:
 
     def __repr__(self) -> str:
         return (
-            f"RouteMaster(id={self.id}, mode={self.mode}, ref={self.ref}, "
+            f"RouteMaster(id={format_id(self.id)}, mode={self.mode}, "
+            f"ref={self.ref}, "
             f"name={self.name}, network={self.network}, "
             f"num_variants={len(self.routes)}"
         )
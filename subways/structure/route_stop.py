@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import typing
 
-from subways.osm_element import el_center, el_id
+from subways.osm_element import el_center, el_id, format_id
 from subways.structure.station import Station
 from subways.structure.stop_area import StopArea
 from subways.types import LonLat, OsmElementT
@@ -12,6 +12,23 @@ if typing.TYPE_CHECKING:
 
 
 class RouteStop:
+    # There is a RouteStop per stop of each route variant,
+    # so instances are kept small
+    __slots__ = (
+        "stoparea",
+        "stop",
+        "distance",
+        "platform_entry",
+        "platform_exit",
+        "can_enter",
+        "can_exit",
+        "seen_stop",
+        "seen_platform_entry",
+        "seen_platform_exit",
+        "seen_station",
+        "positions_on_rails",
+    )
+
     def __init__(self, stoparea: StopArea) -> None:
         self.stoparea: StopArea = stoparea
         self.stop: LonLat = None  # Stop position, possibly projected
@@ -24,6 +41,7 @@ class RouteStop:
         self.seen_platform_entry = False
         self.seen_platform_exit = False
         self.seen_station = False
+        self.positions_on_rails = None  # Set by Route for stops on tracks
 
     @property
     def seen_platform(self) -> bool:
@@ -93,7 +111,8 @@ class RouteStop:
                 if role != "platform" and "stop" not in role:
                     city.warn(
                         f'Platform "{el["tags"].get("name", "")}" '
-                        f'({el_id(el)}) with invalid role "{role}" in route',
+                        f'({format_id(el_id(el))}) with invalid role "{role}" '
+                        "in route",
                         relation,
                     )
                 multiple_check = self.seen_platform
@@ -107,7 +126,7 @@ class RouteStop:
             log_function(
                 f'Multiple {actual_role}s for a station "'
                 f'{el["tags"].get("name", "")} '
-                f"({el_id(el)}) in a route relation",
+                f"({format_id(el_id(el))}) in a route relation",
                 relation,
             )
 
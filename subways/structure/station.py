@@ -4,7 +4,7 @@ import typing
 
 from subways.consts import ALL_MODES, CONSTRUCTION_KEYS
 from subways.css_colours import normalize_colour
-from subways.osm_element import el_center, el_id
+from subways.osm_element import el_center, el_id, format_id
 from subways.types import IdT, OsmElementT
 
 if typing.TYPE_CHECKING:
@@ -12,6 +12,16 @@ if typing.TYPE_CHECKING:
 
 
 class Station:
+    __slots__ = (
+        "id",
+        "element",
+        "modes",
+        "name",
+        "int_name",
+        "colour",
+        "center",
+    )
+
     def __init__(self, el: OsmElementT, city: City) -> None:
         """Call this with a railway=station OSM feature."""
         self.id: IdT = el_id(el)
@@ -58,5 +68,5 @@ class Station:
 
     def __repr__(self) -> str:
         return "Station(id={}, modes={}, name={}, center={})".format(
-            self.id, ",".join(self.modes), self.name, self.center
+            format_id(self.id), ",".join(self.modes), self.name, self.center
         )
@@ -6,7 +6,7 @@ from itertools import chain
 from subways.consts import RAILWAY_TYPES
 from subways.css_colours import normalize_colour
 from subways.geom_utils import distance
-from subways.osm_element import el_id, el_center
+from subways.osm_element import el_id, el_center, format_id
 from subways.structure.station import Station
 from subways.types import IdT, OsmElementT
 
@@ -17,6 +17,23 @@ MAX_DISTANCE_TO_ENTRANCES = 300  # in meters
 
 
 class StopArea:
+    __slots__ = (
+        "element",
+        "id",
+        "station",
+        "stops",
+        "platforms",
+        "exits",
+        "entrances",
+        "center",
+        "centers",
+        "transfer",
+        "modes",
+        "name",
+        "int_name",
+        "colour",
+    )
+
     @staticmethod
     def is_stop(el: OsmElementT) -> bool:
         if "tags" not in el:
@@ -61,7 +78,8 @@ class StopArea:
         self.entrances = set()  # el_id of subway/train_station entrance
         # for entering the platform
         self.center = None  # lon, lat of the station centre point
-        self.centers = {}  # el_id -> (lon, lat) for all elements
+        # el_id -> (lon, lat) for the stop area itself, stops and platforms
+        self.centers = {}
         self.transfer = None  # el_id of a transfer relation
 
         self.modes = station.modes
@@ -94,7 +112,7 @@ class StopArea:
         if self.entrances and not self.exits:
             city.warn("No exits for a station", stop_area or station.element)
 
-        for el in self.get_elements():
+        for el in chain((self.id,), self.stops, self.platforms):
             self.centers[el] = el_center(city.elements[el])
 
         """Calculate the center point of the station. This algorithm
@@ -104,13 +122,13 @@ class StopArea:
         if len(self.stops) + len(self.platforms) == 0:
             self.center = station.center
         else:
-            self.center = [0, 0]
-            for sp in chain(self.stops, self.platforms):
-                spc = self.centers[sp]
-                for i in range(2):
-                    self.center[i] += spc[i]
-            for i in range(2):
-                self.center[i] /= len(self.stops) + len(self.platforms)
+            points = [
+                self.centers[sp] for sp in chain(self.stops, self.platforms)
+            ]
+            self.center = (
+                sum(p[0] for p in points) / len(points),
+                sum(p[1] for p in points) / len(points),
+            )
 
     def _process_members(
         self, station: Station, city: City, stop_area: OsmElementT
@@ -186,6 +204,7 @@ class StopArea:
 
     def __repr__(self) -> str:
         return (
-            f"StopArea(id={self.id}, name={self.name}, station={self.station},"
-            f" transfer={self.transfer}, center={self.center})"
+            f"StopArea(id={format_id(self.id)}, name={self.name}, "
+            f"station={self.station}, transfer={format_id(self.transfer)}, "
+            f"center={self.center})"
         )
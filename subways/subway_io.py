@@ -1,59 +1,767 @@
 from __future__ import annotations
 
+import functools
+import gzip
 import json
 import logging
+import os
+import re
 import typing
+import zlib
 from collections import OrderedDict
+from collections.abc import Collection, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from io import BufferedIOBase
 from typing import Any, TextIO
+from urllib.parse import quote, unquote
 
-from subways.types import OsmElementT
+from subways.osm_element import OsmElement, el_center, format_id
+from subways.structure.route import recovery_stop_names
+from subways.types import LonLat, OsmElementT, RailT
+from subways.validation import calculate_centers
 
 if typing.TYPE_CHECKING:
     from subways.structure.city import City
     from subways.structure.stop_area import StopArea
 
 
-def load_xml(f: BufferedIOBase | str) -> list[OsmElementT]:
+def slugify(name: str) -> str:
+    """Make a file name for a city, the same as render/js/metro.js does."""
+    return re.sub(r"[^a-z0-9_-]+", "", name.lower().replace(" ", "_"))
+
+
+# The same filter as QRELATIONS and QNODES in process_subways.sh:
+# tag => values for relations and nodes needed for validation
+RELATION_FILTER = {
+    "route": {"subway", "light_rail", "monorail", "train"},
+    "route_master": {"subway", "light_rail", "monorail", "train"},
+    "public_transport": {"stop_area", "stop_area_group"},
+}
+NODE_FILTER = {
+    "railway": {"station", "subway_entrance", "train_station_entrance"},
+    "station": {"subway", "light_rail", "monorail"},
+    "subway": {"yes"},
+    "light_rail": {"yes"},
+    "monorail": {"yes"},
+    "train": {"yes"},
+}
+
+
+def _matches_filter(tags: dict[str, str], tag_filter: dict) -> bool:
+    return any(tags.get(k) in values for k, values in tag_filter.items())
+
+
+def is_relevant_relation(tags: dict[str, str]) -> bool:
+    return _matches_filter(tags, RELATION_FILTER)
+
+
+def is_relevant_node(tags: dict[str, str]) -> bool:
+    return _matches_filter(tags, NODE_FILTER)
+
+
+def _xml_to_osm_element(element: typing.Any) -> OsmElement:
+    """Convert a node, way or relation XML element to an OsmElement."""
+    el = OsmElement(element.tag, int(element.get("id")))
+    # Deleted nodes in osmChange files may have no coordinates
+    if element.tag == "node" and element.get("lat") is not None:
+        el.lat = float(element.get("lat"))
+        el.lon = float(element.get("lon"))
+    tags = {}
+    nd = []
+    members = []
+    for sub in element:
+        if sub.tag == "tag":
+            tags[sub.get("k")] = sub.get("v")
+        elif sub.tag == "nd":
+            nd.append(int(sub.get("ref")))
+        elif sub.tag == "member":
+            members.append(
+                {
+                    "type": sub.get("type"),
+                    "ref": int(sub.get("ref")),
+                    "role": sub.get("role", ""),
+                }
+            )
+    if tags:
+        el.tags = tags
+    if nd:
+        el.nodes = nd
+    if members:
+        el.members = members
+    return el
+
+
+def _iter_xml_elements(
+    f: BufferedIOBase | str, types: Collection[str]
+) -> Iterator[OsmElement]:
+    """Yield OSM elements of given types from an XML file.
+    Other elements are skipped without being converted.
+    """
     try:
         from lxml import etree
     except ImportError:
         import xml.etree.ElementTree as etree
 
-    elements: list[OsmElementT] = []
+    root = None
+    for event, element in etree.iterparse(f, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+        if element.tag not in ("node", "way", "relation"):
+            continue
+        if element.tag in types:
+            yield _xml_to_osm_element(element)
+        # Free memory taken by processed elements
+        element.clear()
+        root.clear()
+
+
+def _filter_xml(f: BufferedIOBase | str) -> list[OsmElement]:
+    """Select from an unfiltered XML file the same elements as osmfilter
+    does in process_subways.sh. Relations are read in the first pass,
+    their member ways in the second one, and in the third pass nodes
+    of the ways and relations, since nodes precede ways in OSM files.
+    """
+
+    def read(types: Collection[str]) -> Iterator[OsmElement]:
+        if not isinstance(f, str):
+            f.seek(0)
+        return _iter_xml_elements(f, types)
+
+    relations = [
+        el
+        for el in read({"relation"})
+        if is_relevant_relation(el.get("tags", {}))
+    ]
+    way_ids = {
+        m["ref"]
+        for r in relations
+        for m in r.get("members", [])
+        if m["type"] == "way"
+    }
+    ways = [el for el in read({"way"}) if el["id"] in way_ids]
+    node_ids = {
+        m["ref"]
+        for r in relations
+        for m in r.get("members", [])
+        if m["type"] == "node"
+    }
+    node_ids.update(n for way in ways for n in way.get("nodes", []))
+    nodes = [
+        el
+        for el in read({"node"})
+        if el["id"] in node_ids or is_relevant_node(el.get("tags", {}))
+    ]
+    return nodes + ways + relations
+
+
+def load_xml(
+    f: BufferedIOBase | str, filter_elements: bool = False
+) -> list[OsmElement]:
+    """Read OSM elements from an XML file.
+    :param f: file name or a seekable binary file object
+    :param filter_elements: if the file was not filtered with osmfilter,
+        select the elements needed for validation in three streaming
+        passes over the file
+    """
+    if filter_elements:
+        return _filter_xml(f)
+    return list(_iter_xml_elements(f, ("node", "way", "relation")))
+
+
+def load_json(f: TextIO) -> list[OsmElement]:
+    """Read OSM elements from Overpass JSON or from a file
+    written by dump_json().
+    """
+    data = json.load(f)
+    if isinstance(data, dict):
+        data = data["elements"]
+    return [OsmElement.from_dict(el) for el in data]
+
+
+def dump_json(elements: list[OsmElementT], f: TextIO) -> None:
+    json.dump(elements, f, default=OsmElement.to_dict)
+
+
+def _iter_osm_change(
+    f: BufferedIOBase | str,
+) -> Iterator[tuple[str, OsmElement]]:
+    """Yield (action, element) from an osmChange file,
+    action being "create", "modify" or "delete".
+    """
+    try:
+        from lxml import etree
+    except ImportError:
+        import xml.etree.ElementTree as etree
+
+    if isinstance(f, str) and f.endswith(".gz"):
+        f = gzip.open(f, "rb")
+    action = None
+    root = None
+    for event, element in etree.iterparse(f, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            elif element.tag in ("create", "modify", "delete"):
+                action = element.tag
+            continue
+        if element.tag in ("node", "way", "relation") and action:
+            yield action, _xml_to_osm_element(element)
+            element.clear()
+            root.clear()
+
+
+def _referenced_ids(
+    elements: Iterable[OsmElementT], member_type: str
+) -> set[int]:
+    """Ids of elements of member_type referenced by given ways and
+    relations.
+    """
+    ids = set()
+    for el in elements:
+        if member_type == "node":
+            ids.update(el.get("nodes", []))
+        ids.update(
+            m["ref"] for m in el.get("members", []) if m["type"] == member_type
+        )
+    return ids
+
+
+def apply_osm_change(
+    elements: list[OsmElementT], osc: BufferedIOBase | str
+) -> list[LonLat]:
+    """Apply an osmChange diff to elements selected the same way as
+    osmfilter does in process_subways.sh, and keep them selected so.
+    Elements not referenced anymore are dropped. Centers are recalculated
+    for changed ways and relations and for those containing changed
+    elements. Elements newly referenced by changed ones that are neither
+    in the elements nor in the diff cannot be restored and are only
+    reported, a full re-extract is needed to get them.
+    :param elements: nodes, ways and relations in this order, changed
+        in place
+    :param osc: path to an *.osc or *.osc.gz file, or a binary file object
+    :return: old and new locations of changed elements, to find out
+        which cities are affected
+    """
+    by_key = {(el["type"], el["id"]): el for el in elements}
+    old_locations = {}  # (type, id) => location before the change
+
+    def remove(key: tuple[str, int]) -> None:
+        el = by_key.pop(key, None)
+        if el and (center := el_center(el)):
+            old_locations.setdefault(key, center)
+
+    changes = {}  # (type, id) => element or None for deleted ones
+    for action, el in _iter_osm_change(osc):
+        changes[(el["type"], el["id"])] = None if action == "delete" else el
+
+    for el_type in ("relation", "way", "node"):
+        referenced_ids = _referenced_ids(
+            (el for (t, _), el in by_key.items() if t in ("way", "relation")),
+            el_type,
+        )
+        for key, el in changes.items():
+            if key[0] != el_type:
+                continue
+            if key in by_key:
+                remove(key)
+            if el is None:
+                continue
+            tags = el.get("tags", {})
+            if (
+                el_type == "relation"
+                and is_relevant_relation(tags)
+                or el_type == "node"
+                and is_relevant_node(tags)
+                or key[1] in referenced_ids
+            ):
+                by_key[key] = el
+
+    # Drop elements not referenced anymore, relations first
+    for el_type in ("relation", "way", "node"):
+        referenced_ids = _referenced_ids(
+            (el for (t, _), el in by_key.items() if t != "node"), el_type
+        )
+        for key, el in list(by_key.items()):
+            if (
+                key[0] == el_type
+                and key[1] not in referenced_ids
+                and not (
+                    el_type == "relation"
+                    and is_relevant_relation(el.get("tags", {}))
+                    or el_type == "node"
+                    and is_relevant_node(el.get("tags", {}))
+                )
+            ):
+                remove(key)
+
+    for el_type in ("node", "way", "relation"):
+        missing_count = len(
+            _referenced_ids(
+                (el for (t, _), el in by_key.items() if t != "node"), el_type
+            )
+            - {i for t, i in by_key if t == el_type}
+        )
+        if missing_count and el_type != "relation":
+            logging.warning(
+                "%s referenced %ss are missing after applying the diff",
+                missing_count,
+                el_type,
+            )
+
+    # Clear centers of ways and relations containing changed elements
+    changed_keys = set(changes) | set(old_locations)
+    affected_keys = set(changed_keys)
+    while True:
+        newly_affected = {
+            key
+            for key, el in by_key.items()
+            if key not in affected_keys
+            and key[0] != "node"
+            and (
+                any(("node", n) in affected_keys for n in el.get("nodes", []))
+                or any(
+                    (m["type"], m["ref"]) in affected_keys
+                    for m in el.get("members", [])
+                )
+            )
+        }
+        if not newly_affected:
+            break
+        affected_keys |= newly_affected
+    for key in affected_keys:
+        el = by_key.get(key)
+        if el is None:
+            continue
+        if key[0] != "node" and "center" in el:
+            old_locations.setdefault(key, el_center(el))
+            del el["center"]
+
+    elements[:] = [
+        el
+        for el_type in ("node", "way", "relation")
+        for (t, _), el in by_key.items()
+        if t == el_type
+    ]
+    calculate_centers(elements)
+
+    locations = list(old_locations.values())
+    for key in affected_keys:
+        if key in by_key and (center := el_center(by_key[key])):
+            locations.append(center)
+    return locations
+
+
+# PBF format, see https://wiki.openstreetmap.org/wiki/PBF_Format.
+# Protocol buffers are decoded by hand to avoid extra dependencies.
+
+PBF_MEMBER_TYPES = ("node", "way", "relation")
+PBF_SUPPORTED_FEATURES = {"OsmSchema-V0.6", "DenseNodes"}
+
+
+def _read_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _iter_fields(buf: bytes) -> Iterator[tuple[int, int | bytes]]:
+    """Yield (field number, value) of a protobuf message. Values are ints
+    for varints and bytes for length-delimited fields. Fixed-size fields
+    are not used in PBF and are skipped.
+    """
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        wire_type = key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos : pos + length]  # noqa E203
+            pos += length
+        elif wire_type == 1:
+            pos += 8
+            continue
+        elif wire_type == 5:
+            pos += 4
+            continue
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield key >> 3, value
+
+
+def _packed_varints(buf: bytes) -> list[int]:
+    values = []
+    pos, end = 0, len(buf)
+    while pos < end:
+        value, pos = _read_varint(buf, pos)
+        values.append(value)
+    return values
+
+
+def _zigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _delta_decode(values: list[int]) -> list[int]:
+    """Decode a packed sint64 field with delta coding."""
+    result = []
+    current = 0
+    for value in values:
+        current += _zigzag(value)
+        result.append(current)
+    return result
+
+
+def _as_signed(value: int) -> int:
+    """Interpret a varint as int64."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _read_pbf_blob_index(path: str) -> list[tuple[str, int, int]]:
+    """Return (type, offset, size) of blobs in a PBF file."""
+    blobs = []
+    with open(path, "rb") as f:
+        while True:
+            header_size_bytes = f.read(4)
+            if not header_size_bytes:
+                break
+            if len(header_size_bytes) < 4:
+                raise ValueError(f"Truncated PBF file {path}")
+            header = f.read(int.from_bytes(header_size_bytes, "big"))
+            blob_type, data_size = None, 0
+            for field, value in _iter_fields(header):
+                if field == 1:
+                    blob_type = value.decode("utf-8")
+                elif field == 3:
+                    data_size = value
+            blobs.append((blob_type, f.tell(), data_size))
+            f.seek(data_size, os.SEEK_CUR)
+    return blobs
+
+
+def _read_pbf_blob(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        blob = f.read(size)
+    for field, value in _iter_fields(blob):
+        if field == 1:  # raw
+            return value
+        if field == 3:  # zlib_data
+            return zlib.decompress(value)
+    raise ValueError("Unsupported PBF blob compression")
+
+
+def _check_pbf_header(data: bytes) -> None:
+    for field, value in _iter_fields(data):
+        if field == 4:  # required_features
+            feature = value.decode("utf-8")
+            if feature not in PBF_SUPPORTED_FEATURES:
+                raise ValueError(f"Unsupported PBF feature {feature}")
 
-    for event, element in etree.iterparse(f):
-        if element.tag in ("node", "way", "relation"):
-            el = {"type": element.tag, "id": int(element.get("id"))}
-            if element.tag == "node":
-                for n in ("lat", "lon"):
-                    el[n] = float(element.get(n))
+
+def _decode_tags(
+    keys: list[int], vals: list[int], strings: list[str]
+) -> dict[str, str]:
+    return {strings[k]: strings[v] for k, v in zip(keys, vals)}
+
+
+class _PrimitiveBlock:
+    """Decoder of elements of a PBF data block."""
+
+    def __init__(self, data: bytes) -> None:
+        self.strings = []
+        self.groups = []
+        self.granularity = 100
+        self.lat_offset = self.lon_offset = 0
+        for field, value in _iter_fields(data):
+            if field == 1:
+                self.strings = [
+                    s.decode("utf-8") for f, s in _iter_fields(value) if f == 1
+                ]
+            elif field == 2:
+                self.groups.append(value)
+            elif field == 17:
+                self.granularity = value
+            elif field == 19:
+                self.lat_offset = _as_signed(value)
+            elif field == 20:
+                self.lon_offset = _as_signed(value)
+
+    def _coord(self, offset: int, value: int) -> float:
+        return (offset + self.granularity * value) / 1_000_000_000
+
+    def group_fields(self) -> Iterator[tuple[int, bytes]]:
+        """Yield (field number, message) of elements in the block,
+        1 - node, 2 - dense nodes, 3 - way, 4 - relation.
+        """
+        for group in self.groups:
+            yield from _iter_fields(group)
+
+    def nodes(self, node_ids: set[int] | None) -> Iterator[OsmElement]:
+        """Yield nodes with ids from node_ids or tagged relevantly."""
+        for field, message in self.group_fields():
+            if field == 1:
+                yield from self._simple_node(message, node_ids)
+            elif field == 2:
+                yield from self._dense_nodes(message, node_ids)
+
+    def _make_node(
+        self, node_id: int, lat: int, lon: int, tags: dict[str, str]
+    ) -> OsmElement:
+        el = OsmElement("node", node_id)
+        el.lat = self._coord(self.lat_offset, lat)
+        el.lon = self._coord(self.lon_offset, lon)
+        if tags:
+            el.tags = tags
+        return el
+
+    def _simple_node(
+        self, message: bytes, node_ids: set[int] | None
+    ) -> Iterator[OsmElement]:
+        node_id = lat = lon = 0
+        keys, vals = [], []
+        for field, value in _iter_fields(message):
+            if field == 1:
+                node_id = _zigzag(value)
+            elif field == 2:
+                keys = _packed_varints(value)
+            elif field == 3:
+                vals = _packed_varints(value)
+            elif field == 8:
+                lat = _zigzag(value)
+            elif field == 9:
+                lon = _zigzag(value)
+        tags = _decode_tags(keys, vals, self.strings)
+        if (node_ids and node_id in node_ids) or is_relevant_node(tags):
+            yield self._make_node(node_id, lat, lon, tags)
+
+    def _dense_nodes(
+        self, message: bytes, node_ids: set[int] | None
+    ) -> Iterator[OsmElement]:
+        ids, lats, lons, keys_vals = [], [], [], []
+        for field, value in _iter_fields(message):
+            if field == 1:
+                ids = _delta_decode(_packed_varints(value))
+            elif field == 8:
+                lats = _delta_decode(_packed_varints(value))
+            elif field == 9:
+                lons = _delta_decode(_packed_varints(value))
+            elif field == 10:
+                keys_vals = _packed_varints(value)
+        pos = 0
+        for node_id, lat, lon in zip(ids, lats, lons):
             tags = {}
-            nd = []
-            members = []
-            for sub in element:
-                if sub.tag == "tag":
-                    tags[sub.get("k")] = sub.get("v")
-                elif sub.tag == "nd":
-                    nd.append(int(sub.get("ref")))
-                elif sub.tag == "member":
-                    members.append(
-                        {
-                            "type": sub.get("type"),
-                            "ref": int(sub.get("ref")),
-                            "role": sub.get("role", ""),
-                        }
-                    )
+            # keys_vals is empty if no node in the block has tags
+            while pos < len(keys_vals) and keys_vals[pos]:
+                tags[self.strings[keys_vals[pos]]] = self.strings[
+                    keys_vals[pos + 1]
+                ]
+                pos += 2
+            pos += 1
+            if (node_ids and node_id in node_ids) or is_relevant_node(tags):
+                yield self._make_node(node_id, lat, lon, tags)
+
+    def ways(self, way_ids: set[int]) -> Iterator[OsmElement]:
+        """Yield ways with ids from way_ids."""
+        for field, message in self.group_fields():
+            if field != 3:
+                continue
+            way_id, keys, vals, refs = 0, [], [], []
+            for f, value in _iter_fields(message):
+                if f == 1:
+                    way_id = _as_signed(value)
+                    if way_id not in way_ids:
+                        break
+                elif f == 2:
+                    keys = _packed_varints(value)
+                elif f == 3:
+                    vals = _packed_varints(value)
+                elif f == 8:
+                    refs = _delta_decode(_packed_varints(value))
+            if way_id not in way_ids:
+                continue
+            el = OsmElement("way", way_id)
+            tags = _decode_tags(keys, vals, self.strings)
             if tags:
-                el["tags"] = tags
-            if nd:
-                el["nodes"] = nd
+                el.tags = tags
+            if refs:
+                el.nodes = refs
+            yield el
+
+    def relations(self) -> Iterator[OsmElement]:
+        """Yield relevant relations."""
+        for field, message in self.group_fields():
+            if field != 4:
+                continue
+            relation_id, keys, vals = 0, [], []
+            roles, member_ids, member_types = [], [], []
+            for f, value in _iter_fields(message):
+                if f == 1:
+                    relation_id = _as_signed(value)
+                elif f == 2:
+                    keys = _packed_varints(value)
+                elif f == 3:
+                    vals = _packed_varints(value)
+                elif f == 8:
+                    roles = _packed_varints(value)
+                elif f == 9:
+                    member_ids = _delta_decode(_packed_varints(value))
+                elif f == 10:
+                    member_types = _packed_varints(value)
+            tags = _decode_tags(keys, vals, self.strings)
+            if not is_relevant_relation(tags):
+                continue
+            el = OsmElement("relation", relation_id)
+            el.tags = tags
+            members = [
+                {
+                    "type": PBF_MEMBER_TYPES[member_type],
+                    "ref": member_id,
+                    "role": self.strings[role],
+                }
+                for role, member_id, member_type in zip(
+                    roles, member_ids, member_types
+                )
+            ]
             if members:
-                el["members"] = members
-            elements.append(el)
-            element.clear()
+                el.members = members
+            yield el
+
+
+# Ids of elements needed in the current pass of load_pbf(),
+# set in worker processes by _set_pbf_wanted_ids()
+_pbf_wanted_ids: set[int] = set()
+
+
+def _set_pbf_wanted_ids(ids: set[int]) -> None:
+    global _pbf_wanted_ids
+    _pbf_wanted_ids = ids
+
 
-    return elements
+def _pbf_block_relations(
+    path: str, offset: int, size: int
+) -> tuple[list[OsmElement], bool, bool]:
+    """Return relevant relations of a block, and if the block
+    has nodes and ways.
+    """
+    block = _PrimitiveBlock(_read_pbf_blob(path, offset, size))
+    field_numbers = {field for field, _ in block.group_fields()}
+    return (
+        list(block.relations()),
+        bool(field_numbers & {1, 2}),
+        3 in field_numbers,
+    )
+
+
+def _pbf_block_ways(path: str, offset: int, size: int) -> list[OsmElement]:
+    block = _PrimitiveBlock(_read_pbf_blob(path, offset, size))
+    return list(block.ways(_pbf_wanted_ids))
+
+
+def _pbf_block_nodes(path: str, offset: int, size: int) -> list[OsmElement]:
+    block = _PrimitiveBlock(_read_pbf_blob(path, offset, size))
+    return list(block.nodes(_pbf_wanted_ids))
+
+
+def _map_pbf_blocks(
+    func: typing.Callable,
+    path: str,
+    blobs: list[tuple[int, int]],
+    workers: int,
+    wanted_ids: set[int] | None = None,
+) -> list:
+    """Apply func(path, offset, size) to blocks in a process pool,
+    with wanted ids available to workers.
+    """
+    wanted_ids = wanted_ids or set()
+    if workers <= 1 or len(blobs) <= 1:
+        _set_pbf_wanted_ids(wanted_ids)
+        try:
+            return [func(path, offset, size) for offset, size in blobs]
+        finally:
+            _set_pbf_wanted_ids(set())
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_set_pbf_wanted_ids,
+        initargs=(wanted_ids,),
+    ) as executor:
+        return list(
+            executor.map(
+                func,
+                *zip(*((path, offset, size) for offset, size in blobs)),
+            )
+        )
+
+
+def load_pbf(path: str, workers: int | None = None) -> list[OsmElement]:
+    """Read a PBF file selecting the same elements as osmfilter does
+    in process_subways.sh: relations and nodes that match RELATION_FILTER
+    and NODE_FILTER, with member ways and nodes of the relations and
+    nodes of the ways. Blocks are decoded in parallel in three passes,
+    for relations, ways and nodes.
+    :param path: path to a *.osm.pbf file
+    :param workers: number of processes, os.cpu_count() by default
+    :return: elements in the format of load_xml(): nodes, ways and
+        relations in the order of the file
+    """
+    workers = workers or os.cpu_count() or 1
+    blobs = _read_pbf_blob_index(path)
+    data_blobs = []
+    for blob_type, offset, size in blobs:
+        if blob_type == "OSMHeader":
+            _check_pbf_header(_read_pbf_blob(path, offset, size))
+        elif blob_type == "OSMData":
+            data_blobs.append((offset, size))
+
+    relations = []
+    node_blobs, way_blobs = [], []
+    for blob, (block_relations, has_nodes, has_ways) in zip(
+        data_blobs,
+        _map_pbf_blocks(_pbf_block_relations, path, data_blobs, workers),
+    ):
+        relations.extend(block_relations)
+        if has_nodes:
+            node_blobs.append(blob)
+        if has_ways:
+            way_blobs.append(blob)
+
+    way_ids = {
+        m["ref"]
+        for r in relations
+        for m in r.get("members", [])
+        if m["type"] == "way"
+    }
+    ways = list(
+        chain.from_iterable(
+            _map_pbf_blocks(_pbf_block_ways, path, way_blobs, workers, way_ids)
+        )
+    )
+
+    node_ids = {
+        m["ref"]
+        for r in relations
+        for m in r.get("members", [])
+        if m["type"] == "node"
+    }
+    node_ids.update(n for way in ways for n in way.get("nodes", []))
+    nodes = list(
+        chain.from_iterable(
+            _map_pbf_blocks(
+                _pbf_block_nodes, path, node_blobs, workers, node_ids
+            )
+        )
+    )
+
+    return nodes + ways + relations
 
 
 _YAML_SPECIAL_CHARACTERS = "!&*{}[],#|>@`'\""
@@ -73,27 +781,33 @@ def _get_yaml_compatible_string(scalar: Any) -> str:
     return string
 
 
+def _yaml_lines(data: Any, indent: str = "") -> Iterator[str]:
+    """Yield pieces of YAML representation of data."""
+    if isinstance(data, (set, list)):
+        yield "\n"
+        for i in data:
+            yield indent
+            yield "- "
+            yield from _yaml_lines(i, indent + "  ")
+    elif isinstance(data, dict):
+        yield "\n"
+        for k, v in data.items():
+            if v is None:
+                continue
+            yield indent + _get_yaml_compatible_string(k) + ": "
+            yield from _yaml_lines(v, indent + "  ")
+            if isinstance(v, (list, set, dict)):
+                yield "\n"
+    else:
+        yield _get_yaml_compatible_string(data)
+        yield "\n"
+
+
 def dump_yaml(city: City, f: TextIO) -> None:
-    def write_yaml(data: dict, f: TextIO, indent: str = "") -> None:
-        if isinstance(data, (set, list)):
-            f.write("\n")
-            for i in data:
-                f.write(indent)
-                f.write("- ")
-                write_yaml(i, f, indent + "  ")
-        elif isinstance(data, dict):
-            f.write("\n")
-            for k, v in data.items():
-                if v is None:
-                    continue
-                f.write(indent + _get_yaml_compatible_string(k) + ": ")
-                write_yaml(v, f, indent + "  ")
-                if isinstance(v, (list, set, dict)):
-                    f.write("\n")
-        else:
-            f.write(_get_yaml_compatible_string(data))
-            f.write("\n")
+    f.write(city_to_yaml(city))
+
 
+def city_to_yaml(city: City) -> str:
     INCLUDE_STOP_AREAS = False
     stops = set()
     routes = []
@@ -118,27 +832,33 @@ def dump_yaml(city: City, f: TextIO) -> None:
                     s = st.stoparea
                     if s.id == s.station.id:
                         v_stops.append(
-                            "{} ({})".format(s.station.name, s.station.id)
+                            "{} ({})".format(
+                                s.station.name, format_id(s.station.id)
+                            )
                         )
                     else:
                         v_stops.append(
                             "{} ({}) in {} ({})".format(
-                                s.station.name, s.station.id, s.name, s.id
+                                s.station.name,
+                                format_id(s.station.id),
+                                s.name,
+                                format_id(s.id),
                             )
                         )
             else:
                 v_stops = [
                     "{} ({})".format(
-                        s.stoparea.station.name, s.stoparea.station.id
+                        s.stoparea.station.name,
+                        format_id(s.stoparea.station.id),
                     )
                     for s in variant
                 ]
-            rte["itineraries"][variant.id] = v_stops
+            rte["itineraries"][format_id(variant.id)] = v_stops
             stops.update(v_stops)
         routes.append(rte)
     transfers = []
     for t in city.transfers:
-        v_stops = ["{} ({})".format(s.name, s.id) for s in t]
+        v_stops = ["{} ({})".format(s.name, format_id(s.id)) for s in t]
         transfers.append(sorted(v_stops))
 
     result = {
@@ -146,14 +866,146 @@ def dump_yaml(city: City, f: TextIO) -> None:
         "transfers": sorted(transfers, key=lambda t: t[0]),
         "routes": sorted(routes, key=lambda r: r["ref"]),
     }
-    write_yaml(result, f)
+    return "".join(_yaml_lines(result))
+
 
+def write_file_if_changed(path: str, content: str) -> bool:
+    """Write text to a file unless the file already has the same content,
+    so that the file modification time is kept for unchanged files.
+    The file is replaced atomically, so readers never see it half-written.
+    Return if the file was written.
+    """
+    data = content.encode("utf-8")
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass  # The file doesn't exist or cannot be read
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+class CityShards:
+    """Json data of cities kept in a directory, one file per city.
+    A run reads only the cities it processes and rewrites only the files
+    that changed, and an interrupted write cannot damage other cities.
+    A legacy json file with all cities at the same path can be read too,
+    it is converted to a directory on the first write.
+    """
+
+    def __init__(self, path: str, indent: int | None = None) -> None:
+        self.path = path
+        self.indent = indent
+        self._legacy_data = None
+        if os.path.isfile(path):
+            self._legacy_data = {}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._legacy_data = json.load(f)
+            except ValueError as e:
+                logging.warning("Cannot load '%s': %s", path, e)
+
+    def _city_path(self, city_name: str, directory: str | None = None) -> str:
+        file_name = quote(city_name, safe="") + ".json"
+        return os.path.join(directory or self.path, file_name)
+
+    def city_names(self) -> list[str]:
+        """Names of all cities having data, sorted."""
+        if self._legacy_data is not None:
+            return sorted(self._legacy_data)
+        try:
+            file_names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            unquote(file_name[: -len(".json")])
+            for file_name in file_names
+            if file_name.endswith(".json")
+        )
+
+    def read(self, city_name: str) -> Any | None:
+        """Return data of a city, or None if there is no usable data."""
+        if self._legacy_data is not None:
+            return self._legacy_data.get(city_name)
+        path = self._city_path(city_name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning("Cannot load '%s': %s", path, e)
+            return None
+
+    def write(self, city_name: str, data: Any) -> bool:
+        """Write data of a city. Return if the file was written."""
+        if self._legacy_data is not None:
+            self._convert_legacy_file()
+        os.makedirs(self.path, exist_ok=True)
+        return write_file_if_changed(
+            self._city_path(city_name),
+            json.dumps(data, ensure_ascii=False, indent=self.indent),
+        )
+
+    def _convert_legacy_file(self) -> None:
+        tmp_dir = f"{self.path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for city_name, data in self._legacy_data.items():
+            with open(
+                self._city_path(city_name, tmp_dir), "w", encoding="utf-8"
+            ) as f:
+                json.dump(data, f, ensure_ascii=False, indent=self.indent)
+        os.remove(self.path)
+        os.replace(tmp_dir, self.path)
+        self._legacy_data = None
+
+
+def _quantize_line(line: RailT, precision: int) -> RailT:
+    """Round coordinates dropping vertices that become duplicate."""
+    result = []
+    for point in line:
+        point = (round(point[0], precision), round(point[1], precision))
+        if not result or result[-1] != point:
+            result.append(point)
+    return result
+
+
+def make_geojson(
+    city: City,
+    include_tracks_geometry: bool = True,
+    precision: int | None = None,
+    merge_variants: bool = False,
+) -> dict:
+    """Make GeoJSON FeatureCollection with routes and stations of a city.
+    :param precision: number of fractional digits to round coordinates to,
+        or None to keep full precision
+    :param merge_variants: make one feature of route variants with the same
+        ref, colour and identical (possibly reversed) geometry, which is
+        typical for forward and backward variants
+    """
+
+    def quantize_point(point: LonLat) -> LonLat:
+        if precision is None:
+            return point
+        return round(point[0], precision), round(point[1], precision)
 
-def make_geojson(city: City, include_tracks_geometry: bool = True) -> dict:
     stopareas_in_transfers: set[StopArea] = set()
     for t in city.transfers:
         stopareas_in_transfers.update(t)
     features = []
+    # (ref, colour, geometry) => properties of a feature,
+    # for merge_variants mode
+    line_features = {}
     stopareas = set()
     stops = set()
     for rmaster in city:
@@ -163,23 +1015,41 @@ def make_geojson(city: City, include_tracks_geometry: bool = True) -> dict:
                 if include_tracks_geometry
                 else [s.stop for s in variant]
             )
-            features.append(
-                {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "LineString",
-                        "coordinates": tracks,
-                    },
-                    "properties": {
-                        "ref": variant.ref,
-                        "name": variant.name,
-                        "stroke": variant.colour,
-                    },
-                }
-            )
+            if precision is not None:
+                tracks = _quantize_line(tracks, precision)
             for st in variant:
-                stops.add(st.stop)
+                stops.add(quantize_point(st.stop))
                 stopareas.add(st.stoparea)
+            if merge_variants:
+                geometry = tuple(map(tuple, tracks))
+                properties = line_features.get(
+                    (variant.ref, variant.colour, geometry)
+                ) or line_features.get(
+                    (variant.ref, variant.colour, geometry[::-1])
+                )
+                if properties is not None:
+                    if variant.name:
+                        properties["name"] = "; ".join(
+                            filter(None, (properties["name"], variant.name))
+                        )
+                    continue
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": tracks,
+                },
+                "properties": {
+                    "ref": variant.ref,
+                    "name": variant.name,
+                    "stroke": variant.colour,
+                },
+            }
+            features.append(feature)
+            if merge_variants:
+                line_features[
+                    (variant.ref, variant.colour, geometry)
+                ] = feature["properties"]
 
     for stop in stops:
         features.append(
@@ -195,13 +1065,14 @@ def make_geojson(city: City, include_tracks_geometry: bool = True) -> dict:
                 },
             }
         )
-    for stoparea in stopareas:
+    # Sort for a stable output, which is the same between runs
+    for stoparea in sorted(stopareas, key=lambda sa: format_id(sa.id)):
         features.append(
             {
                 "type": "Feature",
                 "geometry": {
                     "type": "Point",
-                    "coordinates": stoparea.center,
+                    "coordinates": quantize_point(stoparea.center),
                 },
                 "properties": {
                     "name": stoparea.name,
@@ -215,6 +1086,147 @@ def make_geojson(city: City, include_tracks_geometry: bool = True) -> dict:
     return {"type": "FeatureCollection", "features": features}
 
 
+def city_to_geojson(
+    city: City,
+    include_tracks_geometry: bool = True,
+    precision: int | None = None,
+    compact: bool = False,
+) -> str:
+    """Serialize make_geojson() result. A compact GeoJSON has merged
+    route variants and no whitespace.
+    """
+    return json.dumps(
+        make_geojson(
+            city, include_tracks_geometry, precision, merge_variants=compact
+        ),
+        separators=(",", ":") if compact else None,
+    )
+
+
+# Cities to serialize, set in worker processes by _set_dump_cities()
+_dump_cities: list[City] = []
+
+
+def _set_dump_cities(cities: list[City]) -> None:
+    global _dump_cities
+    _dump_cities = cities
+
+
+def _dump_city(city_to_str: typing.Callable[[City], str], index: int) -> str:
+    return city_to_str(_dump_cities[index])
+
+
+class CityDumper:
+    """Serializes cities to strings, in a pool of worker processes
+    if workers > 1. Cities are passed to the processes once, at their
+    start, and the processes are started at once in the constructor.
+    With the "fork" start method a process forked while another thread
+    holds a lock, e.g. of logging, may deadlock, so a CityDumper
+    must be made before other threads are started.
+    """
+
+    def __init__(self, cities: list[City], workers: int = 1) -> None:
+        self.cities = cities
+        self.workers = workers
+        self._executor = None
+        if workers > 1 and len(cities) > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_set_dump_cities,
+                initargs=(cities,),
+            )
+            # The first task makes the pool fork all its processes
+            self._executor.submit(int).result()
+
+    def dump(self, city_to_str: typing.Callable[[City], str]) -> Iterator[str]:
+        """Yield serialized cities in the order of cities.
+        city_to_str must be picklable, e.g. a module-level function
+        or a functools.partial of it.
+        """
+        if not self._executor:
+            yield from map(city_to_str, self.cities)
+            return
+        yield from self._executor.map(
+            functools.partial(_dump_city, city_to_str),
+            range(len(self.cities)),
+            chunksize=max(1, len(self.cities) // (self.workers * 4)),
+        )
+
+    def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "CityDumper":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class ValidationLogWriter:
+    """Writes validation results of cities.
+    The format depends on the file name extension:
+    - .jsonl - JSON lines: a record per city is written and flushed
+      immediately, so results of validated cities survive a crash;
+    - otherwise - a JSON array written on close().
+    ".gz" suffix, e.g. "validation.jsonl.gz", makes a gzipped file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.is_jsonl = path.removesuffix(".gz").endswith(".jsonl")
+        if path.endswith(".gz"):
+            self.f = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            self.f = open(path, "w", encoding="utf-8")
+        self.records = []  # Records for JSON array format
+
+    def write(self, record: dict) -> None:
+        if self.is_jsonl:
+            self.f.write(json.dumps(record, ensure_ascii=False))
+            self.f.write("\n")
+            self.f.flush()
+        else:
+            self.records.append(record)
+
+    def close(self) -> None:
+        if not self.is_jsonl:
+            json.dump(self.records, self.f, indent=2, ensure_ascii=False)
+            self.records = []
+        self.f.close()
+
+
+def read_validation_log(path: str) -> Iterator[dict]:
+    """Yield validation results of cities from a file in any format
+    that ValidationLogWriter writes. JSON lines are read one by one,
+    and a truncated last line of an interrupted run is skipped.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        first_char = f.read(1)
+        while first_char.isspace():
+            first_char = f.read(1)
+        if first_char == "[":
+            yield from json.loads(first_char + f.read())
+            return
+        try:
+            for line_number, line in enumerate(
+                chain([first_char + f.readline()], f), start=1
+            ):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    logging.warning(
+                        "Skipping broken line %s of validation log %s",
+                        line_number,
+                        path,
+                    )
+        except EOFError:
+            logging.warning("Validation log %s is truncated", path)
+
+
 def _dumps_route_id(route_id: tuple[str | None, str | None]) -> str:
     """Argument is a route_id that depends on route colour and ref. Name can
     be taken from route_master or can be route's own, we don't take it into
@@ -229,38 +1241,44 @@ def _loads_route_id(route_id_dump: str) -> tuple[str | None, str | None]:
     return tuple(json.loads(route_id_dump))
 
 
-def read_recovery_data(path: str) -> dict:
-    """Recovery data is a json with data from previous transport builds.
+def read_recovery_data(path: str, city_names: Iterable[str]) -> dict:
+    """Recovery data is json with data from previous transport builds,
+    a file per city in the path directory, see CityShards.
     It helps to recover cities from some errors, e.g. by resorting
-    shuffled stations in routes."""
-    data = None
-    try:
-        with open(path, "r") as f:
-            try:
-                data = json.load(f)
-            except json.decoder.JSONDecodeError as e:
-                logging.warning("Cannot load recovery data: {}".format(e))
-    except FileNotFoundError:
-        logging.warning("Cannot find recovery data file '{}'".format(path))
-
-    if data is None:
+    shuffled stations in routes. Only data of the given cities is read.
+    Route ids are left json-encoded, see index_recovery_data()."""
+    if not os.path.exists(path):
+        logging.warning("Cannot find recovery data '{}'".format(path))
         logging.warning("Continue without recovery data.")
         return {}
-    else:
-        data = {
-            city_name: {
-                _loads_route_id(route_id): route_data
-                for route_id, route_data in routes.items()
-            }
-            for city_name, routes in data.items()
-        }
-        return data
+    shards = CityShards(path)
+    data = {}
+    for city_name in city_names:
+        routes = shards.read(city_name)
+        if routes is not None:
+            data[city_name] = routes
+    return data
+
+
+def index_recovery_data(
+    routes: dict[str, list[dict]] | None,
+) -> dict[tuple[str | None, str | None], dict[tuple[str, ...], list[dict]]]:
+    """Index recovery data of a city by route_id (colour, ref) and then
+    by sorted station names, see recovery_stop_names()."""
+    index = {}
+    for route_id, itineraries in (routes or {}).items():
+        by_names = index.setdefault(_loads_route_id(route_id), {})
+        for itinerary in itineraries:
+            names = recovery_stop_names(
+                stop["name"] for stop in itinerary["stations"]
+            )
+            by_names.setdefault(names, []).append(itinerary)
+    return index
 
 
-def write_recovery_data(
-    path: str, current_data: dict, cities: list[City]
-) -> None:
-    """Updates recovery data with good cities data and writes to file."""
+def write_recovery_data(path: str, cities: list[City]) -> None:
+    """Updates recovery data of good cities, leaving other cities'
+    data as is."""
 
     def make_city_recovery_data(
         city: City,
@@ -285,7 +1303,7 @@ def write_recovery_data(
                         station_name = station.int_name
                     itin["stations"].append(
                         {
-                            "oms_id": station.id,
+                            "oms_id": format_id(station.id),
                             "name": station_name,
                             "center": station.center,
                         }
@@ -295,20 +1313,18 @@ def write_recovery_data(
             routes[route_id] = itineraries
         return routes
 
-    data = current_data
-    for city in cities:
-        if city.is_good:
-            data[city.name] = make_city_recovery_data(city)
-
     try:
-        data = {
-            city_name: {
-                _dumps_route_id(route_id): route_data
-                for route_id, route_data in routes.items()
-            }
-            for city_name, routes in data.items()
-        }
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        shards = CityShards(path, indent=2)
+        for city in cities:
+            if city.is_good:
+                shards.write(
+                    city.name,
+                    {
+                        _dumps_route_id(route_id): route_data
+                        for route_id, route_data in make_city_recovery_data(
+                            city
+                        ).items()
+                    },
+                )
     except Exception as e:
         logging.warning("Cannot write recovery data to '%s': %s", path, str(e))
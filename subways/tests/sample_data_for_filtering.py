@@ -0,0 +1,24 @@
+# Elements that osmfilter drops with the filter of process_subways.sh
+IRRELEVANT_ELEMENTS = [
+    {"type": "node", "id": 900001, "lat": 1.5, "lon": -1.5},
+    {"type": "node", "id": 900002, "lat": 1.6, "lon": -1.5},
+    {
+        "type": "node",
+        "id": 900003,
+        "lat": 1.7,
+        "lon": -1.5,
+        "tags": {"railway": "level_crossing"},
+    },
+    {
+        "type": "way",
+        "id": 900001,
+        "tags": {"building": "yes"},
+        "nodes": [900001, 900002, 900003],
+    },
+    {
+        "type": "relation",
+        "id": 900001,
+        "tags": {"type": "route", "route": "bus"},
+        "members": [{"type": "way", "ref": 900001, "role": ""}],
+    },
+]
@@ -32,7 +32,15 @@ metro_samples = [
         0
       ],
       "name": "Station 1",
-      "entrances": []
+      "int_name": null,
+      "station_id": "n1",
+      "element_center": [
+        0.0,
+        0.0
+      ],
+      "entrances": [],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "r1": {
       "id": "r1",
@@ -41,7 +49,15 @@ metro_samples = [
         0.0047037307
       ],
       "name": "Station 2",
-      "entrances": []
+      "int_name": null,
+      "station_id": "n2",
+      "element_center": [
+        0.0047209447,
+        0.004686516680000001
+      ],
+      "entrances": [],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "r3": {
       "id": "r3",
@@ -50,20 +66,32 @@ metro_samples = [
         0.0097589171
       ],
       "name": "Station 3",
+      "int_name": null,
+      "station_id": "n3",
+      "element_center": [
+        0.010126375046666667,
+        0.009701004593333333
+      ],
       "entrances": [
         {
           "id": "n201",
           "name": null,
           "ref": "3-1",
-          "center": [0.01007169217, 0.00967473055]
+          "center": [0.01007169217, 0.00967473055],
+          "can_enter": true,
+          "can_exit": true
         },
         {
           "id": "n202",
           "name": null,
           "ref": "3-2",
-          "center": [0.01018702716, 0.00966936613]
+          "center": [0.01018702716, 0.00966936613],
+          "can_enter": true,
+          "can_exit": true
         }
-      ]
+      ],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "n4": {
       "id": "n4",
@@ -72,14 +100,24 @@ metro_samples = [
         0.01
       ],
       "name": "Station 4",
+      "int_name": null,
+      "station_id": "n4",
+      "element_center": [
+        0.0,
+        0.01
+      ],
       "entrances": [
         {
           "id": "n205",
           "name": null,
           "ref": "4-1",
-          "center": [0.000201163, 0.01015484596]
+          "center": [0.000201163, 0.01015484596],
+          "can_enter": true,
+          "can_exit": true
         }
-      ]
+      ],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "r2": {
       "id": "r2",
@@ -88,7 +126,15 @@ metro_samples = [
         0.00514739839
       ],
       "name": "Station 5",
-      "entrances": []
+      "int_name": null,
+      "station_id": "n5",
+      "element_center": [
+        0.0047718624,
+        0.00514739839
+      ],
+      "entrances": [],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "n6": {
       "id": "n6",
@@ -97,7 +143,15 @@ metro_samples = [
         0
       ],
       "name": "Station 6",
-      "entrances": []
+      "int_name": null,
+      "station_id": "n6",
+      "element_center": [
+        0.01,
+        0.0
+      ],
+      "entrances": [],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "r4": {
       "id": "r4",
@@ -106,20 +160,32 @@ metro_samples = [
         0.010286367745
       ],
       "name": "Station 7",
+      "int_name": null,
+      "station_id": "n7",
+      "element_center": [
+        0.009653221545999999,
+        0.010327080928
+      ],
       "entrances": [
         {
           "id": "n204",
           "name": null,
           "ref": "7-1",
-          "center": [0.00952183932, 0.01034796501]
+          "center": [0.00952183932, 0.01034796501],
+          "can_enter": true,
+          "can_exit": true
         },
         {
           "id": "n203",
           "name": null,
           "ref": "7-2",
-          "center": [0.00959962338, 0.01042574907]
+          "center": [0.00959962338, 0.01042574907],
+          "can_enter": true,
+          "can_exit": true
         }
-      ]
+      ],
+      "has_platforms": false,
+      "platform_exits": []
     },
     "r16": {
       "id": "r16",
@@ -128,7 +194,15 @@ metro_samples = [
         0.014377764559999999
       ],
       "name": "Station 8",
-      "entrances": []
+      "int_name": null,
+      "station_id": "n8",
+      "element_center": [
+        0.012391026016666667,
+        0.01436273297
+      ],
+      "entrances": [],
+      "has_platforms": false,
+      "platform_exits": []
     }
   },
   "networks": {
@@ -364,11 +438,13 @@ metro_samples = [
   "transfers": [
     [
       "r1",
-      "r2"
+      "r2",
+      81
     ],
     [
       "r3",
-      "r4"
+      "r4",
+      106
     ]
   ]
 }
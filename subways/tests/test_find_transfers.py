@@ -1,5 +1,6 @@
 from copy import deepcopy
 
+from subways.osm_element import format_id
 from subways.tests.sample_data_for_outputs import metro_samples
 from subways.tests.util import TestCase, JsonLikeComparisonMixin
 
@@ -13,7 +14,7 @@ class TestTransfers(JsonLikeComparisonMixin, TestCase):
 
         self.assertSequenceAlmostEqualIgnoreOrder(
             expected_transfers,
-            transfers,
+            [{format_id(i) for i in transfer} for transfer in transfers],
             cmp=lambda transfer_as_set: sorted(transfer_as_set),
         )
 
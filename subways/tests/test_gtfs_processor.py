@@ -1,12 +1,22 @@
 import csv
+import io
+import tarfile
+import tempfile
+import zipfile
+import zlib
 from functools import partial
 from pathlib import Path
 
 from subways.processors._common import transit_to_dict
 from subways.processors.gtfs import (
     dict_to_row,
+    get_shape_ids,
     GTFS_COLUMNS,
+    gtfs_shapes,
+    iter_gtfs_data,
+    make_gtfs,
     transit_data_to_gtfs,
+    ZIP_DATE_TIME,
 )
 from subways.tests.sample_data_for_outputs import metro_samples
 from subways.tests.util import TestCase
@@ -114,6 +124,175 @@ class TestGTFS(TestCase):
             )
             self._compareGtfs(calculated_gtfs_data, control_gtfs_data)
 
+    def test__shapes__deduplication_and_simplification(self) -> None:
+        """Test that itineraries with identical geometry share a shape,
+        and that shapes are simplified with distances along
+        the original geometry.
+        """
+        # Almost straight line with 0.1 m deviations of the middle vertices
+        wiggly_line = [(0.0, 0.0)] + [
+            (i * 0.001, 0.000001 * (i % 2)) for i in range(1, 10)
+        ]
+        wiggly_line.append((0.01, 0.0))
+        other_line = [(0.0, 0.0), (0.0, 0.005), (0.0, 0.01)]
+        data = {
+            "networks": {
+                "City": {
+                    "routes": [
+                        {
+                            "itineraries": [
+                                {"id": "r1", "tracks": wiggly_line},
+                                {"id": "r2", "tracks": other_line},
+                            ]
+                        },
+                        {
+                            "itineraries": [
+                                {"id": "r3", "tracks": list(wiggly_line)},
+                            ]
+                        },
+                    ]
+                }
+            }
+        }
+
+        shape_ids = get_shape_ids(data)
+        self.assertDictEqual(shape_ids, {"r1": "1", "r2": "2", "r3": "1"})
+
+        for tolerance, expected_shape1_len in ((0, 11), (1.0, 2)):
+            with self.subTest(msg=f"{tolerance=}"):
+                shapes = list(gtfs_shapes(data, shape_ids, tolerance))
+                self.assertSetEqual(
+                    {shape["shape_id"] for shape in shapes}, {"1", "2"}
+                )
+                shape1 = [
+                    shape for shape in shapes if shape["shape_id"] == "1"
+                ]
+                self.assertEqual(len(shape1), expected_shape1_len)
+                self.assertListEqual(
+                    [shape["shape_pt_sequence"] for shape in shape1],
+                    list(range(expected_shape1_len)),
+                )
+                self.assertEqual(shape1[0]["shape_dist_traveled"], 0)
+                # 0.01 degree of the equator is about 1113 m
+                self.assertAlmostEqual(
+                    shape1[-1]["shape_dist_traveled"], 1113.2, places=1
+                )
+
+    def test__make_gtfs__archive_formats(self) -> None:
+        """Test that tables streamed into zip and tar archives,
+        with various zip compression options, contain the same rows
+        as transit_data_to_gtfs() produces.
+        """
+        for metro_sample in metro_samples:
+            cities, transfers = self.prepare_cities(metro_sample)
+            transit_data = transit_to_dict(cities, transfers)
+            expected_rows = {
+                gtfs_feature: [
+                    list(map(str, dict_to_row(record, gtfs_feature)))
+                    for record in records
+                ]
+                for gtfs_feature, records in transit_data_to_gtfs(
+                    transit_data
+                ).items()
+            }
+
+            for fmt, zip_options in (
+                ("tar", {}),
+                ("zip", {"compression": "stored"}),
+                ("zip", {"compression": "deflate"}),
+                ("zip", {"compression": "deflate", "workers": 4}),
+                (
+                    "zip",
+                    {
+                        "compression": "deflate",
+                        "compression_level": 9,
+                        "workers": 2,
+                    },
+                ),
+            ):
+                with self.subTest(
+                    msg=f"{metro_sample['name']}, {fmt}, {zip_options}"
+                ):
+                    with tempfile.TemporaryDirectory() as tmp_dir:
+                        filename = f"{tmp_dir}/gtfs.{fmt}"
+                        make_gtfs(
+                            filename,
+                            iter_gtfs_data(transit_data),
+                            **zip_options,
+                        )
+                        archive_tables = self._readGtfsArchive(filename, fmt)
+
+                    self.assertListEqual(
+                        list(archive_tables.keys()), list(GTFS_COLUMNS)
+                    )
+                    for gtfs_feature, rows in archive_tables.items():
+                        self.assertListEqual(
+                            rows[0], GTFS_COLUMNS[gtfs_feature]
+                        )
+                        self.assertListEqual(
+                            rows[1:], expected_rows[gtfs_feature]
+                        )
+
+    def test__make_gtfs__parallel_deflate_members(self) -> None:
+        """Test that zip members deflated in worker threads and appended
+        through zipfile internals make a valid archive identical to the one
+        written without workers.
+        """
+        transit_data = transit_to_dict(*self.prepare_cities(metro_samples[0]))
+        archives = {}
+        archive_bytes = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for workers in (1, 3):
+                filename = f"{tmp_dir}/gtfs{workers}.zip"
+                make_gtfs(
+                    filename,
+                    iter_gtfs_data(transit_data),
+                    compression="deflate",
+                    workers=workers,
+                )
+                with zipfile.ZipFile(filename) as zf:
+                    self.assertIsNone(zf.testzip())
+                    members = {}
+                    for zinfo in zf.infolist():
+                        data = zf.read(zinfo)
+                        self.assertEqual(
+                            zinfo.compress_type, zipfile.ZIP_DEFLATED
+                        )
+                        self.assertEqual(zinfo.CRC, zlib.crc32(data))
+                        self.assertEqual(zinfo.file_size, len(data))
+                        self.assertEqual(zinfo.date_time, ZIP_DATE_TIME)
+                        members[zinfo.filename] = data
+                archives[workers] = members
+                archive_bytes[workers] = Path(filename).read_bytes()
+
+        self.assertListEqual(
+            list(archives[3]), [f"{name}.txt" for name in GTFS_COLUMNS]
+        )
+        self.assertDictEqual(archives[3], archives[1])
+        self.assertEqual(archive_bytes[3], archive_bytes[1])
+
+    def _readGtfsArchive(self, filename: str, fmt: str) -> dict:
+        """Return GTFS table name => list of rows, including the header."""
+        tables = {}
+        if fmt == "zip":
+            with zipfile.ZipFile(filename) as zf:
+                # Check CRC and headers of all members
+                self.assertIsNone(zf.testzip())
+                for name in zf.namelist():
+                    data = zf.read(name)
+                    tables[name.removesuffix(".txt")] = data
+        else:
+            with tarfile.open(filename) as tf:
+                for member in tf.getmembers():
+                    data = tf.extractfile(member).read()
+                    tables[member.name.removesuffix(".txt")] = data
+        return {
+            gtfs_feature: list(
+                csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+            )
+            for gtfs_feature, data in tables.items()
+        }
+
     @staticmethod
     def _readGtfs(gtfs_dir: Path) -> dict:
         gtfs_data = dict()
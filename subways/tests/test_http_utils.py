@@ -0,0 +1,188 @@
+import gzip
+import http.server
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from subways.http_utils import (
+    close_connections,
+    fetch_url,
+    http_request,
+    read_url,
+    remove_cached_url,
+)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive
+    body = b"id,name\n"
+    etag = '"v1"'
+    status = 200
+    drop_connection = False
+    requests: list[dict] = []
+
+    def do_GET(self) -> None:
+        self.requests.append(
+            {"path": self.path, "port": self.client_address[1]}
+            | dict(self.headers)
+        )
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/cities.csv")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.status != 200:
+            self.send_error(self.status)
+        elif self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            body = self.body
+            self.send_response(200)
+            self.send_header("ETag", self.etag)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        # Close the connection without telling the client in advance,
+        # like servers do with idle connections
+        self.close_connection = self.drop_connection
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class HttpServerTestCase(TestCase):
+    def setUp(self) -> None:
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), Handler
+        )
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/cities.csv"
+        Handler.requests = []
+
+    def tearDown(self) -> None:
+        close_connections()
+        self.server.shutdown()
+        self.server.server_close()
+        Handler.status = 200
+
+
+class TestHttpRequest(HttpServerTestCase):
+    """Test subways.http_utils.http_request function"""
+
+    def test__http_request__gzip_and_keep_alive(self) -> None:
+        body, Handler.body = Handler.body, b"id,name\n" * 1000
+        try:
+            for path in ("/cities.csv", "/redirect", "/cities.csv"):
+                url = self.url.replace("/cities.csv", path)
+                with http_request(url) as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertEqual(
+                        response.headers["Content-Encoding"], "gzip"
+                    )
+                    self.assertEqual(response.read(), Handler.body)
+        finally:
+            Handler.body = body
+
+        self.assertListEqual(
+            [r["path"] for r in Handler.requests],
+            ["/cities.csv", "/redirect", "/cities.csv", "/cities.csv"],
+        )
+        # All requests went through one connection
+        self.assertEqual(len({r["port"] for r in Handler.requests}), 1)
+
+    def test__http_request__closed_connection(self) -> None:
+        Handler.drop_connection = True
+        try:
+            for _ in range(2):
+                with http_request(self.url) as response:
+                    self.assertEqual(response.read(), Handler.body)
+        finally:
+            Handler.drop_connection = False
+        self.assertEqual(len({r["port"] for r in Handler.requests}), 2)
+
+
+class TestReadUrl(HttpServerTestCase):
+    """Test subways.http_utils.read_url function"""
+
+    def test__read_url__cache(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for ttl in (3600, 3600, 0):
+                self.assertEqual(
+                    read_url(self.url, cache_dir=cache_dir, ttl=ttl),
+                    Handler.body,
+                )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            # The second response was taken from the cache,
+            # the third one was revalidated with the ETag
+            self.assertEqual(len(Handler.requests), 2)
+            self.assertNotIn("If-None-Match", Handler.requests[0])
+            self.assertEqual(Handler.requests[1]["If-None-Match"], '"v1"')
+            self.assertEqual(
+                fetch_url(self.url, cache_dir=cache_dir, ttl=3600),
+                (Handler.body, False),
+            )
+
+            remove_cached_url(self.url, cache_dir)
+            self.assertListEqual(os.listdir(cache_dir), [])
+            self.assertEqual(
+                fetch_url(self.url, cache_dir=cache_dir, ttl=3600),
+                (Handler.body, True),
+            )
+
+            Handler.status = 429
+            with self.assertLogs(level="WARNING"):
+                self.assertEqual(
+                    read_url(self.url, cache_dir=cache_dir), Handler.body
+                )
+
+    def test__read_url__no_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            Handler.status = 429
+            with self.assertRaisesRegex(Exception, "Failed: HTTP 429"):
+                read_url(self.url, cache_dir=cache_dir, error_prefix="Failed")
+            self.assertListEqual(os.listdir(cache_dir), [])
+
+        Handler.status = 200
+        self.assertEqual(read_url(self.url), Handler.body)
+        self.assertEqual(read_url(self.url), Handler.body)
+        self.assertEqual(len(Handler.requests), 3)
+
+    def test__read_url__lru_eviction(self) -> None:
+        urls = {
+            name: self.url.replace("cities", name) for name in ("a", "b", "c")
+        }
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            def read(name: str, max_size: int | None = None) -> None:
+                self.assertEqual(
+                    read_url(
+                        urls[name],
+                        cache_dir=cache_dir,
+                        ttl=3600,
+                        max_size=max_size,
+                    ),
+                    Handler.body,
+                )
+
+            read("a")
+            read("b")
+            paths = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir)]
+            for mtime, path in enumerate(paths, start=1):
+                os.utime(path, (mtime, mtime))
+            file_size = os.path.getsize(paths[0])
+
+            # A response taken from the cache becomes the most recent one
+            read("a")
+            read("c", max_size=file_size * 5 // 2)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertListEqual(
+                [r["path"] for r in Handler.requests],
+                ["/a.csv", "/b.csv", "/c.csv"],
+            )
+            read("a")
+            self.assertEqual(len(Handler.requests), 3)
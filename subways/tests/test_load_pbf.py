@@ -0,0 +1,161 @@
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from unittest import TestCase
+
+from subways.subway_io import load_pbf, load_xml
+from subways.tests.sample_data_for_filtering import IRRELEVANT_ELEMENTS
+
+
+GRANULARITY = 100
+MEMBER_TYPES = {"node": 0, "way": 1, "relation": 2}
+
+
+def varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def field(number: int, value: int | bytes) -> bytes:
+    if isinstance(value, int):
+        return varint(number << 3) + varint(value)
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def packed(values: list[int]) -> bytes:
+    return b"".join(varint(v) for v in values)
+
+
+def delta(values: list[int]) -> list[int]:
+    return [zigzag(v - p) for v, p in zip(values, [0] + values)]
+
+
+class StringTable:
+    def __init__(self) -> None:
+        self.strings = [""]
+
+    def __getitem__(self, s: str) -> int:
+        if s not in self.strings:
+            self.strings.append(s)
+        return self.strings.index(s)
+
+    def encode(self) -> bytes:
+        return b"".join(field(1, s.encode("utf-8")) for s in self.strings)
+
+
+def encode_block(elements: list[dict], dense: bool) -> bytes:
+    """Encode elements of the same type as a PrimitiveBlock."""
+    strings = StringTable()
+    messages = b""
+    if elements[0]["type"] == "node" and dense:
+        keys_vals = []
+        for el in elements:
+            for k, v in el.get("tags", {}).items():
+                keys_vals += [strings[k], strings[v]]
+            keys_vals.append(0)
+        message = (
+            field(1, packed(delta([el["id"] for el in elements])))
+            + field(8, packed(delta([coord(el["lat"]) for el in elements])))
+            + field(9, packed(delta([coord(el["lon"]) for el in elements])))
+            + field(10, packed(keys_vals))
+        )
+        messages = field(2, message)
+    for el in elements if not messages else []:
+        tags = el.get("tags", {})
+        message = field(
+            1, zigzag(el["id"]) if el["type"] == "node" else el["id"]
+        )
+        message += field(2, packed([strings[k] for k in tags]))
+        message += field(3, packed([strings[v] for v in tags.values()]))
+        if el["type"] == "node":
+            message += field(8, zigzag(coord(el["lat"])))
+            message += field(9, zigzag(coord(el["lon"])))
+            messages += field(1, message)
+        elif el["type"] == "way":
+            message += field(8, packed(delta(el.get("nodes", []))))
+            messages += field(3, message)
+        else:
+            members = el.get("members", [])
+            message += field(8, packed([strings[m["role"]] for m in members]))
+            message += field(9, packed(delta([m["ref"] for m in members])))
+            message += field(
+                10, packed([MEMBER_TYPES[m["type"]] for m in members])
+            )
+            messages += field(4, message)
+    return field(1, strings.encode()) + field(2, messages)
+
+
+def coord(value: float) -> int:
+    return round(value * 1_000_000_000 / GRANULARITY)
+
+
+def encode_blob(blob_type: str, data: bytes, compress: bool) -> bytes:
+    blob = (
+        field(2, len(data)) + field(3, zlib.compress(data))
+        if compress
+        else field(1, data)
+    )
+    header = field(1, blob_type.encode("utf-8")) + field(3, len(blob))
+    return len(header).to_bytes(4, "big") + header + blob
+
+
+def write_pbf(path: str, elements: list[dict], block_size: int) -> None:
+    header_block = field(4, b"OsmSchema-V0.6") + field(4, b"DenseNodes")
+    blobs = [encode_blob("OSMHeader", header_block, compress=True)]
+    for el_type in ("node", "way", "relation"):
+        typed_elements = [el for el in elements if el["type"] == el_type]
+        for i in range(0, len(typed_elements), block_size):
+            block_elements = typed_elements[i:][:block_size]
+            block = encode_block(block_elements, dense=i % 2 == 0)
+            blobs.append(encode_blob("OSMData", block, compress=i % 2 == 0))
+    with open(path, "wb") as f:
+        f.write(b"".join(blobs))
+
+
+class TestLoadPbf(TestCase):
+    """Test subways.subway_io.load_pbf function"""
+
+    def test__load_pbf(self) -> None:
+        xml_path = Path(__file__).parent / "assets" / "tiny_world.osm"
+        expected_elements = load_xml(str(xml_path))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pbf_path = os.path.join(tmp_dir, "tiny_world.osm.pbf")
+            write_pbf(
+                pbf_path, expected_elements + IRRELEVANT_ELEMENTS, block_size=5
+            )
+            for workers in (1, 2):
+                with self.subTest(msg=f"{workers=}"):
+                    elements = load_pbf(pbf_path, workers)
+                    self.assertListEqual(
+                        [(el["type"], el["id"]) for el in elements],
+                        [(el["type"], el["id"]) for el in expected_elements],
+                    )
+                    for el, expected_el in zip(elements, expected_elements):
+                        if el["type"] == "node":
+                            for key in ("lat", "lon"):
+                                self.assertAlmostEqual(
+                                    el.pop(key),
+                                    expected_el[key],
+                                    places=7,
+                                )
+                            expected_el = {
+                                k: v
+                                for k, v in expected_el.items()
+                                if k not in ("lat", "lon")
+                            }
+                        self.assertDictEqual(dict(el), dict(expected_el))
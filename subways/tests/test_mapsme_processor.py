@@ -1,6 +1,11 @@
+import json
 from operator import itemgetter
 
-from subways.processors.mapsme import transit_data_to_mapsme
+from subways.processors._common import transit_to_dict
+from subways.processors.mapsme import (
+    _stoparea_to_mapsme,
+    transit_data_to_mapsme,
+)
 from subways.tests.sample_data_for_outputs import metro_samples
 from subways.tests.util import JsonLikeComparisonMixin, TestCase
 
@@ -13,12 +18,48 @@ class TestMapsme(JsonLikeComparisonMixin, TestCase):
             with self.subTest(msg=sample["name"]):
                 self._test__transit_data_to_mapsme__for_sample(sample)
 
+    def test__stoparea_to_mapsme__no_entrances(self) -> None:
+        """Test that a stop area without entrances gets them from its
+        platforms, or from its own center only if it has no platforms.
+        """
+        stoparea = json.loads(metro_samples[0]["json_dump"])["stopareas"]["n1"]
+        station_egress = {
+            "osm_type": "node",
+            "osm_id": 1,
+            "lon": 0.0,
+            "lat": 0.0,
+            "distance": 60,
+        }
+        for has_platforms, platform_exits, expected_egresses in (
+            (False, [], [station_egress]),
+            # Platforms without nodes suitable for exits
+            (True, [], []),
+            (
+                True,
+                [{"id": "n100", "center": [0.0, 0.0]}],
+                [{**station_egress, "osm_id": 100}],
+            ),
+        ):
+            with self.subTest(
+                has_platforms=has_platforms, platform_exits=platform_exits
+            ):
+                st = _stoparea_to_mapsme(
+                    {
+                        **stoparea,
+                        "has_platforms": has_platforms,
+                        "platform_exits": platform_exits,
+                    }
+                )
+                self.assertListEqual(st["entrances"], expected_egresses)
+                self.assertListEqual(st["exits"], expected_egresses)
+
     def _test__transit_data_to_mapsme__for_sample(
         self, metro_sample: dict
     ) -> None:
         cities, transfers = self.prepare_cities(metro_sample)
+        transit_data = transit_to_dict(cities, transfers)
         calculated_mapsme_data = transit_data_to_mapsme(
-            cities, transfers, cache_path=None
+            cities, transit_data, cache_path=None
         )
         control_mapsme_data = metro_sample["mapsme_output"]
 
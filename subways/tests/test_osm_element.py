@@ -0,0 +1,96 @@
+import copy
+import io
+import pickle
+from unittest import TestCase
+
+from subways.osm_element import (
+    el_center,
+    el_id,
+    format_id,
+    make_id,
+    OsmElement,
+    parse_id,
+)
+from subways.subway_io import dump_json, load_json
+
+
+class TestOsmElement(TestCase):
+    """Test dict compatibility of subways.osm_element.OsmElement"""
+
+    way = {
+        "type": "way",
+        "id": 2,
+        "tags": {"railway": "subway"},
+        "nodes": [1, 2, 3],
+        "center": {"lat": 0.5, "lon": 1.5},
+    }
+
+    def test__read_interface(self) -> None:
+        el = OsmElement.from_dict(self.way)
+        self.assertEqual(el, self.way)
+        self.assertEqual(self.way, el)
+        self.assertEqual(el.to_dict(), self.way)
+        self.assertEqual(repr(el), repr(self.way))
+        self.assertEqual(len(el), len(self.way))
+        self.assertListEqual(list(el), list(self.way))
+        self.assertEqual(el["tags"], {"railway": "subway"})
+        self.assertIn("nodes", el)
+        self.assertNotIn("lat", el)
+        self.assertNotIn("get", el)
+        self.assertIsNone(el.get("members"))
+        self.assertEqual(el.get("members", []), [])
+        with self.assertRaises(KeyError):
+            el["lat"]
+        with self.assertRaises(KeyError):
+            el["__class__"]
+
+    def test__write_interface(self) -> None:
+        el = OsmElement("node", 1)
+        self.assertTrue(el)
+        el["lat"], el["lon"] = 1.0, 2.0
+        self.assertEqual(el, {"type": "node", "id": 1, "lat": 1.0, "lon": 2.0})
+        del el["lat"]
+        self.assertNotIn("lat", el)
+        with self.assertRaises(KeyError):
+            del el["lat"]
+        with self.assertRaises(KeyError):
+            el["unknown"] = 1
+
+    def test__el_id_and_el_center(self) -> None:
+        node = {"type": "node", "id": 1, "lat": 1.0, "lon": 2.0}
+        for el in (self.way, node, {"type": "relation", "id": 3}):
+            with self.subTest(el=el):
+                osm_element = OsmElement.from_dict(el)
+                self.assertEqual(el_id(osm_element), el_id(el))
+                self.assertEqual(el_center(osm_element), el_center(el))
+
+    def test__packed_ids(self) -> None:
+        for el_type, osm_id, string_id in (
+            ("node", 1, "n1"),
+            ("way", 123456789012, "w123456789012"),
+            ("relation", -5, "r-5"),
+        ):
+            with self.subTest(string_id=string_id):
+                elid = make_id(el_type, osm_id)
+                self.assertEqual(elid, el_id({"type": el_type, "id": osm_id}))
+                self.assertEqual(
+                    elid, el_id({"type": el_type, "ref": osm_id, "role": ""})
+                )
+                self.assertEqual(format_id(elid), string_id)
+                self.assertEqual(parse_id(string_id), elid)
+        self.assertEqual(
+            len({make_id(t, 1) for t in ("node", "way", "relation")}), 3
+        )
+        self.assertIsNone(format_id(None))
+
+    def test__copy_pickle_and_json(self) -> None:
+        el = OsmElement.from_dict(self.way)
+        self.assertEqual(copy.deepcopy(el), self.way)
+        self.assertEqual(pickle.loads(pickle.dumps(el)), self.way)
+
+        f = io.StringIO()
+        dump_json([el], f)
+        f.seek(0)
+        elements = load_json(f)
+        self.assertIsInstance(elements[0], OsmElement)
+        self.assertListEqual(elements, [self.way])
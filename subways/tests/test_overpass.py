@@ -1,6 +1,12 @@
 from unittest import TestCase, mock
 
-from subways.overpass import compose_overpass_request, overpass_request
+from subways.overpass import (
+    compose_overpass_request,
+    multi_overpass,
+    OVERPASS_CACHE_MAX_SIZE,
+    OVERPASS_CACHE_TTL,
+    overpass_request,
+)
 
 
 class TestOverpassQuery(TestCase):
@@ -150,15 +156,48 @@ class TestOverpassQuery(TestCase):
             "%28._%3B%3E%3E%3B%29%3Bout%20body%20center%20qt%3B"
         )
 
-        with mock.patch("subways.overpass.json.load") as load_mock:
+        with mock.patch("subways.overpass.json.loads") as load_mock:
             load_mock.return_value = {"elements": []}
 
-            with mock.patch(
-                "subways.overpass.urllib.request.urlopen"
-            ) as urlopen_mock:
-                ent = urlopen_mock.return_value.__enter__
-                ent.return_value.getcode.return_value = 200
-
+            with mock.patch("subways.overpass.fetch_url") as fetch_url_mock:
+                fetch_url_mock.return_value = (b"", True)
                 overpass_request(overground, overpass_api, bboxes)
 
-        urlopen_mock.assert_called_once_with(expected_url, timeout=1000)
+        fetch_url_mock.assert_called_once_with(
+            expected_url,
+            cache_dir=None,
+            ttl=OVERPASS_CACHE_TTL,
+            max_size=OVERPASS_CACHE_MAX_SIZE,
+            timeout=1000,
+            error_prefix="Failed to query Overpass API",
+        )
+
+    def test__overpass_request__remark(self) -> None:
+        response = b'{"elements": [], "remark": "runtime error: timeout"}'
+        with mock.patch(
+            "subways.overpass.fetch_url", return_value=(response, True)
+        ), mock.patch("subways.overpass.remove_cached_url") as remove_mock:
+            with self.assertRaisesRegex(Exception, "runtime error: timeout"):
+                overpass_request(
+                    False, "http://overpass.example/", [[1, 2, 3, 4]], "c"
+                )
+        remove_mock.assert_called_once()
+        self.assertEqual(remove_mock.call_args.args[1], "c")
+
+    def test__multi_overpass__wait_only_after_requests(self) -> None:
+        response = b'{"elements": [{"type": "node", "id": 1}]}'
+        bboxes = [[1, 2, 3, 4]] * 25  # Three requests
+        with mock.patch(
+            "subways.overpass.fetch_url",
+            side_effect=[
+                (response, False),
+                (response, True),
+                (response, False),
+            ],
+        ), mock.patch("subways.overpass.time.sleep") as sleep_mock:
+            elements = multi_overpass(
+                False, "http://overpass.example/", bboxes, "cache"
+            )
+        self.assertEqual(len(elements), 3)
+        # Only the third slice waits, after the second one was requested
+        sleep_mock.assert_called_once()
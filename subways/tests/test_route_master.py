@@ -1,3 +1,4 @@
+from subways.osm_element import format_id
 from subways.structure.route_master import RouteMaster
 from subways.tests.sample_data_for_twin_routes import metro_samples
 from subways.tests.util import TestCase
@@ -98,13 +99,20 @@ class TestRouteMaster(TestCase):
 
         self.assertTrue(city.is_good)
 
+        # Route masters are keyed by packed ids or by refs of routes
+        route_masters = {
+            format_id(k) if isinstance(k, int) else k: route_master
+            for k, route_master in city.routes.items()
+        }
+
         for route_master_id, expected_twin_ids in metro_sample[
             "twin_routes"
         ].items():
-            route_master = city.routes[route_master_id]
+            route_master = route_masters[route_master_id]
             calculated_twins = route_master.find_twin_routes()
             calculated_twin_ids = {
-                r1.id: r2.id for r1, r2 in calculated_twins.items()
+                format_id(r1.id): format_id(r2.id)
+                for r1, r2 in calculated_twins.items()
             }
             self.assertDictEqual(expected_twin_ids, calculated_twin_ids)
 
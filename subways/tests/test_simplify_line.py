@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from subways.geom_utils import distance_to_segment, simplify_line
+
+
+class TestSimplifyLine(TestCase):
+    """Test subways.geom_utils.simplify_line function"""
+
+    def test__distance_to_segment(self) -> None:
+        segment = ((0.0, 0.0), (0.01, 0.0))
+        # 0.001 degree at the equator is about 111.3 m
+        for point, expected_distance in (
+            ((0.005, 0.0), 0.0),
+            ((0.005, 0.001), 111.3),
+            ((-0.001, 0.0), 111.3),
+            ((0.011, 0.0), 111.3),
+        ):
+            with self.subTest(msg=f"{point=}"):
+                self.assertAlmostEqual(
+                    distance_to_segment(point, *segment),
+                    expected_distance,
+                    places=1,
+                )
+
+    def test__simplify_line(self) -> None:
+        # A 111 m high tent made of oversampled straight pieces
+        line = [
+            (0.0, 0.0),
+            (0.0005, 0.0005),
+            (0.001, 0.001),
+            (0.0015, 0.0005),
+            (0.002, 0.0),
+        ]
+        cases = (
+            (0, list(range(len(line)))),
+            (1, [0, 2, 4]),
+            (100, [0, 2, 4]),
+            (200, [0, 4]),
+        )
+        for tolerance, expected_indexes in cases:
+            with self.subTest(msg=f"{tolerance=}"):
+                self.assertListEqual(
+                    simplify_line(line, tolerance), expected_indexes
+                )
+
+    def test__simplify_line__short_and_closed_lines(self) -> None:
+        self.assertListEqual(simplify_line([], 10), [])
+        self.assertListEqual(simplify_line([(0.0, 0.0)], 10), [0])
+        ring = [(0.0, 0.0), (0.01, 0.0), (0.01, 0.01), (0.0, 0.0)]
+        self.assertListEqual(simplify_line(ring, 10), [0, 1, 2, 3])
@@ -0,0 +1,33 @@
+import threading
+from unittest import TestCase
+
+from subways.stages import run_stages
+
+
+class TestRunStages(TestCase):
+    """Test subways.stages.run_stages function"""
+
+    def test__run_stages__failure_isolation(self) -> None:
+        for workers in (1, 3):
+            with self.subTest(msg=f"{workers=}"):
+                completed = []
+
+                def fail() -> None:
+                    raise RuntimeError("Stage failure")
+
+                stages = {
+                    "first": lambda: completed.append("first"),
+                    "failing": fail,
+                    "last": lambda: completed.append("last"),
+                }
+                with self.assertLogs(level="ERROR"):
+                    failed_stages = run_stages(stages, workers)
+
+                self.assertListEqual(failed_stages, ["failing"])
+                self.assertCountEqual(completed, ["first", "last"])
+
+    def test__run_stages__concurrency(self) -> None:
+        """Both stages can only complete if they run simultaneously."""
+        barrier = threading.Barrier(2, timeout=10)
+        stages = {"stage1": barrier.wait, "stage2": barrier.wait}
+        self.assertListEqual(run_stages(stages, workers=2), [])
@@ -18,9 +18,12 @@ class TestStorage(JsonLikeComparisonMixin, TestCase):
         calculated_transit_data = transit_to_dict(cities, transfers)
 
         control_transit_data = json.loads(metro_sample["json_dump"])
-        control_transit_data["transfers"] = set(
-            map(tuple, control_transit_data["transfers"])
-        )
+        control_transit_data["transfers"] = {
+            (stoparea1_id, stoparea2_id): transfer_time
+            for stoparea1_id, stoparea2_id, transfer_time in (
+                control_transit_data["transfers"]
+            )
+        }
 
         self._compare_transit_data(
             calculated_transit_data, control_transit_data
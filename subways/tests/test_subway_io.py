@@ -0,0 +1,377 @@
+import functools
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from xml.sax.saxutils import quoteattr
+
+from subways.subway_io import (
+    apply_osm_change,
+    city_to_geojson,
+    city_to_yaml,
+    CityDumper,
+    CityShards,
+    index_recovery_data,
+    load_xml,
+    make_geojson,
+    read_recovery_data,
+    read_validation_log,
+    ValidationLogWriter,
+    write_file_if_changed,
+    write_recovery_data,
+)
+from subways.tests.sample_data_for_filtering import IRRELEVANT_ELEMENTS
+from subways.tests.sample_data_for_outputs import metro_samples
+from subways.tests.util import TestCase as CitiesTestCase
+from subways.validation import calculate_centers
+
+
+class TestWriteFileIfChanged(TestCase):
+    """Test subways.subway_io.write_file_if_changed function"""
+
+    def test__write_file_if_changed(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "city.yaml")
+
+            self.assertTrue(write_file_if_changed(path, "Станция: 1\n"))
+            os.utime(path, (0, 0))
+
+            self.assertFalse(write_file_if_changed(path, "Станция: 1\n"))
+            self.assertEqual(os.path.getmtime(path), 0)
+
+            for new_content in ("Станция: 2\n", "Станция: 10\n"):
+                with self.subTest(msg=new_content):
+                    self.assertTrue(write_file_if_changed(path, new_content))
+                    with open(path, encoding="utf-8") as f:
+                        self.assertEqual(f.read(), new_content)
+
+
+class TestMakeGeojson(CitiesTestCase):
+    """Test subways.subway_io.make_geojson function"""
+
+    def test__make_geojson__compact_keeps_refs(self) -> None:
+        cities, _ = self.prepare_cities(metro_samples[0])
+        city = next(
+            c for c in cities if c.name == "Intersecting 2 metro lines"
+        )
+        # Variants of a route master with the same colour and geometry,
+        # but with different refs, as if they were different lines
+        variants = list(next(iter(city)))
+        variants[1].ref = "1a"
+
+        compact_geojson = make_geojson(city, merge_variants=True)
+        self.assertCountEqual(
+            [
+                (f["properties"]["ref"], f["properties"]["name"])
+                for f in compact_geojson["features"]
+                if f["geometry"]["type"] == "LineString"
+            ],
+            [
+                ("1", variants[0].name),
+                ("1a", variants[1].name),
+                ("2", "2 forward; 2 backward"),
+            ],
+        )
+
+    def test__make_geojson__compact(self) -> None:
+        cities, _ = self.prepare_cities(metro_samples[0])
+        city = next(
+            c for c in cities if c.name == "Intersecting 2 metro lines"
+        )
+
+        full_geojson = make_geojson(city)
+        compact_geojson = make_geojson(city, precision=3, merge_variants=True)
+
+        def get_lines(geojson: dict) -> dict[str, list]:
+            return {
+                f["properties"]["name"]: [
+                    list(point) for point in f["geometry"]["coordinates"]
+                ]
+                for f in geojson["features"]
+                if f["geometry"]["type"] == "LineString"
+            }
+
+        self.assertCountEqual(
+            get_lines(full_geojson),
+            ["1 forward", "1 backward", "2 forward", "2 backward"],
+        )
+        self.assertDictEqual(
+            get_lines(compact_geojson),
+            {
+                "1 forward; 1 backward": [
+                    [0.0, 0.0],
+                    [0.005, 0.005],
+                    [0.01, 0.01],
+                ],
+                "2 forward; 2 backward": [[0.0, 0.01], [0.01, 0.0]],
+            },
+        )
+
+        for feature in compact_geojson["features"]:
+            if feature["geometry"]["type"] == "Point":
+                for coord in feature["geometry"]["coordinates"]:
+                    self.assertEqual(coord, round(coord, 3))
+
+
+class TestValidationLog(TestCase):
+    """Test ValidationLogWriter and read_validation_log()"""
+
+    records = [
+        {"name": "City 1", "errors": [], "warnings": ["Warning"]},
+        {"name": "Город 2", "errors": ["Error"], "warnings": []},
+    ]
+
+    def test__validation_log__formats(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for filename in (
+                "log.json",
+                "log.json.gz",
+                "log.jsonl",
+                "log.jsonl.gz",
+            ):
+                with self.subTest(msg=filename):
+                    path = os.path.join(tmp_dir, filename)
+                    writer = ValidationLogWriter(path)
+                    for record in self.records:
+                        writer.write(record)
+                    writer.close()
+                    self.assertListEqual(
+                        list(read_validation_log(path)), self.records
+                    )
+
+    def test__validation_log__interrupted_jsonl(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "log.jsonl")
+            writer = ValidationLogWriter(path)
+            writer.write(self.records[0])
+            # The first record is available before the writer is closed
+            self.assertListEqual(
+                list(read_validation_log(path)), self.records[:1]
+            )
+            writer.f.write('{"name": "Broken')
+            writer.close()
+
+            with self.assertLogs(level="WARNING"):
+                self.assertListEqual(
+                    list(read_validation_log(path)), self.records[:1]
+                )
+
+
+def elements_to_xml_lines(elements: list[dict]) -> list[str]:
+    lines = []
+    for el_type in ("node", "way", "relation"):
+        for el in (el for el in elements if el["type"] == el_type):
+            attrs = 'id="{}"'.format(el["id"])
+            if "lat" in el:
+                attrs += ' lat="{!r}" lon="{!r}"'.format(el["lat"], el["lon"])
+            lines.append(f"<{el_type} {attrs}>")
+            for k, v in el.get("tags", {}).items():
+                lines.append(f"<tag k={quoteattr(k)} v={quoteattr(v)}/>")
+            for n in el.get("nodes", []):
+                lines.append(f'<nd ref="{n}"/>')
+            for m in el.get("members", []):
+                lines.append(
+                    '<member type="{}" ref="{}" role={}/>'.format(
+                        m["type"], m["ref"], quoteattr(m["role"])
+                    )
+                )
+            lines.append(f"</{el_type}>")
+    return lines
+
+
+def elements_to_xml(elements: list[dict]) -> str:
+    return "\n".join(
+        ["<?xml version='1.0' encoding='UTF-8'?>", "<osm version='0.6'>"]
+        + elements_to_xml_lines(elements)
+        + ["</osm>"]
+    )
+
+
+class TestLoadXml(TestCase):
+    """Test subways.subway_io.load_xml function"""
+
+    def test__load_xml__filter_elements(self) -> None:
+        xml_path = Path(__file__).parent / "assets" / "tiny_world.osm"
+        expected_elements = load_xml(str(xml_path))
+        xml = elements_to_xml(expected_elements + IRRELEVANT_ELEMENTS)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "unfiltered.osm")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(xml)
+            self.assertEqual(
+                len(load_xml(path)),
+                len(expected_elements) + len(IRRELEVANT_ELEMENTS),
+            )
+            self.assertListEqual(
+                load_xml(path, filter_elements=True), expected_elements
+            )
+
+        # A file object is rewound for each pass
+        f = io.BytesIO(xml.encode("utf-8"))
+        self.assertListEqual(
+            load_xml(f, filter_elements=True), expected_elements
+        )
+
+
+class TestApplyOsmChange(TestCase):
+    """Test subways.subway_io.apply_osm_change function"""
+
+    def test__apply_osm_change(self) -> None:
+        xml_path = Path(__file__).parent / "assets" / "tiny_world.osm"
+        elements = load_xml(str(xml_path))
+        station_1 = next(el for el in elements if el["id"] == 1)
+        way_4 = next(
+            el for el in elements if el["type"] == "way" and el["id"] == 4
+        )
+        created = [
+            {
+                "type": "node",
+                "id": 300,
+                "lat": 0.5,
+                "lon": 0.5,
+                "tags": {"railway": "station", "station": "subway"},
+            },
+            {"type": "node", "id": 301, "lat": 0.6, "lon": 0.6},
+            {"type": "node", "id": 302, "lat": 0.7, "lon": 0.7},
+            {
+                "type": "relation",
+                "id": 900,
+                "tags": {"type": "route", "route": "bus"},
+                "members": [{"type": "node", "ref": 302, "role": ""}],
+            },
+        ]
+        modified = [
+            {**station_1, "lat": station_1["lat"] + 0.001},
+            {**way_4, "nodes": way_4["nodes"] + [301]},
+        ]
+        deleted = [{"type": "node", "id": 205}]
+        osc = "\n".join(
+            ["<?xml version='1.0' encoding='UTF-8'?>", "<osmChange>"]
+            + ["<create>"]
+            + elements_to_xml_lines(created)
+            + ["</create>", "<modify>"]
+            + elements_to_xml_lines(modified)
+            + ["</modify>", "<delete>"]
+            + elements_to_xml_lines(deleted)
+            + ["</delete>", "</osmChange>"]
+        )
+
+        # Expected result is the updated full data filtered from scratch
+        changed_keys = {(el["type"], el["id"]) for el in modified + deleted}
+        full_data = (
+            [
+                el
+                for el in elements
+                if (el["type"], el["id"]) not in changed_keys
+            ]
+            + created
+            + modified
+        )
+        expected_elements = load_xml(
+            io.BytesIO(elements_to_xml(full_data).encode("utf-8")),
+            filter_elements=True,
+        )
+        calculate_centers(expected_elements)
+
+        calculate_centers(elements)
+        locations = apply_osm_change(elements, io.BytesIO(osc.encode("utf-8")))
+
+        key = lambda el: (el["type"], el["id"])  # noqa E731
+        self.assertListEqual(
+            sorted(elements, key=key), sorted(expected_elements, key=key)
+        )
+        self.assertIn((station_1["lon"], station_1["lat"]), locations)
+        self.assertIn((station_1["lon"], station_1["lat"] + 0.001), locations)
+        self.assertNotIn((0.7, 0.7), locations)
+
+
+class TestRecoveryData(CitiesTestCase):
+    """Test recovery data reading, indexing and usage"""
+
+    def test__recovery_data__resort_stops(self) -> None:
+        cities, _ = self.prepare_cities(metro_samples[0])
+        city = next(
+            c for c in cities if c.name == "Intersecting 2 metro lines"
+        )
+        route = next(iter(next(iter(city))))
+        # Tell the route from the opposite one with the same stations
+        route.element["tags"]["from"] = route.stops[0].stoparea.station.name
+        other_city_data = {'["red", "1"]': []}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # A legacy file with all cities is converted to a directory
+            path = os.path.join(tmp_dir, "recovery.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"Other city": other_city_data}, f)
+            write_recovery_data(path, [city])
+            self.assertTrue(os.path.isdir(path))
+
+            recovery_data = read_recovery_data(
+                path, [city.name, "Other city", "Missing city"]
+            )
+            self.assertCountEqual(recovery_data, [city.name, "Other city"])
+            self.assertEqual(recovery_data["Other city"], other_city_data)
+            self.assertDictEqual(
+                read_recovery_data(path, [city.name]),
+                {city.name: recovery_data[city.name]},
+            )
+
+        city.recovery_data = index_recovery_data(recovery_data[city.name])
+        self.assertIn((route.colour, route.ref), city.recovery_data)
+
+        stops = list(route.stops)
+        route.stops = stops[::-1]
+        self.assertTrue(route.try_resort_stops())
+        self.assertListEqual(route.stops, stops)
+
+        city.recovery_data = index_recovery_data(None)
+        self.assertFalse(route.try_resort_stops())
+
+
+class TestCityShards(TestCase):
+    """Test subways.subway_io.CityShards class"""
+
+    def test__city_shards(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache")
+            shards = CityShards(path)
+            self.assertIsNone(shards.read("Москва"))
+
+            city_names = ["Москва", "A/B", "..", ""]
+            for i, city_name in enumerate(city_names):
+                self.assertTrue(shards.write(city_name, {"i": i}))
+            self.assertFalse(shards.write("A/B", {"i": 1}))
+            self.assertEqual(len(os.listdir(path)), len(city_names))
+
+            shards = CityShards(path)
+            for i, city_name in enumerate(city_names):
+                self.assertEqual(shards.read(city_name), {"i": i})
+
+            # A broken file affects only its city
+            with open(os.path.join(path, "A%2FB.json"), "w") as f:
+                f.write('{"i": ')
+            with self.assertLogs(level="WARNING"):
+                self.assertIsNone(shards.read("A/B"))
+            self.assertEqual(shards.read("Москва"), {"i": 0})
+
+
+class TestCityDumper(CitiesTestCase):
+    """Test subways.subway_io.CityDumper class"""
+
+    def test__city_dumper__workers(self) -> None:
+        cities, _ = self.prepare_cities(metro_samples[0])
+        city_to_str = functools.partial(city_to_geojson, compact=True)
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                with CityDumper(cities, workers) as city_dumper:
+                    # The same processes serve several dumps
+                    self.assertListEqual(
+                        list(city_dumper.dump(city_to_yaml)),
+                        [city_to_yaml(city) for city in cities],
+                    )
+                    self.assertListEqual(
+                        list(city_dumper.dump(city_to_str)),
+                        [city_to_str(city) for city in cities],
+                    )
@@ -0,0 +1,104 @@
+import copy
+
+from subways.processors._common import transit_to_dict
+from subways.processors.tiles import (
+    lonlat_to_tile_xy,
+    make_network_tiles,
+    split_line_by_tiles,
+)
+from subways.tests.sample_data_for_outputs import metro_samples
+from subways.tests.util import TestCase
+
+
+class TestTilesProcessor(TestCase):
+    """Test processors/tiles.py"""
+
+    def test__lonlat_to_tile_xy(self) -> None:
+        self.assertTupleEqual(lonlat_to_tile_xy((0.0, 0.0), 1), (1.0, 1.0))
+        x, y = lonlat_to_tile_xy((-180.0, 85.0511287798), 10)
+        self.assertAlmostEqual(x, 0)
+        self.assertAlmostEqual(y, 0)
+
+    def test__split_line_by_tiles(self) -> None:
+        # At zoom 1 there are 4 tiles with borders along the equator
+        # and the prime meridian
+        line = [(-10.0, 10.0), (-5.0, 10.0), (5.0, 10.0), (5.0, -10.0)]
+        self.assertDictEqual(
+            split_line_by_tiles(line, 1),
+            {
+                (0, 0): [[(-10.0, 10.0), (-5.0, 10.0), (5.0, 10.0)]],
+                (1, 0): [[(-5.0, 10.0), (5.0, 10.0), (5.0, -10.0)]],
+                (1, 1): [[(5.0, 10.0), (5.0, -10.0)]],
+            },
+        )
+
+    def test__make_network_tiles(self) -> None:
+        cities, transfers = self.prepare_cities(metro_samples[0])
+        transit_data = transit_to_dict(cities, transfers)
+        network = transit_data["networks"]["Intersecting 2 metro lines"]
+
+        index, tiles = make_network_tiles(network, transit_data, 12, 16)
+
+        self.assertListEqual(index["bbox"], [0.0, 0.0, 0.01012, 0.01])
+        self.assertSetEqual(
+            set(tiles),
+            {
+                (zoom, x, y)
+                for zoom, xy_list in index["tiles"].items()
+                for x, y in xy_list
+            },
+        )
+        for zoom in range(12, 17):
+            with self.subTest(msg=f"{zoom=}"):
+                features = [
+                    feature
+                    for (z, _, _), tile in tiles.items()
+                    if z == zoom
+                    for feature in tile["features"]
+                ]
+                # Each station is put into exactly one tile
+                self.assertEqual(
+                    sum(f["geometry"]["type"] == "Point" for f in features),
+                    6,
+                )
+                # Forward and backward variants make one line
+                self.assertSetEqual(
+                    {
+                        f["properties"]["ref"]
+                        for f in features
+                        if f["geometry"]["type"] != "Point"
+                    },
+                    {"1", "2"},
+                )
+
+    def test__make_network_tiles__same_colour_and_tracks(self) -> None:
+        """Test that lines with different refs are kept apart even if
+        they have the same colour and tracks.
+        """
+        cities, transfers = self.prepare_cities(metro_samples[0])
+        transit_data = transit_to_dict(cities, transfers)
+        network = copy.deepcopy(
+            transit_data["networks"]["Intersecting 2 metro lines"]
+        )
+        route1, route2 = network["routes"]
+        route2["colour"] = route1["colour"]
+        for itinerary1, itinerary2 in zip(
+            route1["itineraries"], route2["itineraries"]
+        ):
+            itinerary2["tracks"] = itinerary1["tracks"]
+
+        _, tiles = make_network_tiles(network, transit_data, 12, 12)
+
+        lines = [
+            feature["properties"]
+            for tile in tiles.values()
+            for feature in tile["features"]
+            if feature["geometry"]["type"] != "Point"
+        ]
+        self.assertSetEqual(
+            {(line["ref"], line["stroke"]) for line in lines},
+            {
+                (route1["ref"], route1["colour"]),
+                (route2["ref"], route1["colour"]),
+            },
+        )
@@ -1,8 +1,10 @@
-from typing import TypeAlias
+from collections.abc import MutableMapping
+from typing import Any, TypeAlias
 
 
-OsmElementT: TypeAlias = dict
-IdT: TypeAlias = str  # Type of feature ids
+# A dict from Overpass JSON or an OsmElement
+OsmElementT: TypeAlias = MutableMapping[str, Any]
+IdT: TypeAlias = int  # Packed element ids, see subways.osm_element
 TransferT: TypeAlias = set[IdT]  # A transfer is a set of StopArea IDs
 TransfersT: TypeAlias = list[TransferT]
 LonLat: TypeAlias = tuple[float, float]
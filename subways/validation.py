@@ -1,8 +1,9 @@
 import csv
 import logging
+from collections.abc import Callable
 from functools import partial
 
-from subways.http_utils import urlopen_or_raise
+from subways.http_utils import read_url
 from subways.structure.city import City
 from subways.types import CriticalValidationError, LonLat, OsmElementT
 
@@ -11,6 +12,7 @@ DEFAULT_CITIES_INFO_URL = (
     "https://docs.google.com/spreadsheets/d/"
     f"{DEFAULT_SPREADSHEET_ID}/export?format=csv"
 )
+CITIES_INFO_CACHE_TTL = 3600  # seconds
 BAD_MARK = "[bad]"
 
 
@@ -171,8 +173,14 @@ def add_osm_elements_to_cities(
                 c.add(el)
 
 
-def validate_cities(cities: list[City]) -> list[City]:
-    """Validate cities. Return list of good cities."""
+def validate_cities(
+    cities: list[City],
+    on_city_validated: Callable[[City], None] | None = None,
+) -> list[City]:
+    """Validate cities. Return list of good cities.
+    :param on_city_validated: function to call with each city as soon as
+        the city validation is finished, e.g. to log the result
+    """
     good_cities = []
     for c in cities:
         try:
@@ -196,13 +204,20 @@ def validate_cities(cities: list[City]) -> list[City]:
             if c.is_good:
                 c.calculate_distances()
                 good_cities.append(c)
+        if on_city_validated:
+            on_city_validated(c)
 
     return good_cities
 
 
 def get_cities_info(
     cities_info_urls: list[str] | None = None,
+    cache_dir: str | None = None,
+    cache_ttl: float = CITIES_INFO_CACHE_TTL,
 ) -> list[dict]:
+    """Read reference information about cities from CSV files.
+    With cache_dir, downloaded files are cached, see read_url().
+    """
     if cities_info_urls is None:
         cities_info_urls = [DEFAULT_CITIES_INFO_URL]
 
@@ -214,11 +229,12 @@ def get_cities_info(
     id_by_name: dict[str, str] = {}
 
     for cities_info_url in cities_info_urls:
-        with urlopen_or_raise(
+        data = read_url(
             cities_info_url,
+            cache_dir=cache_dir,
+            ttl=cache_ttl,
             error_prefix="Failed to download cities spreadsheet",
-        ) as response:
-            data = response.read().decode("utf-8")
+        ).decode("utf-8")
         reader = csv.DictReader(
             data.splitlines(),
             fieldnames=(
@@ -268,9 +284,11 @@ def get_cities_info(
 
 
 def prepare_cities(
-    cities_info_urls: list[str] | None = None, overground: bool = False
+    cities_info_urls: list[str] | None = None,
+    overground: bool = False,
+    cities_info_cache: str | None = None,
 ) -> list[City]:
     if overground:
         raise NotImplementedError("Overground transit not implemented yet")
-    cities_info = get_cities_info(cities_info_urls)
+    cities_info = get_cities_info(cities_info_urls, cities_info_cache)
     return list(map(partial(City, overground=overground), cities_info))
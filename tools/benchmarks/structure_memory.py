@@ -0,0 +1,271 @@
+r"""Measure memory taken by validated city structures (stations, stop areas,
+routes and route stops) built for a synthetic city of a given size.
+
+Run from the repository root:
+    PYTHONPATH=. python tools/benchmarks/structure_memory.py --lines 100
+
+Figures can be saved with --output and compared with those of another
+revision with --baseline. The script runs against the subways package found
+in PYTHONPATH, e.g. a revision checked out with git worktree:
+    git worktree add /tmp/subways-before <revision>
+    PYTHONPATH=/tmp/subways-before python \
+        tools/benchmarks/structure_memory.py --output before.json
+    PYTHONPATH=. python tools/benchmarks/structure_memory.py \
+        --baseline before.json
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from collections import Counter
+
+from subways.osm_element import OsmElement
+from subways.structure.city import City
+from subways.validation import (
+    add_osm_elements_to_cities,
+    calculate_centers,
+    validate_cities,
+)
+
+
+STATION_SPACING = 0.01  # degrees
+TRACK_NODES_BETWEEN_STATIONS = 4
+
+
+def make_synthetic_city(
+    lines: int, stations: int
+) -> tuple[dict, list[OsmElement]]:
+    """Make city info and OSM elements of a city with parallel lines,
+    each station having a stop_area with a stop position, a platform
+    and two entrances.
+    """
+    elements = []
+    ids = Counter()
+
+    def add(el_type: str, **fields) -> OsmElement:
+        ids[el_type] += 1
+        elements.append(
+            OsmElement.from_dict(
+                {"type": el_type, "id": ids[el_type]} | fields
+            )
+        )
+        return elements[-1]
+
+    def node(lon: float, lat: float, **tags: str) -> OsmElement:
+        return add(
+            "node", lon=lon, lat=lat, **({"tags": tags} if tags else {})
+        )
+
+    def member(el: OsmElement, role: str = "") -> dict:
+        return {"type": el["type"], "ref": el["id"], "role": role}
+
+    for line in range(lines):
+        lat = line * STATION_SPACING
+        stop_positions = []
+        platforms = []
+        for i in range(stations):
+            lon = i * STATION_SPACING
+            name = f"Station {line}-{i}"
+            station = node(
+                lon, lat, railway="station", station="subway", name=name
+            )
+            stop = node(
+                lon, lat, railway="stop", public_transport="stop_position"
+            )
+            platform = add(
+                "way",
+                tags={"railway": "platform", "public_transport": "platform"},
+                nodes=[
+                    node(lon - 0.001, lat + 0.0002)["id"],
+                    node(lon + 0.001, lat + 0.0002)["id"],
+                ],
+            )
+            entrances = [
+                node(lon + dx, lat + 0.001, railway="subway_entrance")
+                for dx in (-0.001, 0.001)
+            ]
+            add(
+                "relation",
+                tags={
+                    "type": "public_transport",
+                    "public_transport": "stop_area",
+                    "name": name,
+                },
+                members=[
+                    member(el) for el in [station, stop, platform, *entrances]
+                ],
+            )
+            stop_positions.append(stop)
+            platforms.append(platform)
+
+        tracks = []
+        for i in range(stations - 1):
+            lon = i * STATION_SPACING
+            middle_nodes = [
+                node(
+                    lon + STATION_SPACING * k / TRACK_NODES_BETWEEN_STATIONS,
+                    lat,
+                )
+                for k in range(1, TRACK_NODES_BETWEEN_STATIONS)
+            ]
+            tracks.append(
+                add(
+                    "way",
+                    tags={"railway": "subway"},
+                    nodes=[
+                        stop_positions[i]["id"],
+                        *(n["id"] for n in middle_nodes),
+                        stop_positions[i + 1]["id"],
+                    ],
+                )
+            )
+
+        routes = []
+        for direction in (1, -1):
+            stops = list(zip(stop_positions, platforms))[::direction]
+            routes.append(
+                add(
+                    "relation",
+                    tags={
+                        "type": "route",
+                        "route": "subway",
+                        "ref": str(line),
+                        "name": f"Line {line}",
+                        "colour": "red",
+                    },
+                    members=[
+                        member(el, role)
+                        for stop, platform in stops
+                        for el, role in (
+                            (stop, "stop"),
+                            (platform, "platform"),
+                        )
+                    ]
+                    + [member(track) for track in tracks[::direction]],
+                )
+            )
+        add(
+            "relation",
+            tags={"type": "route_master", "route_master": "subway"},
+            members=[member(route) for route in routes],
+        )
+
+    city_info = {
+        "id": 1,
+        "name": "Synthetic",
+        "country": "World",
+        "continent": "Africa",
+        "bbox": "-1,-1,{},{}".format(
+            lines * STATION_SPACING + 1, stations * STATION_SPACING + 1
+        ),
+        "networks": "",
+        "num_stations": str(lines * stations),
+        "num_lines": str(lines),
+        "num_light_lines": "0",
+        "num_interchanges": "0",
+    }
+    return city_info, elements
+
+
+def instance_size(obj: object) -> int:
+    """Size of an object with its attribute dict, if any."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def print_figures(figures: dict, baseline: dict | None) -> None:
+    """Print figures, next to the baseline ones if given."""
+
+    def rows(figures: dict) -> list[tuple[str, str]]:
+        return [
+            ("OSM elements", str(figures["elements"])),
+            (
+                "City structures, MiB",
+                f"{figures['structures_memory'] / 2**20:.1f}",
+            ),
+        ] + [
+            (f"{name}, bytes each", str(size))
+            for name, size in figures["instance_sizes"].items()
+        ]
+
+    if not baseline:
+        for title, value in rows(figures):
+            print(f"{title:24} {value:>10}")
+        return
+    baseline_values = dict(rows(baseline))
+    print(f"{'':24} {'baseline':>10} {'current':>10}")
+    for title, value in rows(figures):
+        print(f"{title:24} {baseline_values.get(title, '-'):>10} {value:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--lines", type=int, default=100)
+    parser.add_argument("--stations", type=int, default=30, help="per line")
+    parser.add_argument("--output", help="JSON file to save the figures to")
+    parser.add_argument(
+        "--baseline",
+        help="JSON file with figures of another run to compare with",
+    )
+    options = parser.parse_args()
+
+    city_info, elements = make_synthetic_city(options.lines, options.stations)
+    calculate_centers(elements)
+
+    gc.collect()
+    tracemalloc.start()
+    city = City(city_info)
+    add_osm_elements_to_cities(elements, [city])
+    validate_cities([city])
+    gc.collect()
+    structures_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    if not city.is_good:
+        sys.exit("The synthetic city is invalid: {}".format(city.errors[:5]))
+
+    stopareas = list(city.stopareas())
+    routes = [route for route_master in city for route in route_master]
+    route_stops = [route_stop for route in routes for route_stop in route]
+    figures = {
+        "lines": options.lines,
+        "stations": options.stations,
+        "elements": len(elements),
+        "structures_memory": structures_memory,
+        # Sizes of instances without their attribute values
+        "instance_sizes": {
+            name: instance_size(objects[0])
+            for name, objects in (
+                ("Station", [stoparea.station for stoparea in stopareas]),
+                ("StopArea", stopareas),
+                ("Route", routes),
+                ("RouteStop", route_stops),
+            )
+        },
+    }
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline["lines"], baseline["stations"]) != (
+            options.lines,
+            options.stations,
+        ):
+            sys.exit("The baseline was measured for a city of another size")
+    print_figures(figures, baseline)
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(figures, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import functools
-import logging
+import hashlib
+import json
 import math
+from collections import Counter
 
 
 """A coordinate of a station precision of which we must take into account
@@ -9,151 +11,142 @@ Taking machine epsilon 1e-15, averaging 10 numbers with close magnitudes
 ensures relative precision of 1e-14."""
 coord_isclose = functools.partial(math.isclose, rel_tol=1e-14)
 
+"""Floats are rounded to this number of significant digits before hashing,
+so that numbers differing only in the last bits get the same hash.
+Numbers with equal rounded values are also equal by coord_isclose()."""
+FLOAT_SIGNIFICANT_DIGITS = 15
 
-def coords_eq(lon1, lat1, lon2, lat2):
-    return coord_isclose(lon1, lon2) and coord_isclose(lat1, lat2)
+# Lists in which the order of items doesn't matter
+MULTISET_KEYS = frozenset({"itineraries", "entrances", "exits", "transfers"})
 
+# Keys to compare routes. 'name' key is omitted since RouteMaster
+# can get its name from one of its Routes unpredictably.
+ROUTE_KEYS = ("type", "ref", "colour", "route_id", "itineraries")
 
-def osm_id_comparator(el):
-    """This function is used as key for sorting lists of
-    OSM-originated objects
+
+def canonicalize(obj):
+    """Make a copy of a json-like object with floats rounded to
+    FLOAT_SIGNIFICANT_DIGITS and tuples converted to lists.
     """
-    return (el["osm_type"], el["osm_id"])
-
-
-def itinerary_comparator(itinerary):
-    """This function is used as key for sorting itineraries in a route"""
-    return (itinerary["stops"], itinerary["interval"])
-
-
-def compare_stops(stop0, stop1):
-    """Compares json of two stops in route"""
-    stop_keys = ("name", "int_name", "id", "osm_id", "osm_type")
-    stop0_props = tuple(stop0[k] for k in stop_keys)
-    stop1_props = tuple(stop1[k] for k in stop_keys)
-
-    if stop0_props != stop1_props:
-        logging.debug(
-            "Different stops properties: %s, %s", stop0_props, stop1_props
-        )
-        return False
-
-    if not coords_eq(stop0["lon"], stop0["lat"], stop1["lon"], stop1["lat"]):
-        logging.debug(
-            "Different stops coordinates: %s (%f, %f), %s (%f, %f)",
-            stop0_props,
-            stop0["lon"],
-            stop0["lat"],
-            stop1_props,
-            stop1["lon"],
-            stop1["lat"],
-        )
-        return False
-
-    entrances0 = sorted(stop0["entrances"], key=osm_id_comparator)
-    entrances1 = sorted(stop1["entrances"], key=osm_id_comparator)
-    if entrances0 != entrances1:
-        logging.debug("Different stop entrances")
-        return False
-
-    exits0 = sorted(stop0["exits"], key=osm_id_comparator)
-    exits1 = sorted(stop1["exits"], key=osm_id_comparator)
-    if exits0 != exits1:
-        logging.debug("Different stop exits")
-        return False
-
-    return True
-
-
-def compare_transfers(transfers0, transfers1):
-    """Compares two arrays of transfers of the form
+    if isinstance(obj, float):
+        return float(f"{obj:.{FLOAT_SIGNIFICANT_DIGITS - 1}e}")
+    if isinstance(obj, dict):
+        return {k: canonicalize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonicalize(v) for v in obj]
+    return obj
+
+
+def object_hash(obj):
+    """Stable hash of a canonicalized json-like object"""
+    dump = json.dumps(
+        obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha1(dump.encode("utf-8")).hexdigest()
+
+
+def canonicalize_network(network):
+    """Canonical form of a network with routes keyed by route_id"""
+    return {
+        "agency_id": network["agency_id"],
+        "routes": {
+            route["route_id"]: canonicalize({k: route[k] for k in ROUTE_KEYS})
+            for route in network["routes"]
+        },
+    }
+
+
+def canonicalize_transfers(transfers):
+    """Canonical form of an array of transfers of the form
     [(stop1_uid, stop2_uid, time), ...]
     """
-    if len(transfers0) != len(transfers1):
-        logging.debug(
-            "Different len(transfers): %d != %d",
-            len(transfers0),
-            len(transfers1),
-        )
-        return False
-
-    transfers0 = [
-        tuple([t[0], t[1], t[2]]) if t[0] < t[1] else tuple([t[1], t[0], t[2]])
-        for t in transfers0
-    ]
-    transfers1 = [
-        tuple([t[0], t[1], t[2]]) if t[0] < t[1] else tuple([t[1], t[0], t[2]])
-        for t in transfers1
+    return sorted([min(t[0], t[1]), max(t[0], t[1]), t[2]] for t in transfers)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def diff_multisets(items0, items1, path):
+    """Return differences between two lists with no meaningful order"""
+    counter0 = Counter(map(object_hash, items0))
+    counter1 = Counter(map(object_hash, items1))
+    if counter0 == counter1:
+        return []
+    only0 = counter0 - counter1
+    only1 = counter1 - counter0
+
+    def leftover(items, only):
+        result = []
+        for item in items:
+            h = object_hash(item)
+            if only[h]:
+                only[h] -= 1
+                result.append(item)
+        return sorted(result, key=lambda x: json.dumps(x, sort_keys=True))
+
+    left0 = leftover(items0, only0)
+    left1 = leftover(items1, only1)
+    if len(left0) == len(left1):
+        # Most likely the same items with some properties changed
+        diffs = []
+        for i, (item0, item1) in enumerate(zip(left0, left1)):
+            diffs.extend(diff_values(item0, item1, f"{path}[~{i}]"))
+        return diffs
+    return [f"{path}: only in the first: {x}" for x in left0] + [
+        f"{path}: only in the second: {x}" for x in left1
     ]
 
-    transfers0.sort()
-    transfers1.sort()
 
-    diff_cnt = 0
-    for tr0, tr1 in zip(transfers0, transfers1):
-        if tr0 != tr1:
-            if diff_cnt == 0:
-                logging.debug(
-                    "First pair of different transfers: %s, %s", tr0, tr1
-                )
-            diff_cnt += 1
-    if diff_cnt:
-        logging.debug("Different transfers number = %d", diff_cnt)
-        return False
-
-    return True
-
-
-def compare_networks(network0, network1):
-    if network0["agency_id"] != network1["agency_id"]:
-        logging.debug("Different agency_id at route '%s'", network0["network"])
-        return False
-
-    route_ids0 = sorted(x["route_id"] for x in network0["routes"])
-    route_ids1 = sorted(x["route_id"] for x in network1["routes"])
-
-    if route_ids0 != route_ids1:
-        logging.debug("Different route_ids: %s != %s", route_ids0, route_ids1)
-        return False
-
-    routes0 = sorted(network0["routes"], key=lambda x: x["route_id"])
-    routes1 = sorted(network1["routes"], key=lambda x: x["route_id"])
-
-    # Keys to compare routes. 'name' key is omitted since RouteMaster
-    # can get its name from one of its Routes unpredictably.
-    route_keys = ("type", "ref", "colour", "route_id")
-
-    for route0, route1 in zip(routes0, routes1):
-        route0_props = tuple(route0[k] for k in route_keys)
-        route1_props = tuple(route1[k] for k in route_keys)
-        if route0_props != route1_props:
-            logging.debug(
-                "Route props of '%s' are different: %s, %s",
-                route0["route_id"],
-                route0_props,
-                route1_props,
-            )
-            return False
-
-        itineraries0 = sorted(route0["itineraries"], key=itinerary_comparator)
-        itineraries1 = sorted(route1["itineraries"], key=itinerary_comparator)
-
-        for itin0, itin1 in zip(itineraries0, itineraries1):
-            if itin0["interval"] != itin1["interval"]:
-                logging.debug(
-                    "Different interval: %d != %d at route %s '%s'",
-                    itin0["interval"],
-                    itin1["interval"],
-                    route0["route_id"],
-                    route0["name"],
-                )
-                return False
-            if itin0["stops"] != itin1["stops"]:
-                logging.debug(
-                    "Different stops at route %s '%s'",
-                    route0["route_id"],
-                    route0["name"],
+def diff_values(value0, value1, path):
+    """Return differences between two json-like values. Floats are
+    compared with tolerance, lists under MULTISET_KEYS as multisets.
+    """
+    if _is_number(value0) and _is_number(value1):
+        if isinstance(value0, float) or isinstance(value1, float):
+            equal = coord_isclose(value0, value1)
+        else:
+            equal = value0 == value1
+        return [] if equal else [f"{path}: {value0!r} != {value1!r}"]
+
+    if isinstance(value0, dict) and isinstance(value1, dict):
+        diffs = []
+        for key in sorted(value0.keys() | value1.keys(), key=str):
+            key_path = f"{path}.{key}" if path else str(key)
+            if key not in value1:
+                diffs.append(f"{key_path}: only in the first")
+            elif key not in value0:
+                diffs.append(f"{key_path}: only in the second")
+            elif key in MULTISET_KEYS:
+                diffs.extend(
+                    diff_multisets(value0[key], value1[key], key_path)
                 )
-                return False
+            else:
+                diffs.extend(diff_values(value0[key], value1[key], key_path))
+        return diffs
 
-    return True
+    if isinstance(value0, list) and isinstance(value1, list):
+        diffs = []
+        if len(value0) != len(value1):
+            diffs.append(f"{path}: length {len(value0)} != {len(value1)}")
+        for i, (item0, item1) in enumerate(zip(value0, value1)):
+            diffs.extend(diff_values(item0, item1, f"{path}[{i}]"))
+        return diffs
+
+    return [] if value0 == value1 else [f"{path}: {value0!r} != {value1!r}"]
+
+
+def diff_collections(items0, items1, path):
+    """Return differences between two dicts of canonicalized objects.
+    Objects with equal hashes are not inspected further.
+    """
+    diffs = []
+    for key in sorted(items0.keys() | items1.keys(), key=str):
+        key_path = f"{path}[{key}]"
+        if key not in items1:
+            diffs.append(f"{key_path}: only in the first")
+        elif key not in items0:
+            diffs.append(f"{key_path}: only in the second")
+        elif object_hash(items0[key]) != object_hash(items1[key]):
+            diffs.extend(diff_values(items0[key], items1[key], key_path))
+    return diffs
@@ -4,63 +4,95 @@
    Due to unordered nature of sets/dicts, two runs of process_subways.py
    even on the same input generate equivalent jsons,
    which cannot be compared with 'diff' command. The compare_jsons() function
-   compares two city_cache.json taking into account possible shuffling of
+   compares two city caches taking into account possible shuffling of
    dict items and items of some lists, as well as system-specific subtleties.
+   Objects are canonicalized and hashed first, so that equal stops, routes
+   and networks are skipped quickly, and all found differences are logged.
    This utility is useful to ensure that code improvements which must not
    affect the process_subways.py output really doesn't change it.
+
+   A city cache is a directory with a json file per city, or a legacy
+   json file with all cities. Run with the repository root in PYTHONPATH.
 """
 
-import json
 import logging
 import sys
 
-from common import compare_networks, compare_stops, compare_transfers
+from subways.subway_io import CityShards
+
+from common import (
+    canonicalize,
+    canonicalize_network,
+    canonicalize_transfers,
+    diff_collections,
+    diff_values,
+)
+
+
+def load_cache(path):
+    """Read all cities of a city cache directory or legacy file"""
+    shards = CityShards(path)
+    return {name: shards.read(name) for name in shards.city_names()}
+
+
+def canonicalize_cache(cache):
+    """Canonical form of a city cache"""
+    return {
+        name: {
+            "network": canonicalize_network(city["network"]),
+            "stops": canonicalize(city["stops"]),
+            "transfers": canonicalize_transfers(city["transfers"]),
+        }
+        for name, city in cache.items()
+    }
+
+
+def diff_jsons(cache0, cache1):
+    """Return differences between two city caches"""
+    cache0 = canonicalize_cache(cache0)
+    cache1 = canonicalize_cache(cache1)
+    diffs = []
+    for name in sorted(cache0.keys() | cache1.keys()):
+        if name not in cache1:
+            diffs.append(f"[{name}]: only in the first")
+        elif name not in cache0:
+            diffs.append(f"[{name}]: only in the second")
+        else:
+            city0, city1 = cache0[name], cache1[name]
+            diffs.extend(
+                diff_values(
+                    {k: city0[k] for k in ("network", "transfers")},
+                    {k: city1[k] for k in ("network", "transfers")},
+                    f"[{name}]",
+                )
+            )
+            diffs.extend(
+                diff_collections(
+                    city0["stops"], city1["stops"], f"[{name}].stops"
+                )
+            )
+    return diffs
 
 
 def compare_jsons(cache0, cache1):
     """Compares two city caches"""
-
-    city_names0 = sorted(cache0.keys())
-    city_names1 = sorted(cache1.keys())
-    if city_names0 != city_names1:
-        logging.debug("Different list of city names!")
-        return False
-
-    for name in city_names0:
-        city0 = cache0[name]
-        city1 = cache1[name]
-        if not compare_networks(city0["network"], city1["network"]):
-            return False
-
-        stop_ids0 = sorted(city0["stops"].keys())
-        stop_ids1 = sorted(city1["stops"].keys())
-        if stop_ids0 != stop_ids1:
-            logging.debug("Different stop_ids")
-            return False
-        stops0 = [v for k, v in sorted(city0["stops"].items())]
-        stops1 = [v for k, v in sorted(city1["stops"].items())]
-        for stop0, stop1 in zip(stops0, stops1):
-            if not compare_stops(stop0, stop1):
-                return False
-
-        if not compare_transfers(city0["transfers"], city1["transfers"]):
-            return False
-
-    return True
+    return not diff_jsons(cache0, cache1)
 
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
-        print("Usage: {} <cache1.json> <cache2.json>".format(sys.argv[0]))
+        print("Usage: {} <cache1> <cache2>".format(sys.argv[0]))
         sys.exit()
 
     logging.basicConfig(level=logging.DEBUG)
 
     path0, path1 = sys.argv[1:3]
 
-    j0 = json.load(open(path0, encoding="utf-8"))
-    j1 = json.load(open(path1, encoding="utf-8"))
+    j0 = load_cache(path0)
+    j1 = load_cache(path1)
 
-    equal = compare_jsons(j0, j1)
+    diffs = diff_jsons(j0, j1)
+    for diff in diffs:
+        logging.debug(diff)
 
-    print("The city caches are {}equal".format("" if equal else "NOT "))
+    print("The city caches are {}equal".format("NOT " if diffs else ""))
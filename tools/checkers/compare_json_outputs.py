@@ -6,6 +6,8 @@
    which cannot be compared with 'diff' command. The compare_jsons() function
    compares two osm_subways.json taking into account possible shuffling of
    dict items and items of some lists, as well as system-specific subtleties.
+   Objects are canonicalized and hashed first, so that equal stops, routes
+   and networks are skipped quickly, and all found differences are logged.
    This utility is useful to ensure that code improvements which must not
    affect the process_subways.py output really doesn't change it.
 """
@@ -14,38 +16,47 @@ import json
 import logging
 import sys
 
-from common import compare_networks, compare_stops, compare_transfers
+from common import (
+    canonicalize,
+    canonicalize_network,
+    canonicalize_transfers,
+    diff_collections,
+    diff_multisets,
+)
+
+
+def canonicalize_result(result):
+    """Canonical form of process_subways.py output with networks and
+    stops keyed by their ids, so that they are compared regardless
+    of the order.
+    """
+    return {
+        "networks": {
+            x["network"]: canonicalize_network(x) for x in result["networks"]
+        },
+        "stops": {x["id"]: canonicalize(x) for x in result["stops"]},
+        "transfers": canonicalize_transfers(result["transfers"]),
+    }
+
+
+def diff_jsons(result0, result1):
+    """Return differences between two objects which are results
+    of subway generation
+    """
+    result0 = canonicalize_result(result0)
+    result1 = canonicalize_result(result1)
+    return (
+        diff_collections(result0["networks"], result1["networks"], "networks")
+        + diff_collections(result0["stops"], result1["stops"], "stops")
+        + diff_multisets(
+            result0["transfers"], result1["transfers"], "transfers"
+        )
+    )
 
 
 def compare_jsons(result0, result1):
     """Compares two objects which are results of subway generation"""
-
-    network_names0 = sorted([x["network"] for x in result0["networks"]])
-    network_names1 = sorted([x["network"] for x in result1["networks"]])
-    if network_names0 != network_names1:
-        logging.debug("Different list of network names!")
-        return False
-    networks0 = sorted(result0["networks"], key=lambda x: x["network"])
-    networks1 = sorted(result1["networks"], key=lambda x: x["network"])
-    for network0, network1 in zip(networks0, networks1):
-        if not compare_networks(network0, network1):
-            return False
-
-    stop_ids0 = sorted(x["id"] for x in result0["stops"])
-    stop_ids1 = sorted(x["id"] for x in result1["stops"])
-    if stop_ids0 != stop_ids1:
-        logging.debug("Different stop_ids")
-        return False
-    stops0 = sorted(result0["stops"], key=lambda x: x["id"])
-    stops1 = sorted(result1["stops"], key=lambda x: x["id"])
-    for stop0, stop1 in zip(stops0, stops1):
-        if not compare_stops(stop0, stop1):
-            return False
-
-    if not compare_transfers(result0["transfers"], result1["transfers"]):
-        return False
-
-    return True
+    return not diff_jsons(result0, result1)
 
 
 if __name__ == "__main__":
@@ -60,6 +71,8 @@ if __name__ == "__main__":
     j0 = json.load(open(path0, encoding="utf-8"))
     j1 = json.load(open(path1, encoding="utf-8"))
 
-    equal = compare_jsons(j0, j1)
+    diffs = diff_jsons(j0, j1)
+    for diff in diffs:
+        logging.debug(diff)
 
-    print("The results are {}equal".format("" if equal else "NOT "))
+    print("The results are {}equal".format("NOT " if diffs else ""))
@@ -0,0 +1,82 @@
+import copy
+import json
+import os
+import tempfile
+from unittest import TestCase
+from urllib.parse import quote
+
+from compare_city_caches import diff_jsons, load_cache
+from subways.subway_io import CityShards
+
+
+CITY_CACHE = {
+    "network": {
+        "network": "Line",
+        "agency_id": 1,
+        "routes": [
+            {
+                "type": "subway",
+                "ref": "1",
+                "name": "Line 1",
+                "colour": "ff0000",
+                "route_id": 2,
+                "itineraries": [{"stops": [[4, 0], [8, 60]], "interval": 150}],
+            }
+        ],
+    },
+    "stops": {
+        "r1": {
+            "name": "Станция",
+            "lat": 0.1,
+            "lon": 0.2,
+            "osm_type": "node",
+            "osm_id": 1,
+            "id": 4,
+            "entrances": [
+                {"osm_type": "node", "osm_id": 10, "distance": 60},
+                {"osm_type": "node", "osm_id": 11, "distance": 70},
+            ],
+            "exits": [],
+        }
+    },
+    "transfers": [[4, 8, 60]],
+}
+
+
+class TestCompareCityCaches(TestCase):
+    """Test comparison of city caches written by process_subways.py"""
+
+    def test__compare_city_caches__directories(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path0 = os.path.join(tmp_dir, "cache0")
+            path1 = os.path.join(tmp_dir, "cache1")
+            shards0, shards1 = CityShards(path0), CityShards(path1)
+            for name in ("Москва", "A/B"):
+                shards0.write(name, CITY_CACHE)
+            city = copy.deepcopy(CITY_CACHE)
+            city["stops"]["r1"]["entrances"].reverse()
+            shards1.write("Москва", city)
+            shards1.write("A/B", city)
+
+            cache0 = load_cache(path0)
+            self.assertCountEqual(cache0, ["Москва", "A/B"])
+            self.assertListEqual(diff_jsons(cache0, load_cache(path1)), [])
+
+            city["stops"]["r1"]["lat"] = 0.2
+            shards1.write("A/B", city)
+            os.remove(os.path.join(path1, quote("Москва") + ".json"))
+            self.assertListEqual(
+                diff_jsons(cache0, load_cache(path1)),
+                [
+                    "[A/B].stops[r1].lat: 0.1 != 0.2",
+                    "[Москва]: only in the first",
+                ],
+            )
+
+            # A legacy file with all cities
+            legacy_path = os.path.join(tmp_dir, "cache.json")
+            with open(legacy_path, "w", encoding="utf-8") as f:
+                json.dump(cache0, f)
+            self.assertListEqual(
+                diff_jsons(cache0, load_cache(legacy_path)), []
+            )
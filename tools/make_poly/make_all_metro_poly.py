@@ -1,38 +1,204 @@
 import argparse
+import sys
 
-from shapely import unary_union
+import numpy as np
+from shapely import transform, unary_union
 from shapely.geometry import MultiPolygon, Polygon
+from shapely.geometry.base import BaseGeometry
 
 from subways.validation import DEFAULT_CITIES_INFO_URL, get_cities_info
 
 
-def make_disjoint_metro_polygons(cities_info_urls: list[str]) -> None:
-    """Make disjoint polygon from cities bboxes and write them
-    in *.poly format to stdout.
+KM_PER_DEGREE = 111.32  # at the equator
+MIN_VERTICES = 5  # A rectangle with the first point repeated at the end
+SIMPLIFICATION_STEPS = 8  # Bisection steps to find simplification tolerance
+
+
+def count_vertices(multipolygon: MultiPolygon) -> int:
+    """Number of points written to a *.poly file."""
+    return sum(len(polygon.exterior.coords) for polygon in multipolygon.geoms)
+
+
+def area_km2(geometry: BaseGeometry) -> float:
+    """Approximate area of a geometry in lon/lat coordinates,
+    calculated in the sinusoidal equal-area projection.
     """
-    cities_info = get_cities_info(cities_info_urls)
-
-    polygons = []
-    for ci in cities_info:
-        bbox = tuple(map(float, ci["bbox"].split(",")))
-        polygon = Polygon(
-            [
-                (bbox[0], bbox[1]),
-                (bbox[0], bbox[3]),
-                (bbox[2], bbox[3]),
-                (bbox[2], bbox[1]),
-            ]
+
+    def to_sinusoidal(coords: np.ndarray) -> np.ndarray:
+        lon, lat = coords[:, 0], coords[:, 1]
+        return (
+            np.column_stack((lon * np.cos(np.radians(lat)), lat))
+            * KM_PER_DEGREE
         )
-        polygons.append(polygon)
 
-    union = unary_union(polygons)
+    return transform(geometry, to_sinusoidal).area
+
+
+def _to_multipolygon(geometry: BaseGeometry) -> MultiPolygon:
+    """Convert a geometry to a MultiPolygon with holes filled."""
+    polygons = (
+        [geometry] if geometry.geom_type == "Polygon" else geometry.geoms
+    )
+    return MultiPolygon([Polygon(p.exterior) for p in polygons])
+
+
+def _simplify(geometry: BaseGeometry, tolerance: float) -> BaseGeometry:
+    """Simplify a geometry so that it still covers the original one."""
+    simplified = geometry.simplify(tolerance).buffer(
+        tolerance, join_style="mitre"
+    )
+    if not simplified.covers(geometry):
+        simplified = simplified.union(geometry)
+    return simplified
+
+
+def make_metro_polygons(
+    bboxes: list[tuple[float, float, float, float]],
+    buffer: float = 0.0,
+    simplify: float = 0.0,
+    max_vertices: int | None = None,
+) -> MultiPolygon:
+    """Make disjoint polygons covering all bboxes.
+    :param bboxes: list of (min_lon, min_lat, max_lon, max_lat)
+    :param buffer: widen the union by this distance in degrees,
+        which merges boxes closer than 2 * buffer to each other
+    :param simplify: tolerance in degrees to simplify polygons with
+    :param max_vertices: if the polygons have more vertices, replace some
+        of them with their envelopes, then simplify with the least
+        sufficient tolerance, and finally take the common envelope
+    """
+    union = unary_union(
+        [
+            Polygon(
+                [
+                    (bbox[0], bbox[1]),
+                    (bbox[0], bbox[3]),
+                    (bbox[2], bbox[3]),
+                    (bbox[2], bbox[1]),
+                ]
+            )
+            for bbox in bboxes
+        ]
+    )
+    result = union
+    if buffer:
+        result = result.buffer(buffer, join_style="mitre")
+    if simplify:
+        result = _simplify(result, simplify)
+    multipolygon = _to_multipolygon(result)
+
+    if max_vertices is None or count_vertices(multipolygon) <= max_vertices:
+        return multipolygon
+
+    multipolygon = _fit_with_envelopes(multipolygon, max_vertices)
+    if count_vertices(multipolygon) <= max_vertices:
+        return multipolygon
+    return _fit_with_simplification(multipolygon, max_vertices)
+
+
+def _fit_with_envelopes(
+    multipolygon: MultiPolygon, max_vertices: int
+) -> MultiPolygon:
+    """Replace polygons with their envelopes, the ones adding the least
+    area per removed vertex first, until the vertex budget is met.
+    """
+    while True:
+        polygons = list(multipolygon.geoms)
+        vertex_count = count_vertices(multipolygon)
+        candidates = sorted(
+            (
+                (area_km2(p.envelope) - area_km2(p))
+                / (len(p.exterior.coords) - MIN_VERTICES),
+                i,
+            )
+            for i, p in enumerate(polygons)
+            if len(p.exterior.coords) > MIN_VERTICES
+        )
+        if not candidates:
+            return multipolygon
+        for _, i in candidates:
+            if vertex_count <= max_vertices:
+                break
+            vertex_count -= len(polygons[i].exterior.coords) - MIN_VERTICES
+            polygons[i] = polygons[i].envelope
+        # Envelopes may overlap other polygons
+        new_multipolygon = _to_multipolygon(unary_union(polygons))
+        if count_vertices(new_multipolygon) >= count_vertices(multipolygon):
+            return multipolygon
+        multipolygon = new_multipolygon
+        if count_vertices(multipolygon) <= max_vertices:
+            return multipolygon
+
+
+def _fit_with_simplification(
+    multipolygon: MultiPolygon, max_vertices: int
+) -> MultiPolygon:
+    """Simplify polygons with the least tolerance that meets
+    the vertex budget, or return the common envelope.
+    """
+
+    def simplify(tolerance: float) -> MultiPolygon | None:
+        result = _to_multipolygon(_simplify(multipolygon, tolerance))
+        return result if count_vertices(result) <= max_vertices else None
+
+    envelope = _to_multipolygon(multipolygon.envelope)
+    min_lon, min_lat, max_lon, max_lat = multipolygon.bounds
+    # Simplification with a greater tolerance can't be better
+    # than the envelope
+    max_tolerance = max(max_lon - min_lon, max_lat - min_lat) / 2
+
+    # Find a tolerance that is enough, then refine it by bisection
+    low, high = 0.0, 0.01
+    best = simplify(high)
+    while best is None and high < max_tolerance:
+        low, high = high, high * 2
+        best = simplify(high)
+    if best is None:
+        return envelope
+    for _ in range(SIMPLIFICATION_STEPS):
+        middle = (low + high) / 2
+        result = simplify(middle)
+        if result is None:
+            low = middle
+        else:
+            high, best = middle, result
+    return best if area_km2(best) < area_km2(envelope) else envelope
 
-    if union.geom_type == "Polygon":
-        union = MultiPolygon([union])
+
+def print_report(exact: MultiPolygon, result: MultiPolygon) -> None:
+    """Print to stderr how much the result differs from the exact union."""
+    exact_area = area_km2(exact)
+    result_area = area_km2(result)
+    overhead = (result_area / exact_area - 1) * 100 if exact_area else 0.0
+    print(
+        f"Polygons: {len(exact.geoms)} -> {len(result.geoms)}\n"
+        f"Vertices: {count_vertices(exact)} -> {count_vertices(result)}\n"
+        f"Area: {exact_area:.0f} -> {result_area:.0f} km2 "
+        f"(overhead {overhead:.1f}%)",
+        file=sys.stderr,
+    )
+
+
+def make_disjoint_metro_polygons(
+    cities_info_urls: list[str],
+    buffer: float = 0.0,
+    simplify: float = 0.0,
+    max_vertices: int | None = None,
+    report: bool = False,
+    cities_info_cache: str | None = None,
+) -> None:
+    """Make disjoint polygon from cities bboxes and write them
+    in *.poly format to stdout.
+    """
+    cities_info = get_cities_info(cities_info_urls, cities_info_cache)
+    bboxes = [tuple(map(float, ci["bbox"].split(","))) for ci in cities_info]
+
+    multipolygon = make_metro_polygons(bboxes, buffer, simplify, max_vertices)
+    if report:
+        print_report(make_metro_polygons(bboxes), multipolygon)
 
     print("all metro")
-    for i, polygon in enumerate(union.geoms, start=1):
-        assert len(polygon.interiors) == 0
+    for i, polygon in enumerate(multipolygon.geoms, start=1):
         print(i)
         for lon, lat in polygon.exterior.coords:
             print(f"  {lon} {lat}")
@@ -53,8 +219,60 @@ def main() -> None:
             "Cities from all sources are concatenated."
         ),
     )
+    parser.add_argument(
+        "--cities-info-cache",
+        help=(
+            "Directory to cache downloaded CSV files with cities info in. "
+            "It can be shared between tools and runs"
+        ),
+    )
+    parser.add_argument(
+        "--buffer",
+        type=float,
+        default=0.0,
+        help=(
+            "Widen polygons by this distance in degrees, merging bboxes "
+            "that are closer than twice the distance"
+        ),
+    )
+    parser.add_argument(
+        "--simplify",
+        type=float,
+        default=0.0,
+        help=(
+            "Simplify polygons with this tolerance in degrees. "
+            "Simplified polygons still cover all bboxes"
+        ),
+    )
+    parser.add_argument(
+        "--max-vertices",
+        type=int,
+        help=(
+            "Limit the total number of vertices by simplifying polygons "
+            "with a greater tolerance if needed"
+        ),
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help=(
+            "Print the number of vertices and the area overhead "
+            "compared to the exact union of bboxes to stderr"
+        ),
+    )
     options = parser.parse_args()
-    make_disjoint_metro_polygons(options.cities_info_urls)
+    if options.max_vertices is not None and options.max_vertices < (
+        MIN_VERTICES
+    ):
+        parser.error(f"--max-vertices must be at least {MIN_VERTICES}")
+    make_disjoint_metro_polygons(
+        options.cities_info_urls,
+        options.buffer,
+        options.simplify,
+        options.max_vertices,
+        options.report,
+        options.cities_info_cache,
+    )
 
 
 if __name__ == "__main__":
@@ -3,7 +3,14 @@ import io
 from pathlib import Path
 from unittest import TestCase
 
-from make_all_metro_poly import make_disjoint_metro_polygons
+from shapely import unary_union
+from shapely.geometry import box
+
+from make_all_metro_poly import (
+    count_vertices,
+    make_disjoint_metro_polygons,
+    make_metro_polygons,
+)
 
 
 cases = [
@@ -105,3 +112,31 @@ class TestMakeAllMetroPoly(TestCase):
                 expected_points.sort()
                 generated_points.sort()
                 self.assertListEqual(expected_points, generated_points)
+
+    def test_make_metro_polygons__vertex_budget(self) -> None:
+        # A staircase of overlapping boxes and two small nearby boxes
+        bboxes = [
+            (i * 0.1, i * 0.1, i * 0.1 + 0.3, i * 0.1 + 0.3) for i in range(20)
+        ]
+        bboxes += [(10.0, 10.0, 10.1, 10.1), (10.15, 10.0, 10.25, 10.1)]
+        bboxes_union = unary_union([box(*bbox) for bbox in bboxes])
+
+        exact = make_metro_polygons(bboxes)
+        self.assertEqual(len(exact.geoms), 3)
+        self.assertGreater(count_vertices(exact), 80)
+
+        buffered = make_metro_polygons(bboxes, buffer=0.03)
+        self.assertEqual(len(buffered.geoms), 2)
+        self.assertTrue(buffered.covers(bboxes_union))
+
+        simplified = make_metro_polygons(bboxes, simplify=0.05)
+        self.assertLess(count_vertices(simplified), count_vertices(exact))
+        self.assertTrue(simplified.covers(bboxes_union))
+
+        for max_vertices in (40, 15, 10, 5):
+            with self.subTest(max_vertices=max_vertices):
+                polygons = make_metro_polygons(
+                    bboxes, max_vertices=max_vertices
+                )
+                self.assertLessEqual(count_vertices(polygons), max_vertices)
+                self.assertTrue(polygons.covers(bboxes_union))
@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 import json
-import math
 import re
 import sys
 import urllib.error
 import urllib.parse
 import urllib.request
 
-import kdtree
 from lxml import etree
 
+from station_index import StationIndex, el_center
+
+
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
 
 QUERY = """
 [out:json][timeout:250][bbox:{{bbox}}];
@@ -36,34 +38,9 @@ def el_id(el):
     return el["type"][0] + str(el.get("id", el.get("ref", "")))
 
 
-class StationWrapper:
-    def __init__(self, st):
-        if "center" in st:
-            self.coords = (st["center"]["lon"], st["center"]["lat"])
-        elif "lon" in st:
-            self.coords = (st["lon"], st["lat"])
-        else:
-            raise Exception("Coordinates not found for station {}".format(st))
-        self.station = st
-
-    def __len__(self):
-        return 2
-
-    def __getitem__(self, i):
-        return self.coords[i]
-
-    def distance(self, other):
-        """Calculate distance in meters."""
-        dx = math.radians(self[0] - other["lon"]) * math.cos(
-            0.5 * math.radians(self[1] + other["lat"])
-        )
-        dy = math.radians(self[1] - other["lat"])
-        return 6378137 * math.sqrt(dx * dx + dy * dy)
-
-
-def overpass_request(bbox):
-    url = "http://overpass-api.de/api/interpreter?data={}".format(
-        urllib.parse.quote(QUERY.replace("{{bbox}}", bbox))
+def overpass_request(bbox, api_url=OVERPASS_URL):
+    url = "{}?data={}".format(
+        api_url, urllib.parse.quote(QUERY.replace("{{bbox}}", bbox))
     )
     try:
         response = urllib.request.urlopen(url, timeout=1000)
@@ -97,21 +74,24 @@ def add_stop_areas(src):
                     st["tags"]["station"] = el["tags"]["route"]
                     st["modified"] = True
 
-    # Create a kd-tree out of subway stations
-    stations = kdtree.create(dimensions=2)
-    for el in src:
-        if "tags" in el and el["tags"].get("station", None) in (
-            "subway",
-            "light_rail",
-        ):
-            stations.add(StationWrapper(el))
+    # Create a spatial index of subway stations
+    MAX_DISTANCE = 300  # meters
+    stations = StationIndex(
+        [
+            el
+            for el in src
+            if "tags" in el
+            and el["tags"].get("station", None) in ("subway", "light_rail")
+        ],
+        MAX_DISTANCE,
+    )
 
-    if stations.is_leaf:
+    if not stations:
         raise Exception("No stations found")
 
     # Populate a list of nearby subway exits and platforms for each station
-    MAX_DISTANCE = 300  # meters
     stop_areas = {}
+    member_stop_areas = {}  # el_id of a member => key of its stop area
     for el in src:
         if "tags" not in el:
             continue
@@ -125,18 +105,19 @@ def add_stop_areas(src):
             "stop_position",
         ):
             continue
-        coords = el.get("center", el)
-        station = stations.search_nn((coords["lon"], coords["lat"]))[0].data
-        if station.distance(coords) < MAX_DISTANCE:
+        station = stations.nearest(el_center(el), MAX_DISTANCE)
+        if station:
             k = (
-                station.station["id"],
-                station.station["tags"].get("name", "station_with_no_name"),
+                station["id"],
+                station["tags"].get("name", "station_with_no_name"),
             )
             # Disregard exits and platforms that are differently named
             if el["tags"].get("name", k[1]) == k[1]:
                 if k not in stop_areas:
-                    stop_areas[k] = {el_id(station.station): station.station}
+                    stop_areas[k] = {el_id(station): station}
+                    member_stop_areas[el_id(station)] = k
                 stop_areas[k][el_id(el)] = el
+                member_stop_areas[el_id(el)] = k
 
     # Find existing stop_area relations for stations and remove these stations
     for el in src:
@@ -144,15 +125,11 @@ def add_stop_areas(src):
             el["type"] == "relation"
             and el["tags"].get("public_transport", None) == "stop_area"
         ):
-            found = False
             for m in el["members"]:
-                if found:
+                k = member_stop_areas.get(el_id(m))
+                if k in stop_areas:
+                    del stop_areas[k]
                     break
-                for st in stop_areas:
-                    if el_id(m) in stop_areas[st]:
-                        del stop_areas[st]
-                        found = True
-                        break
 
     # Create OSM XML for new stop_area relations
     root = etree.Element("osm", version="0.6")
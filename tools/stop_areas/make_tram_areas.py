@@ -1,15 +1,15 @@
 #!/usr/bin/env python3
 import json
-import math
 import re
 import sys
 import urllib.error
 import urllib.parse
 import urllib.request
 
-import kdtree
 from lxml import etree
 
+from station_index import StationIndex, el_center
+
 
 QUERY = """
 [out:json][timeout:250][bbox:{{bbox}}];
@@ -27,31 +27,6 @@ def el_id(el):
     return el["type"][0] + str(el.get("id", el.get("ref", "")))
 
 
-class StationWrapper:
-    def __init__(self, st):
-        if "center" in st:
-            self.coords = (st["center"]["lon"], st["center"]["lat"])
-        elif "lon" in st:
-            self.coords = (st["lon"], st["lat"])
-        else:
-            raise Exception("Coordinates not found for station {}".format(st))
-        self.station = st
-
-    def __len__(self):
-        return 2
-
-    def __getitem__(self, i):
-        return self.coords[i]
-
-    def distance(self, other):
-        """Calculate distance in meters."""
-        dx = math.radians(self[0] - other["lon"]) * math.cos(
-            0.5 * math.radians(self[1] + other["lat"])
-        )
-        dy = math.radians(self[1] - other["lat"])
-        return 6378137 * math.sqrt(dx * dx + dy * dy)
-
-
 def overpass_request(bbox):
     url = "http://overpass-api.de/api/interpreter?data={}".format(
         urllib.parse.quote(QUERY.replace("{{bbox}}", bbox))
@@ -78,13 +53,18 @@ def add_stop_areas(src):
     if not src:
         raise Exception("Empty dataset provided to add_stop_areas")
 
-    # Create a kd-tree out of tram stations
-    stations = kdtree.create(dimensions=2)
-    for el in src:
-        if "tags" in el and el["tags"].get("railway") == "tram_stop":
-            stations.add(StationWrapper(el))
+    # Create a spatial index of tram stations
+    MAX_DISTANCE = 50  # meters
+    stations = StationIndex(
+        [
+            el
+            for el in src
+            if "tags" in el and el["tags"].get("railway") == "tram_stop"
+        ],
+        MAX_DISTANCE,
+    )
 
-    if stations.is_leaf:
+    if not stations:
         raise Exception("No stations found")
 
     elements = {}
@@ -93,8 +73,8 @@ def add_stop_areas(src):
             elements[el_id(el)] = el
 
     # Populate a list of nearby subway exits and platforms for each station
-    MAX_DISTANCE = 50  # meters
     stop_areas = {}
+    member_stop_areas = {}  # el_id of a member => key of its stop area
     for el in src:
         # Only tram routes
         if (
@@ -111,18 +91,17 @@ def add_stop_areas(src):
                 continue
             if pel["tags"].get("railway") == "tram_stop":
                 continue
-            coords = pel.get("center", pel)
-            station = stations.search_nn((coords["lon"], coords["lat"]))[
-                0
-            ].data
-            if station.distance(coords) < MAX_DISTANCE:
+            station = stations.nearest(el_center(pel), MAX_DISTANCE)
+            if station:
                 k = (
-                    station.station["id"],
-                    station.station["tags"].get("name", None),
+                    station["id"],
+                    station["tags"].get("name", None),
                 )
                 if k not in stop_areas:
-                    stop_areas[k] = {el_id(station.station): station.station}
+                    stop_areas[k] = {el_id(station): station}
+                    member_stop_areas[el_id(station)] = k
                 stop_areas[k][el_id(m)] = pel
+                member_stop_areas[el_id(m)] = k
 
     # Find existing stop_area relations for stations and remove these stations
     for el in src:
@@ -130,15 +109,11 @@ def add_stop_areas(src):
             el["type"] == "relation"
             and el["tags"].get("public_transport", None) == "stop_area"
         ):
-            found = False
             for m in el["members"]:
-                if found:
+                k = member_stop_areas.get(el_id(m))
+                if k in stop_areas:
+                    del stop_areas[k]
                     break
-                for st in stop_areas:
-                    if el_id(m) in stop_areas[st]:
-                        del stop_areas[st]
-                        found = True
-                        break
 
     # Create OSM XML for new stop_area relations
     root = etree.Element("osm", version="0.6")
@@ -1,11 +1,107 @@
 #!/usr/bin/env python3
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
 from flask import Flask, make_response, render_template, request
 
-from make_stop_areas import add_stop_areas, overpass_request
+from make_stop_areas import OVERPASS_URL, add_stop_areas, overpass_request
+
+
+CACHE_SIZE = 32  # bboxes
+CACHE_TTL = 3600  # seconds
+BBOX_PRECISION = 5  # decimal digits, ~1 m
+
+
+class ResponseCache:
+    """LRU cache with values expiring after ttl seconds. Concurrent
+    requests for a missing key wait for a single computation of the value
+    while requests for other keys are served independently.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key => (expiration time, value)
+        self.pending = {}  # key => Future of a value being computed
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Return a cached value for the key, or compute it by calling
+        compute() without arguments. Exceptions and empty values, like
+        None or [], are not cached: Overpass API returns no elements
+        when it is overloaded.
+        """
+        with self.lock:
+            if key in self.entries:
+                expires, value = self.entries[key]
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    return value
+                del self.entries[key]
+            future = self.pending.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self.pending[key] = Future()
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            if value:
+                with self.lock:
+                    self.entries[key] = (time.monotonic() + self.ttl, value)
+                    while len(self.entries) > self.max_size:
+                        self.entries.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                del self.pending[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def normalize_bbox(bbox):
+    """Return bbox "south,west,north,east" with coordinates rounded,
+    so that slightly different requests share cache entries.
+    """
+    coords = [float(x) for x in bbox.split(",")]
+    if len(coords) != 4 or coords[0] > coords[2] or coords[1] > coords[3]:
+        raise ValueError(f"Wrong bbox: {bbox}")
+    return ",".join(f"{x:.{BBOX_PRECISION}f}" for x in coords)
 
 
 app = Flask(__name__)
 app.debug = True
+app.config["OVERPASS_URL"] = os.environ.get("OVERPASS_URL", OVERPASS_URL)
+
+overpass_cache = ResponseCache()
+result_cache = ResponseCache()
+
+
+def get_overpass_data(bbox):
+    return overpass_cache.get(
+        bbox, lambda: overpass_request(bbox, app.config["OVERPASS_URL"])
+    )
+
+
+def make_result(bbox):
+    src = get_overpass_data(bbox)
+    if not src:
+        return None
+    # add_stop_areas() modifies elements, and they are also cached
+    return add_stop_areas(copy.deepcopy(src))
 
 
 @app.route("/")
@@ -15,10 +111,13 @@ def form():
 
 @app.route("/process", methods=["GET"])
 def convert():
-    src = overpass_request(request.args.get("bbox"))
-    if not src:
+    try:
+        bbox = normalize_bbox(request.args.get("bbox", ""))
+    except ValueError:
+        return "Wrong bbox, expected south,west,north,east.", 400
+    result = result_cache.get(bbox, lambda: make_result(bbox))
+    if not result:
         return "No data from overpass, sorry."
-    result = add_stop_areas(src)
     response = make_response(result)
     response.headers[
         "Content-Disposition"
@@ -27,4 +126,4 @@ def convert():
 
 
 if __name__ == "__main__":
-    app.run()
+    app.run(threaded=True)
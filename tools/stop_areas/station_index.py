@@ -0,0 +1,89 @@
+import math
+from collections import defaultdict
+
+
+EARTH_RADIUS = 6378137  # meters
+METERS_PER_DEGREE = math.radians(EARTH_RADIUS)
+
+
+def el_center(el):
+    """Return (lon, lat) of an element from Overpass JSON."""
+    if "center" in el:
+        return el["center"]["lon"], el["center"]["lat"]
+    if "lon" in el:
+        return el["lon"], el["lat"]
+    raise Exception("Coordinates not found for station {}".format(el))
+
+
+def distance(p1, p2):
+    """Calculate distance in meters between two (lon, lat) points."""
+    dx = math.radians(p1[0] - p2[0]) * math.cos(
+        0.5 * math.radians(p1[1] + p2[1])
+    )
+    dy = math.radians(p1[1] - p2[1])
+    return EARTH_RADIUS * math.sqrt(dx * dx + dy * dy)
+
+
+class StationIndex:
+    """A uniform grid over stations for queries within a radius
+    in meters. The grid is built at once from all stations, so unlike
+    a kd-tree filled with one station at a time it cannot get unbalanced.
+    """
+
+    def __init__(self, stations, cell_size):
+        """:param stations: elements from Overpass JSON
+        :param cell_size: grid cell size in meters, preferably the radius
+            of typical queries
+        """
+        self.stations = [(el_center(el), el) for el in stations]
+        max_abs_lat = max(
+            (abs(center[1]) for center, _ in self.stations), default=0.0
+        )
+        # Cells are at least cell_size wide at any latitude of the stations
+        self.cell_lat = cell_size / METERS_PER_DEGREE
+        self.cell_lon = self.cell_lat / max(
+            math.cos(math.radians(min(max_abs_lat, 89.0))), 1e-6
+        )
+        self.grid = defaultdict(list)
+        for i, (center, _) in enumerate(self.stations):
+            self.grid[self._cell(center)].append(i)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def _cell(self, point):
+        return (
+            math.floor(point[0] / self.cell_lon),
+            math.floor(point[1] / self.cell_lat),
+        )
+
+    def within(self, point, radius):
+        """Return (distance, station) pairs for stations closer than
+        radius meters to a (lon, lat) point, nearest first.
+        """
+        # distance() takes the cosine of the middle latitude of two points,
+        # which may be farther from the equator than the point itself
+        max_lat = abs(point[1]) + radius / METERS_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(min(max_lat, 89.0))), 1e-6)
+        span_lon = math.ceil(
+            radius / METERS_PER_DEGREE / cos_lat / self.cell_lon
+        )
+        span_lat = math.ceil(radius / METERS_PER_DEGREE / self.cell_lat)
+        cell_x, cell_y = self._cell(point)
+        result = []
+        for x in range(cell_x - span_lon, cell_x + span_lon + 1):
+            for y in range(cell_y - span_lat, cell_y + span_lat + 1):
+                for i in self.grid.get((x, y), ()):
+                    center, station = self.stations[i]
+                    d = distance(center, point)
+                    if d < radius:
+                        result.append((d, i, station))
+        result.sort(key=lambda x: x[:2])
+        return [(d, station) for d, _, station in result]
+
+    def nearest(self, point, radius):
+        """Return the station nearest to a (lon, lat) point if it is
+        closer than radius meters, or None.
+        """
+        stations = self.within(point, radius)
+        return stations[0][1] if stations else None
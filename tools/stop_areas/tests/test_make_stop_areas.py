@@ -0,0 +1,189 @@
+import copy
+import random
+from unittest import TestCase
+
+from lxml import etree
+
+from make_stop_areas import add_stop_areas, el_id
+from station_index import distance, el_center
+
+
+def kdtree_stop_areas(src):
+    """New stop areas as add_stop_areas() made them with a kd-tree
+    of stations, before StationIndex. kdtree.search_nn() returned
+    the station nearest in squared degrees, which the distance
+    in meters was checked for then.
+    """
+    stations = [
+        el
+        for el in src
+        if "tags" in el
+        and el["tags"].get("station", None) in ("subway", "light_rail")
+    ]
+    stop_areas = {}
+    for el in src:
+        if "tags" not in el:
+            continue
+        if "station" in el["tags"]:
+            continue
+        if el["tags"].get("railway", None) not in (
+            "subway_entrance",
+            "platform",
+        ) and el["tags"].get("public_transport", None) not in (
+            "platform",
+            "stop_position",
+        ):
+            continue
+        coords = el_center(el)
+        station = min(
+            stations,
+            key=lambda st: (el_center(st)[0] - coords[0]) ** 2
+            + (el_center(st)[1] - coords[1]) ** 2,
+        )
+        if distance(el_center(station), coords) < 300:
+            k = (
+                station["id"],
+                station["tags"].get("name", "station_with_no_name"),
+            )
+            if el["tags"].get("name", k[1]) == k[1]:
+                if k not in stop_areas:
+                    stop_areas[k] = {el_id(station): station}
+                stop_areas[k][el_id(el)] = el
+
+    for el in src:
+        if (
+            el["type"] == "relation"
+            and el["tags"].get("public_transport", None) == "stop_area"
+        ):
+            found = False
+            for m in el["members"]:
+                if found:
+                    break
+                for st in stop_areas:
+                    if el_id(m) in stop_areas[st]:
+                        del stop_areas[st]
+                        found = True
+                        break
+
+    return sorted(
+        (k[1], sorted((m["type"], str(m["id"])) for m in members.values()))
+        for k, members in stop_areas.items()
+    )
+
+
+def new_stop_areas(osm_xml):
+    """Return sorted (name, members) of new stop_area relations."""
+    root = etree.fromstring(osm_xml)
+    return sorted(
+        (
+            rel.find("tag[@k='name']").get("v"),
+            sorted((m.get("type"), m.get("ref")) for m in rel.iter("member")),
+        )
+        for rel in root.iter("relation")
+        if int(rel.get("id")) < 0
+    )
+
+
+def node(node_id, lon, lat, **tags):
+    return {
+        "type": "node",
+        "id": node_id,
+        "lon": lon,
+        "lat": lat,
+        "tags": tags,
+    }
+
+
+def stop_area(relation_id, members):
+    return {
+        "type": "relation",
+        "id": relation_id,
+        "tags": {"type": "public_transport", "public_transport": "stop_area"},
+        "members": [
+            {"type": m["type"], "ref": m["id"], "role": ""} for m in members
+        ],
+    }
+
+
+class TestMakeStopAreas(TestCase):
+    """Test make_stop_areas.add_stop_areas function"""
+
+    def test__add_stop_areas__existing_relations(self):
+        stations = [
+            node(i, 0.01 * i, 55.0, railway="station", station="subway")
+            for i in range(1, 5)
+        ]
+        for station in stations:
+            station["tags"]["name"] = f"Station {station['id']}"
+        entrances = [
+            node(100 + i, 0.01 * i + 0.001, 55.0, railway="subway_entrance")
+            for i in range(1, 5)
+        ]
+        src = stations + entrances
+        self.assertListEqual(
+            [name for name, _ in new_stop_areas(add_stop_areas(src))],
+            ["Station 1", "Station 2", "Station 3", "Station 4"],
+        )
+
+        src = src + [
+            # The entrance of station 1 is in a relation already
+            stop_area(1001, [entrances[0]]),
+            # Only the first station found in a relation is skipped:
+            # station 1 is skipped already, so is station 2, not 3
+            stop_area(1002, [entrances[0], stations[1], entrances[2]]),
+        ]
+        expected = [
+            ("Station 3", [("node", "103"), ("node", "3")]),
+            ("Station 4", [("node", "104"), ("node", "4")]),
+        ]
+        self.assertListEqual(kdtree_stop_areas(copy.deepcopy(src)), expected)
+        self.assertListEqual(new_stop_areas(add_stop_areas(src)), expected)
+
+    def test__add_stop_areas__as_kdtree(self):
+        rnd = random.Random(1)
+        # Stations are 0.01° ≈ 640..1110 m apart, members are closer
+        # than 150 m to a station, so the nearest station is the same
+        # in degrees and meters
+        stations = [
+            node(
+                i * 10 + j,
+                0.01 * i,
+                55 + 0.01 * j,
+                railway="station",
+                station=rnd.choice(["subway", "light_rail"]),
+                name=f"Station {i}-{j}",
+            )
+            for i in range(10)
+            for j in range(10)
+        ]
+        src = list(stations)
+        for i in range(500):
+            station = rnd.choice(stations)
+            lon, lat = el_center(station)
+            tags = rnd.choice(
+                [
+                    {"railway": "subway_entrance"},
+                    {"railway": "platform"},
+                    {"public_transport": "platform"},
+                    {"public_transport": "stop_position"},
+                    {"railway": "subway_entrance", "name": "Other"},
+                    {"amenity": "bench"},
+                ]
+            )
+            if rnd.random() < 0.5:
+                tags["name"] = station["tags"]["name"]
+            src.append(
+                node(
+                    1000 + i,
+                    lon + rnd.uniform(-0.001, 0.001),
+                    lat + rnd.uniform(-0.001, 0.001),
+                    **tags,
+                )
+            )
+        for i in range(40):
+            src.append(stop_area(5000 + i, rnd.sample(src, rnd.randint(1, 4))))
+
+        expected = kdtree_stop_areas(copy.deepcopy(src))
+        self.assertGreater(len(expected), 50)
+        self.assertLess(len(expected), 100)
+        self.assertListEqual(new_stop_areas(add_stop_areas(src)), expected)
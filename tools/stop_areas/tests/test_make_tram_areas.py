@@ -0,0 +1,126 @@
+import copy
+import random
+from unittest import TestCase
+
+from make_tram_areas import add_stop_areas, el_id, is_part_of_stop
+from station_index import distance, el_center
+from tests.test_make_stop_areas import new_stop_areas, node, stop_area
+
+
+def kdtree_tram_areas(src):
+    """New stop areas as add_stop_areas() made them with a kd-tree
+    of tram stops, before StationIndex.
+    """
+    stations = [
+        el
+        for el in src
+        if "tags" in el and el["tags"].get("railway") == "tram_stop"
+    ]
+    elements = {el_id(el): el for el in src if el.get("tags")}
+    stop_areas = {}
+    for el in src:
+        if (
+            "tags" not in el
+            or el["type"] != "relation"
+            or el["tags"].get("route") != "tram"
+        ):
+            continue
+        for m in el["members"]:
+            if el_id(m) not in elements:
+                continue
+            pel = elements[el_id(m)]
+            if not is_part_of_stop(pel["tags"]):
+                continue
+            if pel["tags"].get("railway") == "tram_stop":
+                continue
+            coords = el_center(pel)
+            station = min(
+                stations,
+                key=lambda st: (el_center(st)[0] - coords[0]) ** 2
+                + (el_center(st)[1] - coords[1]) ** 2,
+            )
+            if distance(el_center(station), coords) < 50:
+                k = (station["id"], station["tags"].get("name", None))
+                if k not in stop_areas:
+                    stop_areas[k] = {el_id(station): station}
+                stop_areas[k][el_id(m)] = pel
+
+    for el in src:
+        if (
+            el["type"] == "relation"
+            and el["tags"].get("public_transport", None) == "stop_area"
+        ):
+            found = False
+            for m in el["members"]:
+                if found:
+                    break
+                for st in stop_areas:
+                    if el_id(m) in stop_areas[st]:
+                        del stop_areas[st]
+                        found = True
+                        break
+
+    return sorted(
+        (k[1], sorted((m["type"], str(m["id"])) for m in members.values()))
+        for k, members in stop_areas.items()
+    )
+
+
+def tram_route(relation_id, members):
+    return {
+        "type": "relation",
+        "id": relation_id,
+        "tags": {"type": "route", "route": "tram"},
+        "members": [
+            {"type": m["type"], "ref": m["id"], "role": "platform"}
+            for m in members
+        ],
+    }
+
+
+class TestMakeTramAreas(TestCase):
+    """Test make_tram_areas.add_stop_areas function"""
+
+    def test__add_stop_areas__as_kdtree(self):
+        rnd = random.Random(1)
+        # Tram stops are 0.002° ≈ 128..222 m apart, platforms are closer
+        # than 30 m to a stop
+        stations = [
+            node(
+                i * 10 + j,
+                0.002 * i,
+                55 + 0.002 * j,
+                railway="tram_stop",
+                name=f"Stop {i}-{j}",
+            )
+            for i in range(10)
+            for j in range(10)
+        ]
+        platforms = []
+        for i in range(200):
+            lon, lat = el_center(rnd.choice(stations))
+            tags = rnd.choice(
+                [
+                    {"public_transport": "platform"},
+                    {"public_transport": "stop_position"},
+                    {"railway": "platform"},
+                    {"highway": "bus_stop"},
+                ]
+            )
+            platforms.append(
+                node(
+                    1000 + i,
+                    lon + rnd.uniform(-0.0003, 0.0003),
+                    lat + rnd.uniform(-0.0002, 0.0002),
+                    **tags,
+                )
+            )
+        src = stations + platforms
+        for i in range(10):
+            src.append(tram_route(2000 + i, rnd.sample(src, 30)))
+        for i in range(30):
+            src.append(stop_area(5000 + i, rnd.sample(src, rnd.randint(1, 4))))
+
+        expected = kdtree_tram_areas(copy.deepcopy(src))
+        self.assertGreater(len(expected), 20)
+        self.assertListEqual(new_stop_areas(add_stop_areas(src)), expected)
@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import serve
+from serve import ResponseCache, app, normalize_bbox
+
+
+ELEMENTS = [
+    {
+        "type": "node",
+        "id": 1,
+        "lat": 55.75,
+        "lon": 37.62,
+        "tags": {"railway": "station", "station": "subway", "name": "Center"},
+    },
+    {
+        "type": "node",
+        "id": 2,
+        "lat": 55.7505,
+        "lon": 37.6205,
+        "tags": {"railway": "subway_entrance", "name": "Center"},
+    },
+]
+
+
+class FakeOverpassHandler(BaseHTTPRequestHandler):
+    """Answers any request with ELEMENTS after a delay"""
+
+    delay = 0.2  # seconds
+    elements = ELEMENTS
+
+    def do_GET(self):
+        self.server.requests_count += 1
+        time.sleep(self.delay)
+        body = json.dumps({"elements": self.elements}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestServe(TestCase):
+    """Test the stop_areas web service with a local fake Overpass API"""
+
+    def setUp(self):
+        self.overpass = ThreadingHTTPServer(
+            ("127.0.0.1", 0), FakeOverpassHandler
+        )
+        self.overpass.requests_count = 0
+        threading.Thread(
+            target=self.overpass.serve_forever, daemon=True
+        ).start()
+        app.config["OVERPASS_URL"] = "http://127.0.0.1:{}/api".format(
+            self.overpass.server_address[1]
+        )
+        serve.overpass_cache.clear()
+        serve.result_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.overpass.shutdown()
+        self.overpass.server_close()
+
+    def test__process__cached(self):
+        response1 = self.client.get("/process?bbox=55.7,37.6,55.8,37.7")
+        response2 = self.client.get(
+            "/process?bbox=55.700000001,37.6,55.8,37.70"
+        )
+        self.assertEqual(response1.status_code, 200)
+        self.assertIn(b'v="stop_area"', response1.data)
+        self.assertEqual(response1.data, response2.data)
+        self.assertEqual(self.overpass.requests_count, 1)
+
+    def test__process__concurrent_requests(self):
+        responses = []
+
+        def request_xml(bbox):
+            responses.append(self.client.get(f"/process?bbox={bbox}"))
+
+        threads = [
+            threading.Thread(target=request_xml, args=(bbox,))
+            for bbox in ["55.7,37.6,55.8,37.7"] * 3 + ["55,37,56,38"]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual(self.overpass.requests_count, 2)
+
+    def test__process__no_data_not_cached(self):
+        # Overpass API returns no elements e.g. on a timeout
+        FakeOverpassHandler.elements = []
+        try:
+            response = self.client.get("/process?bbox=55.7,37.6,55.8,37.7")
+        finally:
+            FakeOverpassHandler.elements = ELEMENTS
+        self.assertIn(b"No data from overpass", response.data)
+
+        response = self.client.get("/process?bbox=55.7,37.6,55.8,37.7")
+        self.assertIn(b'v="stop_area"', response.data)
+        self.assertEqual(self.overpass.requests_count, 2)
+
+    def test__process__wrong_bbox(self):
+        for bbox in ("", "1,2,3", "a,b,c,d", "55.8,37.6,55.7,37.7"):
+            with self.subTest(bbox=bbox):
+                response = self.client.get(f"/process?bbox={bbox}")
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.overpass.requests_count, 0)
+
+
+class TestResponseCache(TestCase):
+    def test__normalize_bbox(self):
+        self.assertEqual(
+            normalize_bbox("55.7,37.6,55.8000001,37.7"),
+            "55.70000,37.60000,55.80000,37.70000",
+        )
+
+    def test__lru_and_ttl(self):
+        cache = ResponseCache(max_size=2, ttl=0.2)
+        calls = []
+
+        def compute(key):
+            calls.append(key)
+            return key.upper()
+
+        for key in ("a", "b", "a", "c", "a", "b"):
+            self.assertEqual(cache.get(key, lambda: compute(key)), key.upper())
+        # "b" is evicted by "c" since "a" was used later
+        self.assertListEqual(calls, ["a", "b", "c", "b"])
+
+        time.sleep(0.3)
+        cache.get("a", lambda: compute("a"))
+        self.assertListEqual(calls, ["a", "b", "c", "b", "a"])
+
+    def test__exceptions_are_not_cached(self):
+        cache = ResponseCache()
+
+        def fail():
+            raise RuntimeError("Upstream failure")
+
+        with self.assertRaises(RuntimeError):
+            cache.get("a", fail)
+        self.assertEqual(cache.get("a", lambda: 1), 1)
+
+    def test__empty_values_are_not_cached(self):
+        cache = ResponseCache()
+        calls = []
+
+        def compute(value):
+            calls.append(value)
+            return value
+
+        for value in (None, [], b"", [1], [2]):
+            cache.get("a", lambda: compute(value))
+        self.assertListEqual(calls, [None, [], b"", [1]])
+        self.assertEqual(cache.get("a", lambda: compute(None)), [1])
@@ -0,0 +1,112 @@
+import random
+from unittest import TestCase
+
+from station_index import METERS_PER_DEGREE, StationIndex, distance
+
+
+def make_station(station_id, lon, lat):
+    return {"type": "node", "id": station_id, "lon": lon, "lat": lat}
+
+
+def brute_force_within(stations, point, radius):
+    """Stations closer than radius to the point, nearest first,
+    found without an index.
+    """
+    result = [
+        (distance((st["lon"], st["lat"]), point), i, st)
+        for i, st in enumerate(stations)
+    ]
+    result = sorted(x for x in result if x[0] < radius)
+    return [(d, st) for d, _, st in result]
+
+
+class TestStationIndex(TestCase):
+    """Test station_index.StationIndex class"""
+
+    def test__within__cell_borders(self):
+        cell_size = 100
+        cell_degrees = cell_size / METERS_PER_DEGREE
+        # The point is just below and to the left of a cell corner,
+        # stations are around it in all neighbour cells
+        point = (10 * cell_degrees - 1e-9, 20 * cell_degrees - 1e-9)
+        offsets = (-0.9, -0.5, 0, 2e-9, 0.5, 0.9)  # in cells
+        stations = [
+            make_station(
+                i,
+                point[0] + offsets[i // 6] * cell_degrees,
+                point[1] + offsets[i % 6] * cell_degrees,
+            )
+            for i in range(36)
+        ]
+        index = StationIndex(stations, cell_size)
+        for radius in (50, 100, 150):
+            with self.subTest(radius=radius):
+                self.assertListEqual(
+                    index.within(point, radius),
+                    brute_force_within(stations, point, radius),
+                )
+
+    def test__within__random_points(self):
+        rnd = random.Random(1)
+        for lat in (0.0, -35.0, 60.0, 78.0, 85.0):
+            stations = [
+                make_station(
+                    i, rnd.uniform(-0.02, 0.02), lat + rnd.uniform(-0.01, 0.01)
+                )
+                for i in range(300)
+            ]
+            index = StationIndex(stations, 300)
+            for _ in range(50):
+                point = (
+                    rnd.uniform(-0.02, 0.02),
+                    lat + rnd.uniform(-0.01, 0.01),
+                )
+                for radius in (50, 300, 700):
+                    with self.subTest(lat=lat, point=point, radius=radius):
+                        self.assertListEqual(
+                            index.within(point, radius),
+                            brute_force_within(stations, point, radius),
+                        )
+
+    def test__within__high_latitude(self):
+        # At 80° a degree of longitude is ~19 km, so stations 0.01° apart
+        # in longitude are ~190 m apart and in different cells of 100 m
+        # in latitude
+        stations = [
+            make_station(1, 0.0, 80.0),
+            make_station(2, 0.01, 80.0),
+            make_station(3, 0.0, 80.01),
+        ]
+        index = StationIndex(stations, 100)
+        found = index.within((0.0, 80.0), 300)
+        self.assertListEqual([st["id"] for _, st in found], [1, 2])
+        self.assertAlmostEqual(found[1][0], 193.3, places=1)
+        self.assertEqual(index.nearest((0.009, 80.0), 300)["id"], 2)
+
+    def test__radius_cutoff(self):
+        stations = [make_station(1, 0.0, 0.0), make_station(2, 0.0, 0.01)]
+        index = StationIndex(stations, 300)
+        d = distance((0.0, 0.0), (0.0, 0.01))  # ~1113 m
+
+        self.assertEqual(len(index), 2)
+        self.assertListEqual(
+            [st["id"] for _, st in index.within((0.0, 0.0), d + 1)], [1, 2]
+        )
+        # The distance must be less than the radius
+        self.assertListEqual(
+            [st["id"] for _, st in index.within((0.0, 0.0), d)], [1]
+        )
+        self.assertIsNone(index.nearest((0.0, 0.005), 300))
+        self.assertEqual(index.nearest((0.0, 0.008), 300)["id"], 2)
+
+    def test__nearest__ties(self):
+        # Stations at the same distance are ordered as they were given
+        stations = [make_station(2, 0.001, 0.0), make_station(1, -0.001, 0.0)]
+        index = StationIndex(stations, 300)
+        self.assertEqual(index.nearest((0.0, 0.0), 300)["id"], 2)
+
+    def test__no_stations(self):
+        index = StationIndex([], 300)
+        self.assertFalse(index)
+        self.assertListEqual(index.within((0.0, 0.0), 300), [])
+        self.assertIsNone(index.nearest((0.0, 0.0), 300))
@@ -3,12 +3,16 @@ from __future__ import annotations
 
 import argparse
 import datetime
+import hashlib
 import json
 import os
 import re
+import tempfile
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any
 
+from subways.subway_io import read_validation_log
 from subways.validation import DEFAULT_SPREADSHEET_ID
 from v2h_templates import (
     COUNTRY_CITY,
@@ -57,10 +61,10 @@ class CityData:
     def test_eq(v1: Any, v2: Any) -> str:
         return "1" if v1 == v2 else "0"
 
-    def format(self, s: str) -> str:
-        for k in self.data:
-            s = s.replace("{" + k + "}", str(self.data[k]))
-        s = s.replace("{slug}", self.slug or "")
+    def get_values(self) -> dict[str, str]:
+        """Values of {key} and {=key} template placeholders."""
+        values = {k: str(v) for k, v in self.data.items()}
+        values["slug"] = self.slug or ""
         for k in (
             "subwayl",
             "lightrl",
@@ -72,40 +76,78 @@ class CityData:
             "otherl",
         ):
             if k + "_expected" in self.data:
-                s = s.replace(
-                    "{=" + k + "}",
-                    self.test_eq(
-                        self.data[k + "_found"], self.data[k + "_expected"]
-                    ),
+                values["=" + k] = self.test_eq(
+                    self.data[k + "_found"], self.data[k + "_expected"]
                 )
-        s = s.replace(
-            "{=cities}",
-            self.test_eq(self.data["good_cities"], self.data["total_cities"]),
-        )
-        s = s.replace(
-            "{=entrances}", self.test_eq(self.data["unused_entrances"], 0)
+        values["=cities"] = self.test_eq(
+            self.data["good_cities"], self.data["total_cities"]
         )
+        values["=entrances"] = self.test_eq(self.data["unused_entrances"], 0)
         for k in ("errors", "warnings", "notices"):
-            s = s.replace(
-                "{=" + k + "}", self.test_eq(self.data["num_" + k], 0)
-            )
-        return s
+            values["=" + k] = self.test_eq(self.data["num_" + k], 0)
+        return values
+
+
+class Template:
+    """A template compiled once into a list of literal strings and
+    placeholders, which is then rendered in one pass. Placeholders are:
+    {key} and {=key} - values; {?key}...{end} - a block that is output
+    if the key value is true. Placeholders with unknown keys are kept.
+    """
+
+    TOKEN_RE = re.compile(r"\{([?=]?\w+)\}")
+
+    def __init__(self, template: str) -> None:
+        # Items are strings or (key, raw placeholder, block items or None)
+        self.items = []
+        block = None
+        position = 0
+        for m in self.TOKEN_RE.finditer(template):
+            items = self.items if block is None else block[2]
+            literal_end = m.start()
+            items.append(template[position:literal_end])
+            position = m.end()
+            key = m.group(1)
+            if key.startswith("?"):
+                block = (key[1:], m.group(0), [])
+                self.items.append(block)
+            elif key == "end" and block is not None:
+                block = None
+            else:
+                items.append((key, m.group(0), None))
+        self.items.append(template[position:])
+
+    def render(self, values: dict[str, str], flags: dict[str, Any]) -> str:
+        """:param values: key => value of {key} placeholders
+        :param flags: key => value of {?key} conditions
+        """
+        parts = []
+
+        def render_items(items: list) -> None:
+            for item in items:
+                if isinstance(item, str):
+                    parts.append(item)
+                    continue
+                key, raw, block_items = item
+                if block_items is None:
+                    parts.append(values.get(key, raw))
+                elif key not in flags:
+                    parts.append(raw)
+                    render_items(block_items)
+                    parts.append("{end}")
+                elif flags[key]:
+                    render_items(block_items)
 
+        render_items(self.items)
+        return "".join(parts)
 
-def tmpl(s: str, data: CityData | None = None, **kwargs) -> str:
+
+def tmpl(template: Template, data: CityData | None = None, **kwargs) -> str:
+    values = {k: str(v) for k, v in kwargs.items() if v is not None}
     if data:
-        s = data.format(s)
-    if kwargs:
-        for k, v in kwargs.items():
-            if v is not None:
-                s = s.replace("{" + k + "}", str(v))
-            s = re.sub(
-                r"\{\?" + k + r"\}(.+?)\{end\}",
-                r"\1" if v else "",
-                s,
-                flags=re.DOTALL,
-            )
-    return s
+        # City data take precedence over keyword arguments
+        values.update(data.get_values())
+    return template.render(values, kwargs)
 
 
 EXPAND_OSM_TYPE = {"n": "node", "w": "way", "r": "relation"}
@@ -143,6 +185,164 @@ def br_osm_links(elems: list) -> str:
     return "<br>".join(osm_links(esc(elem)) for elem in elems)
 
 
+COUNTRY_HEADER_TMPL = Template(COUNTRY_HEADER)
+COUNTRY_CITY_TMPL = Template(COUNTRY_CITY)
+COUNTRY_FOOTER_TMPL = Template(COUNTRY_FOOTER)
+INDEX_HEADER_TMPL = Template(INDEX_HEADER)
+INDEX_COUNTRY_TMPL = Template(INDEX_COUNTRY)
+INDEX_CONTINENT_TMPL = Template(INDEX_CONTINENT)
+INDEX_FOOTER_TMPL = Template(INDEX_FOOTER)
+
+
+def get_country_file_name(country: str) -> str:
+    return country.lower().replace(" ", "-") + ".html"
+
+
+def get_city_files(city: CityData, target_dir: str) -> tuple[str | None, ...]:
+    """Return names of YAML and GeoJSON files of a city, if they exist."""
+    file_base = os.path.join(target_dir, city.slug)
+    return tuple(
+        city.slug + extension
+        if os.path.exists(file_base + extension)
+        else None
+        for extension in (".yaml", ".geojson")
+    )
+
+
+def get_country_hash(
+    cities: list[tuple[str, CityData]], overground: bool, target_dir: str
+) -> str:
+    """Hash of everything a country page depends on, except the date."""
+    page_input = [
+        overground,
+        COUNTRY_HEADER,
+        COUNTRY_CITY,
+        COUNTRY_FOOTER,
+        [
+            (
+                name,
+                city.slug,
+                city.data,
+                city.errors,
+                city.warnings,
+                city.notices,
+                get_city_files(city, target_dir),
+            )
+            for name, city in cities
+        ],
+    ]
+    return hashlib.sha256(
+        json.dumps(page_input, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def write_country_page(
+    country: str,
+    continent: str,
+    cities: list[tuple[str, CityData]],
+    overground: bool,
+    date: str,
+    target_dir: str,
+) -> None:
+    """Write a country page.
+    :param cities: sorted list of (name, CityData) pairs of the country
+    """
+    parts = [
+        tmpl(
+            COUNTRY_HEADER_TMPL,
+            country=country,
+            continent=continent,
+            overground=overground,
+            subways=not overground,
+        )
+    ]
+    for name, city in cities:
+        yaml_file, json_file = get_city_files(city, target_dir)
+        errors = br_osm_links(city.errors)
+        warnings = br_osm_links(city.warnings)
+        notices = br_osm_links(city.notices)
+        parts.append(
+            tmpl(
+                COUNTRY_CITY_TMPL,
+                city,
+                city=name,
+                country=country,
+                continent=continent,
+                yaml=yaml_file,
+                json=json_file,
+                subways=not overground,
+                errors=errors,
+                warnings=warnings,
+                notices=notices,
+                overground=overground,
+            )
+        )
+    parts.append(
+        tmpl(
+            COUNTRY_FOOTER_TMPL,
+            country=country,
+            continent=continent,
+            date=date,
+        )
+    )
+    with open(
+        os.path.join(target_dir, get_country_file_name(country)),
+        "w",
+        encoding="utf-8",
+    ) as country_file:
+        country_file.write("".join(parts))
+
+
+def read_country_cities(
+    spool_path: str, offsets: list[int]
+) -> list[tuple[str, CityData]]:
+    """Read city records of a country from the spool file written
+    by main(). Return sorted list of (name, CityData) pairs.
+    """
+    cities = []
+    with open(spool_path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            city = json.loads(f.readline())
+            cities.append((city["name"], CityData(city)))
+    cities.sort()
+    return cities
+
+
+def update_country_page(
+    country: str,
+    continent: str,
+    spool_path: str,
+    offsets: list[int],
+    overground: bool,
+    date: str,
+    target_dir: str,
+    old_hash: str | None,
+) -> str:
+    """Write a country page unless its input hash is old_hash and the page
+    exists. Only the cities of this country are loaded into memory.
+    Return the hash of the page input.
+    """
+    cities = read_country_cities(spool_path, offsets)
+    country_hash = get_country_hash(cities, overground, target_dir)
+    if country_hash != old_hash or not os.path.exists(
+        os.path.join(target_dir, get_country_file_name(country))
+    ):
+        write_country_page(
+            country, continent, cities, overground, date, target_dir
+        )
+    return country_hash
+
+
+def read_manifest(manifest_path: str) -> dict[str, str]:
+    """Read hashes of country page inputs, by page file name."""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description=(
@@ -160,6 +360,21 @@ def main() -> None:
             f"{DEFAULT_SPREADSHEET_ID}/edit?usp=sharing"
         ],
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to generate country pages in parallel",
+    )
+    parser.add_argument(
+        "--manifest",
+        help=(
+            "Path to a file with hashes of country page inputs. With it, "
+            "country pages whose input has not changed since the previous "
+            "run are skipped and pages of vanished countries are removed. "
+            "Keep it out of the target directory, which is published"
+        ),
+    )
     options = parser.parse_args()
     target_dir = options.target_directory
     cities_info_urls = options.cities_info_urls
@@ -175,105 +390,98 @@ def main() -> None:
         )
         cities_info_link = f"these reference metro statistics ({sources})"
 
-    with open(options.validation_log, encoding="utf-8") as f:
-        data = {c["name"]: CityData(c) for c in json.load(f)}
+    date = datetime.datetime.utcnow().strftime("%d.%m.%Y %H:%M UTC")
+    old_manifest = read_manifest(options.manifest) if options.manifest else {}
+    manifest = {}
 
-    countries = {}
-    continents = {}
-    c_by_c = defaultdict(set)  # continent → set of countries
-    for c in data.values():
-        countries[c.country] = c + countries.get(c.country, CityData())
-        continents[c.continent] = c + continents.get(c.continent, CityData())
-        c_by_c[c.continent].add(c.country)
-    world = sum(continents.values(), CityData())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Only aggregates are kept in memory while the log is read.
+        # City records are spooled to a file and read back by country
+        # when its page is rendered.
+        spool_path = os.path.join(tmp_dir, "cities.jsonl")
+        countries = {}
+        continents = {}
+        c_by_c = defaultdict(set)  # continent → set of countries
+        offsets_by_country = defaultdict(list)  # country → spool offsets
+        overground = False
+        with open(spool_path, "wb") as spool:
+            for city in read_validation_log(options.validation_log):
+                c = CityData(city)
+                if not countries:
+                    overground = "traml_expected" in c.data
+                countries[c.country] = c + countries.get(c.country, CityData())
+                continents[c.continent] = c + continents.get(
+                    c.continent, CityData()
+                )
+                c_by_c[c.continent].add(c.country)
+                offsets_by_country[c.country].append(spool.tell())
+                spool.write(json.dumps(city).encode("utf-8") + b"\n")
+        world = sum(continents.values(), CityData())
 
-    overground = "traml_expected" in next(iter(data.values())).data
-    date = datetime.datetime.utcnow().strftime("%d.%m.%Y %H:%M UTC")
-    index = open(os.path.join(target_dir, "index.html"), "w", encoding="utf-8")
-    index.write(tmpl(INDEX_HEADER, world))
+        country_pages = [
+            (
+                country,
+                continent,
+                spool_path,
+                offsets_by_country[country],
+                overground,
+                date,
+                target_dir,
+                old_manifest.get(get_country_file_name(country)),
+            )
+            for continent in sorted(continents.keys())
+            for country in sorted(c_by_c[continent])
+        ]
+        if options.workers > 1 and len(country_pages) > 1:
+            with ProcessPoolExecutor(max_workers=options.workers) as executor:
+                futures = [
+                    executor.submit(update_country_page, *args)
+                    for args in country_pages
+                ]
+                country_hashes = [future.result() for future in futures]
+        else:
+            country_hashes = [
+                update_country_page(*args) for args in country_pages
+            ]
+        for args, country_hash in zip(country_pages, country_hashes):
+            manifest[get_country_file_name(args[0])] = country_hash
 
+    if options.manifest:
+        for country_file_name in old_manifest.keys() - manifest.keys():
+            try:
+                os.remove(os.path.join(target_dir, country_file_name))
+            except FileNotFoundError:
+                pass
+        with open(options.manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+    index = [tmpl(INDEX_HEADER_TMPL, world)]
     for continent in sorted(continents.keys()):
-        content = ""
-        for country in sorted(c_by_c[continent]):
-            country_file_name = country.lower().replace(" ", "-") + ".html"
-            content += tmpl(
-                INDEX_COUNTRY,
+        content = "".join(
+            tmpl(
+                INDEX_COUNTRY_TMPL,
                 countries[country],
-                file=country_file_name,
+                file=get_country_file_name(country),
                 country=country,
                 continent=continent,
             )
-            country_file = open(
-                os.path.join(target_dir, country_file_name),
-                "w",
-                encoding="utf-8",
-            )
-            country_file.write(
-                tmpl(
-                    COUNTRY_HEADER,
-                    country=country,
-                    continent=continent,
-                    overground=overground,
-                    subways=not overground,
-                )
-            )
-            for name, city in sorted(
-                (name, city)
-                for name, city in data.items()
-                if city.country == country
-            ):
-                file_base = os.path.join(target_dir, city.slug)
-                yaml_file = (
-                    city.slug + ".yaml"
-                    if os.path.exists(file_base + ".yaml")
-                    else None
-                )
-                json_file = (
-                    city.slug + ".geojson"
-                    if os.path.exists(file_base + ".geojson")
-                    else None
-                )
-                errors = br_osm_links(city.errors)
-                warnings = br_osm_links(city.warnings)
-                notices = br_osm_links(city.notices)
-                country_file.write(
-                    tmpl(
-                        COUNTRY_CITY,
-                        city,
-                        city=name,
-                        country=country,
-                        continent=continent,
-                        yaml=yaml_file,
-                        json=json_file,
-                        subways=not overground,
-                        errors=errors,
-                        warnings=warnings,
-                        notices=notices,
-                        overground=overground,
-                    )
-                )
-            country_file.write(
-                tmpl(
-                    COUNTRY_FOOTER,
-                    country=country,
-                    continent=continent,
-                    date=date,
-                )
-            )
-            country_file.close()
-        index.write(
+            for country in sorted(c_by_c[continent])
+        )
+        index.append(
             tmpl(
-                INDEX_CONTINENT,
+                INDEX_CONTINENT_TMPL,
                 continents[continent],
                 content=content,
                 continent=continent,
             )
         )
-
-    index.write(
-        tmpl(INDEX_FOOTER, date=date, cities_info_link=cities_info_link)
+    index.append(
+        tmpl(INDEX_FOOTER_TMPL, date=date, cities_info_link=cities_info_link)
     )
-    index.close()
+    with open(
+        os.path.join(target_dir, "index.html"), "w", encoding="utf-8"
+    ) as f:
+        f.write("".join(index))
 
 
 if __name__ == "__main__":